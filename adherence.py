@@ -0,0 +1,226 @@
+"""Meal and workout completion as per-day bitsets, with vectorized queries.
+
+Cohort meal adherence over the last --days days, as JSON:
+
+    python adherence.py --days 28
+"""
+import argparse
+import json
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# One uint32 word per day, one bit per slot
+MAX_SLOTS = 32
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def epoch_day(iso_date):
+    return date.fromisoformat(iso_date).toordinal() - _EPOCH
+
+
+def iso_date(day):
+    return date.fromordinal(int(day) + _EPOCH).isoformat()
+
+
+def epoch_days(iso_dates):
+    return np.asarray(iso_dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def popcount(words):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    as_bytes = words.astype("<u4").view(np.uint8).reshape(-1, 4)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1)
+
+
+class DayBitset:
+    """Day x slot completion matrix stored as one bit word per day.
+
+    Slots get bit positions in the order they are first seen; queries take
+    slot names, so the caller's slot order (MEAL_PLAN, WORKOUT_PLAN) never
+    has to match the storage order.
+    """
+
+    def __init__(self):
+        self.origin = None                       # epoch day of words[0]
+        self.words = np.zeros(0, dtype=np.uint32)
+        self.length = 0                          # days in use
+        self.slot_bits = {}
+
+    # ---- writing -------------------------------------------------------
+
+    def _bit(self, slot):
+        bit = self.slot_bits.get(slot)
+        if bit is None:
+            if len(self.slot_bits) >= MAX_SLOTS:
+                raise ValueError(f"More than {MAX_SLOTS} slots")
+            bit = self.slot_bits[slot] = len(self.slot_bits)
+        return bit
+
+    def _reserve(self, first, last):
+        # Make words cover [first, last], growing geometrically to the right
+        if self.origin is None:
+            self.origin = first
+        if first < self.origin:
+            pad = self.origin - first
+            self.words = np.concatenate((np.zeros(pad, dtype=np.uint32), self.words))
+            self.length += pad
+            self.origin = first
+        needed = last - self.origin + 1
+        if needed > len(self.words):
+            grown = np.zeros(max(needed, 2 * len(self.words), 64), dtype=np.uint32)
+            grown[:self.length] = self.words[:self.length]
+            self.words = grown
+        self.length = max(self.length, needed)
+
+    def set(self, day, slot, done=True):
+        mask = np.uint32(1 << self._bit(slot))
+        self._reserve(day, day)
+        i = day - self.origin
+        if done:
+            self.words[i] |= mask
+        else:
+            self.words[i] &= ~mask
+
+    def set_many(self, days, slots):
+        # Bulk load from parallel arrays of epoch days and slot names
+        days = np.asarray(days, dtype=np.int64)
+        if not len(days):
+            return
+        masks = np.array([1 << self._bit(slot) for slot in slots], dtype=np.uint32)
+        self._reserve(int(days.min()), int(days.max()))
+        np.bitwise_or.at(self.words, days - self.origin, masks)
+
+    # ---- reading -------------------------------------------------------
+
+    def get(self, day, slot):
+        bit = self.slot_bits.get(slot)
+        if bit is None or self.origin is None:
+            return False
+        i = day - self.origin
+        return 0 <= i < self.length and bool((self.words[i] >> bit) & 1)
+
+    def window(self, first, last):
+        # Words for epoch days first..last inclusive, zero where unrecorded
+        out = np.zeros(last - first + 1, dtype=np.uint32)
+        if self.origin is None:
+            return out
+        lo = max(first, self.origin)
+        hi = min(last, self.origin + self.length - 1)
+        if lo <= hi:
+            out[lo - first:hi - first + 1] = self.words[lo - self.origin:hi - self.origin + 1]
+        return out
+
+    def matrix(self, slots, first, last):
+        # days x slots boolean matrix
+        words = self.window(first, last)
+        bits = np.array([self.slot_bits.get(slot, MAX_SLOTS) for slot in slots], dtype=np.uint32)
+        present = bits < MAX_SLOTS
+        result = ((words[:, None] >> np.where(present, bits, 0)) & 1).astype(bool)
+        result[:, ~present] = False
+        return result
+
+    def counts(self):
+        # Completed days per slot over the whole history
+        words = self.words[:self.length]
+        return {slot: int(((words >> bit) & 1).sum()) for slot, bit in self.slot_bits.items()}
+
+    def items(self):
+        # (ISO date, slot) for every set bit, for snapshots and exports
+        names = {bit: slot for slot, bit in self.slot_bits.items()}
+        for i in np.flatnonzero(self.words[:self.length]):
+            word = int(self.words[i])
+            day = iso_date(self.origin + i)
+            for bit, slot in names.items():
+                if word >> bit & 1:
+                    yield day, slot
+
+    def __len__(self):
+        return int(popcount(self.words[:self.length]).sum())
+
+
+# ---- vectorized queries --------------------------------------------------
+
+def worst_slot(bitset, slots, first, last):
+    rates = bitset.matrix(slots, first, last).mean(axis=0)
+    i = int(np.argmin(rates))
+    return slots[i], float(rates[i])
+
+
+def calendar_heatmap(bitset, slots, first, last):
+    """Share of slots completed per day, laid out as weeks x weekdays.
+
+    Returns (z, week_starts) where z has one row per Monday-based week and
+    NaN for days outside first..last.
+    """
+    weekday = (first + 3) % 7  # epoch day 0 was a Thursday
+    start = first - weekday
+    weeks = (last - start) // 7 + 1
+    share = bitset.matrix(slots, start, start + weeks * 7 - 1).mean(axis=1)
+    share[:weekday] = np.nan
+    share[last - start + 1:] = np.nan
+    week_starts = [iso_date(start + 7 * w) for w in range(weeks)]
+    return share.reshape(weeks, 7), week_starts
+
+
+def cohort_adherence(rows, members, slots, first, last):
+    """Per-slot adherence across many members in one vectorized pass.
+
+    rows is an iterable of (user_id, iso_date, slot), e.g. straight from a
+    store's meal_rows(); members is the cohort's user ids, so members who
+    completed nothing in the range count as 0%. Returns (slot -> share of
+    member-days, members).
+    """
+    member_index = {user_id: i for i, user_id in enumerate(members)}
+    if not member_index:
+        return dict.fromkeys(slots, 0.0), 0
+    users, dates, names = [], [], []
+    for user_id, day, slot in rows:
+        i = member_index.get(user_id)
+        if i is not None:
+            users.append(i)
+            dates.append(day)
+            names.append(slot)
+
+    slot_index = {slot: i for i, slot in enumerate(slots)}
+    user_idx = np.array(users, dtype=np.intp)
+    day_idx = epoch_days(dates) - first
+    slot_idx = np.array([slot_index.get(slot, -1) for slot in names], dtype=np.int64)
+    keep = (slot_idx >= 0) & (day_idx >= 0) & (day_idx <= last - first)
+
+    words = np.zeros((len(member_index), last - first + 1), dtype=np.uint32)
+    np.bitwise_or.at(words, (user_idx[keep], day_idx[keep]),
+                     (np.uint32(1) << slot_idx[keep].astype(np.uint32)))
+    per_slot = [float(((words >> np.uint32(i)) & 1).mean()) for i in range(len(slots))]
+    return dict(zip(slots, per_slot)), len(member_index)
+
+
+def main():
+    # storage imports this module, so it is loaded here
+    from plans import MEAL_PLAN
+    from storage import DATA_DIR, STORE_BACKEND, open_store
+
+    parser = argparse.ArgumentParser(description="Meal adherence per slot across every member")
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--days", type=int, default=28, help="days up to and including today")
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.data_dir)
+    today = date.today()
+    start = today - timedelta(days=args.days - 1)
+    members = [user_id for user_id, _ in store.members()]
+    shares, count = cohort_adherence(store.meal_rows(start.isoformat(), today.isoformat()), members,
+                                     list(MEAL_PLAN), epoch_day(start.isoformat()), epoch_day(today.isoformat()))
+    store.close()
+    json.dump({"first": start.isoformat(), "last": today.isoformat(), "members": count,
+               "adherence": {slot: round(share, 4) for slot, share in shares.items()}},
+              sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
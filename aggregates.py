@@ -0,0 +1,152 @@
+from collections import deque
+from datetime import date, timedelta
+
+from trend import TREND_DAYS, TrendFilter
+
+ROLLING_WINDOWS = (7, 28)
+
+
+def day_number(iso_date):
+    return date.fromisoformat(iso_date).toordinal()
+
+
+class RollingMean:
+    """Mean of the readings in the last `days` days, fed in date order."""
+
+    __slots__ = ("days", "window", "total")
+
+    def __init__(self, days):
+        self.days = days
+        self.window = deque()
+        self.total = 0.0
+
+    def push(self, day, value):
+        self.window.append((day, value))
+        self.total += value
+        while self.window[0][0] <= day - self.days:
+            self.total -= self.window.popleft()[1]
+
+    def replace_last(self, value):
+        day, old = self.window.pop()
+        self.total -= old
+        self.window.append((day, value))
+        self.total += value
+
+    @property
+    def mean(self):
+        return self.total / len(self.window) if self.window else None
+
+
+class ProgressAggregates:
+    """Dashboard metrics kept current on every log write.
+
+    Writes in date order update the metrics in O(1); a backdated write
+    re-derives only the affected metric. Every read is O(1).
+    """
+
+    def __init__(self):
+        self.last_weight_day = None
+        self.rolling = {days: RollingMean(days) for days in ROLLING_WINDOWS}
+        self.trend = TrendFilter()
+        self.last_workout_day = None
+        self.current_run = 0
+        self.longest_run = 0
+        self.meal_counts = {}
+
+    # ---- maintenance ---------------------------------------------------
+
+    def rebuild(self, logs):
+        self.__init__()
+        self._rebuild_weights(logs)
+        self._rebuild_streaks(logs)
+        self.meal_counts = logs.meal_bits.counts()
+
+    def _rebuild_weights(self, logs):
+        self.rolling = {days: RollingMean(days) for days in ROLLING_WINDOWS}
+        self.trend = TrendFilter()
+        self.last_weight_day = None
+        if not logs.weight_dates:
+            return
+        latest = date.fromisoformat(logs.weight_dates[-1])
+        rolling_start = (latest - timedelta(days=max(ROLLING_WINDOWS) - 1)).isoformat()
+        start = (latest - timedelta(days=max(TREND_DAYS, *ROLLING_WINDOWS) - 1)).isoformat()
+        dates, weights = logs.weights_between(start, latest.isoformat())
+        for iso_date, weight in zip(dates, weights):
+            day = day_number(iso_date)
+            self.trend.update(day, weight)
+            if iso_date >= rolling_start:
+                for rolling in self.rolling.values():
+                    rolling.push(day, weight)
+            self.last_weight_day = day
+
+    def _rebuild_streaks(self, logs):
+        self.last_workout_day = None
+        self.current_run = self.longest_run = 0
+        for day in sorted(map(day_number, logs.workout_completed)):
+            self._push_workout(day)
+
+    def _push_weight(self, day, weight):
+        for rolling in self.rolling.values():
+            rolling.push(day, weight)
+        self.trend.update(day, weight)
+        self.last_weight_day = day
+
+    def _push_workout(self, day):
+        if self.last_workout_day is not None and day == self.last_workout_day + 1:
+            self.current_run += 1
+        else:
+            self.current_run = 1
+        self.last_workout_day = day
+        self.longest_run = max(self.longest_run, self.current_run)
+
+    def on_weight(self, iso_date, weight, logs):
+        day = day_number(iso_date)
+        if self.last_weight_day is None or day > self.last_weight_day:
+            self._push_weight(day, weight)
+        elif day == self.last_weight_day:
+            for rolling in self.rolling.values():
+                rolling.replace_last(weight)
+            self.trend.replace_last(weight)
+        else:
+            self._rebuild_weights(logs)
+
+    def on_workout(self, iso_date, is_new, logs):
+        if not is_new:
+            return
+        day = day_number(iso_date)
+        if self.last_workout_day is None or day > self.last_workout_day:
+            self._push_workout(day)
+        else:
+            self._rebuild_streaks(logs)
+
+    def on_meal(self, slot, delta):
+        self.meal_counts[slot] = self.meal_counts.get(slot, 0) + delta
+
+    # ---- reads ---------------------------------------------------------
+
+    def current_streak(self, today=None):
+        # A streak survives until a full day passes without a workout
+        today = (today or date.today()).toordinal()
+        if self.last_workout_day is None or today - self.last_workout_day > 1:
+            return 0
+        return self.current_run
+
+    @property
+    def longest_streak(self):
+        return self.longest_run
+
+    def rolling_average(self, days):
+        return self.rolling[days].mean
+
+    def weekly_loss_rate(self, start_date, start_weight, today=None):
+        # kg lost per week so far, measured on the 7-day average to damp noise
+        average = self.rolling_average(7)
+        weeks = ((today or date.today()) - date.fromisoformat(start_date)).days / 7
+        if average is None or weeks < 1:
+            return None
+        return (start_weight - average) / weeks
+
+    def meal_adherence(self, slot, days_tracked):
+        if days_tracked <= 0:
+            return 0.0
+        return min(self.meal_counts.get(slot, 0) / days_tracked, 1.0)
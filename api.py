@@ -0,0 +1,497 @@
+"""JSON API over the plans and member logs, for the mobile app.
+
+A plain ASGI application: serve it with uvicorn next to the Streamlit app
+(both on the sqlite backend, which several processes can share) or on
+its own.
+
+    python api.py --port 8000
+    uvicorn --factory api:create_app --workers 4 --port 8000
+    python api.py --bench 20000      # in-process client against a seeded temporary store
+
+    GET  /v1/plans/workout | meal | notifications
+    GET  /v1/users/<id>/profile
+    GET  /v1/users/<id>/logs[?since=YYYY-MM-DD]
+    GET  /v1/users/<id>/calendar.ics
+    POST /v1/users/<id>/weights     {"date": "YYYY-MM-DD", "kg": 82.4}, or a list of them
+    POST /v1/users/<id>/workouts    {"date": "YYYY-MM-DD", "day": "Monday"}, or a list of them
+    GET  /metrics
+
+Every GET carries an ETag hashed from its body and answers a matching
+If-None-Match with 304, so a polling client only downloads what changed.
+Plan bodies are serialized and hashed once; a member's logs once per log
+version. Store calls run on one worker thread, and writes arriving within
+BATCH_WINDOW of each other are merged into one transaction per member; a
+POST returns once its batch is committed. Calendar feeds are streamed in
+chunks (see ical.py).
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import sys
+import tempfile
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from ical import member_feed
+from importer import MAX_WEIGHT_KG, MIN_WEIGHT_KG
+from metrics import observe, prometheus_text
+from plans import MEAL_PLAN, NOTIFICATIONS, WORKOUT_PLAN
+from storage import DATA_DIR, STORE_BACKEND, check_user_id, open_store
+
+# Seconds a write waits for others to share its transaction
+BATCH_WINDOW = 0.005
+# Pending rows that flush a batch before the window closes
+BATCH_ROWS = 5000
+MAX_BODY_BYTES = 1 << 20
+# Members whose serialized logs are kept, least recently used dropped first
+PAYLOAD_CACHE_SIZE = 1024
+# Smaller bodies are sent uncompressed whatever the client accepts
+GZIP_MIN_BYTES = 1024
+# Requests in flight at once in --bench
+CONCURRENCY = 64
+
+Response = namedtuple("Response", "status headers body")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+class Payload:
+    """A serialized JSON body and its ETag; gzipped on first demand."""
+
+    __slots__ = ("body", "etag", "_gzipped")
+
+    def __init__(self, document):
+        self.body = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        # Weak, so the gzipped body shares it
+        self.etag = f'W/"{hashlib.sha256(self.body).hexdigest()[:32]}"'.encode("ascii")
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+def etag_matches(if_none_match, etag):
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")}
+    return b"*" in tags or etag.removeprefix(b"W/") in tags
+
+
+def logs_document(user_id, logs, since=None):
+    """A member's weights, workouts, meals and sets from since on, ready for json."""
+    since = since or ""
+    dates, kg = logs.weights_between(since, "9999-12-31")
+    meals = {}
+    for day, slot in logs.meal_bits.items():
+        if day >= since:
+            meals.setdefault(day, []).append(slot)
+    sets = logs.sets.columns()
+    if since:
+        keep = [i for i, day in enumerate(sets["date"]) if day >= since]
+        sets = {field: [values[i] for i in keep] for field, values in sets.items()}
+    return {
+        "user_id": user_id,
+        "since": since or None,
+        "weights": dict(zip(dates, kg)),
+        "workouts": {day: name for day, name in sorted(logs.workout_completed.items()) if day >= since},
+        "meals": dict(sorted(meals.items())),
+        "sets": sets,
+    }
+
+
+def _iso(value, field="date"):
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a YYYY-MM-DD date, got {value!r}") from None
+
+
+def _entries(body):
+    try:
+        entries = json.loads(body)
+    except ValueError:
+        raise ValueError("Body is not valid JSON") from None
+    if isinstance(entries, dict):
+        entries = [entries]
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise ValueError("Body must be an object or a list of objects")
+    return entries
+
+
+def parse_weights(body):
+    """{date: kg} from a POSTed body; ValueError names the first bad entry."""
+    weights = {}
+    for entry in _entries(body):
+        kg = entry.get("kg")
+        if isinstance(kg, bool) or not isinstance(kg, (int, float)) \
+                or not MIN_WEIGHT_KG <= kg <= MAX_WEIGHT_KG:
+            raise ValueError(f"kg must be a number from {MIN_WEIGHT_KG:g} to {MAX_WEIGHT_KG:g}, got {kg!r}")
+        weights[_iso(entry.get("date"))] = float(kg)
+    return weights
+
+
+def parse_workouts(body):
+    """{date: WORKOUT_PLAN day} from a POSTed body."""
+    workouts = {}
+    for entry in _entries(body):
+        day = entry.get("day")
+        if day not in WORKOUT_PLAN:
+            raise ValueError(f"day must be one of {', '.join(WORKOUT_PLAN)}, got {day!r}")
+        workouts[_iso(entry.get("date"))] = day
+    return workouts
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "Client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Body exceeds {MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _json(status, document):
+    body = json.dumps(document, ensure_ascii=False).encode("utf-8")
+    return Response(status, [(b"content-type", b"application/json"),
+                             (b"content-length", str(len(body)).encode("ascii"))], body)
+
+
+def _conditional(payload, request_headers):
+    # 200 with the body, or 304 when the client's copy is current
+    headers = [(b"etag", payload.etag), (b"cache-control", b"no-cache"), (b"vary", b"accept-encoding")]
+    if etag_matches(request_headers.get(b"if-none-match"), payload.etag):
+        return Response(304, headers, b"")
+    body = payload.body
+    headers.append((b"content-type", b"application/json"))
+    if len(body) >= GZIP_MIN_BYTES and b"gzip" in request_headers.get(b"accept-encoding", b""):
+        body = payload.gzipped()
+        headers.append((b"content-encoding", b"gzip"))
+    headers.append((b"content-length", str(len(body)).encode("ascii")))
+    return Response(200, headers, body)
+
+
+def _feed(etag, chunks, request_headers):
+    etag = etag.encode("ascii")
+    headers = [(b"etag", etag), (b"cache-control", b"no-cache")]
+    if etag_matches(request_headers.get(b"if-none-match"), etag):
+        return Response(304, headers, b"")
+    headers += [(b"content-type", b"text/calendar; charset=utf-8"),
+                (b"content-disposition", b'inline; filename="fitness-plan.ics"')]
+    return Response(200, headers, chunks)
+
+
+class FitnessAPI:
+    """The ASGI application: one store, its worker thread and the write batcher."""
+
+    def __init__(self, store):
+        self.store = store
+        self.plans = {"workout": Payload(WORKOUT_PLAN), "meal": Payload(MEAL_PLAN),
+                      "notifications": Payload(NOTIFICATIONS)}
+        # Store calls are serialized on this thread, so the logs being
+        # serialized never change underneath a read
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+        self._payloads = OrderedDict()   # (user_id, since) -> (log version, Payload); store thread only
+        self._pending = {}               # user_id -> (weights, workouts, waiting futures)
+        self._pending_rows = 0
+        self._flush_timer = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        started = time.perf_counter()
+        method = scope["method"]
+        route = "unknown"
+        try:
+            route, response = await self._route(method, scope, receive)
+        except HTTPError as error:
+            response = _json(error.status, {"error": str(error)})
+            response.headers.extend(error.headers)
+        except ValueError as error:
+            response = _json(400, {"error": str(error)})
+        await send({"type": "http.response.start", "status": response.status, "headers": response.headers})
+        if isinstance(response.body, bytes) or method == "HEAD":
+            await send({"type": "http.response.body", "body": b"" if method == "HEAD" else response.body})
+        else:
+            # A stream of chunks, sent as they are produced
+            for chunk in response.body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        observe("api", f"{method} {route}", (time.perf_counter() - started) * 1000)
+
+    async def _route(self, method, scope, receive):
+        parts = scope["path"].strip("/").split("/")
+        headers = dict(scope["headers"])
+        reading = method in ("GET", "HEAD")
+        if len(parts) == 3 and parts[:2] == ["v1", "plans"] and parts[2] in self.plans:
+            _allow(reading, "GET, HEAD")
+            return "plans", _conditional(self.plans[parts[2]], headers)
+        if len(parts) == 4 and parts[:2] == ["v1", "users"]:
+            user_id, resource = check_user_id(parts[2]), parts[3]
+            if resource == "profile":
+                _allow(reading, "GET, HEAD")
+                return resource, _conditional(await self._in_store(self._profile_payload, user_id), headers)
+            if resource == "logs":
+                _allow(reading, "GET, HEAD")
+                query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+                since = _iso(query["since"][0], "since") if "since" in query else None
+                return resource, _conditional(await self._in_store(self._logs_payload, user_id, since),
+                                              headers)
+            if resource == "calendar.ics":
+                _allow(reading, "GET, HEAD")
+                profile = await self._in_store(self.store.profile, user_id)
+                return "calendar", _feed(*member_feed(user_id, profile), headers)
+            if resource in ("weights", "workouts"):
+                _allow(method == "POST", "POST")
+                body = await _read_body(receive)
+                if resource == "weights":
+                    written = await self._write(user_id, parse_weights(body), {})
+                else:
+                    written = await self._write(user_id, {}, parse_workouts(body))
+                return resource, _json(200, {"written": written})
+        if parts == ["metrics"]:
+            _allow(reading, "GET, HEAD")
+            body = prometheus_text().encode("utf-8")
+            return "metrics", Response(200, [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                                             (b"content-length", str(len(body)).encode("ascii"))], body)
+        raise HTTPError(404, f"No such resource: {scope['path']}")
+
+    # ---- store thread ----------------------------------------------------
+
+    async def _in_store(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _profile_payload(self, user_id):
+        return Payload({"user_id": user_id, **self.store.profile(user_id)})
+
+    def _logs_payload(self, user_id, since):
+        logs = self.store.logs(user_id)
+        key = (user_id, since)
+        cached = self._payloads.get(key)
+        if cached is not None and cached[0] == logs.version:
+            self._payloads.move_to_end(key)
+            return cached[1]
+        payload = Payload(logs_document(user_id, logs, since))
+        self._payloads[key] = (logs.version, payload)
+        while len(self._payloads) > PAYLOAD_CACHE_SIZE:
+            self._payloads.popitem(last=False)
+        return payload
+
+    def _commit(self, batch):
+        # {user_id: error} of the members whose transaction failed
+        failed = {}
+        for user_id, (weights, workouts, _) in batch.items():
+            try:
+                self.store.bulk_merge(user_id, weights, workouts)
+            except Exception as error:
+                failed[user_id] = error
+        return failed
+
+    # ---- write batching --------------------------------------------------
+
+    async def _write(self, user_id, weights, workouts):
+        """Queue rows for the next batch and wait for it to commit; returns the row count."""
+        loop = asyncio.get_running_loop()
+        committed = loop.create_future()
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = self._pending[user_id] = ({}, {}, [])
+        pending[0].update(weights)
+        pending[1].update(workouts)
+        pending[2].append(committed)
+        self._pending_rows += len(weights) + len(workouts)
+        if self._pending_rows >= BATCH_ROWS:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(BATCH_WINDOW, self._flush)
+        try:
+            await committed
+        except Exception as error:
+            print(f"Write for {user_id} failed: {error!r}", file=sys.stderr)
+            raise HTTPError(500, "Could not save; try again") from error
+        return len(weights) + len(workouts)
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        batch, self._pending, self._pending_rows = self._pending, {}, 0
+        if not batch:
+            return None
+        # One store thread, so batches commit in the order they were flushed
+        done = asyncio.get_running_loop().run_in_executor(self._executor, self._commit, batch)
+        done.add_done_callback(lambda _: _settle(batch, done))
+        return done
+
+    async def aclose(self):
+        """Commit whatever is queued, then close the store."""
+        done = self._flush()
+        if done is not None:
+            await asyncio.wait([done])
+        await self._in_store(self.store.close)
+        self._executor.shutdown()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _allow(allowed, methods):
+    if not allowed:
+        raise HTTPError(405, f"Allowed: {methods}", [(b"allow", methods.encode("ascii"))])
+
+
+def _settle(batch, done):
+    error = done.exception()
+    failed = {} if error else done.result()
+    for user_id, (_, _, waiting) in batch.items():
+        problem = error or failed.get(user_id)
+        for committed in waiting:
+            if committed.done():
+                continue   # the request was cancelled meanwhile
+            if problem:
+                committed.set_exception(problem)
+            else:
+                committed.set_result(None)
+
+
+def create_app(backend=STORE_BACKEND, data_dir=DATA_DIR):
+    return FitnessAPI(open_store(backend, data_dir))
+
+
+class LocalClient:
+    """Calls the app in-process, without a server or sockets."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, headers=None, body=b""):
+        path, _, query = path.partition("?")
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+                 "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+                 "query_string": query.encode(), "client": ("127.0.0.1", 0), "server": ("local", 80),
+                 "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]}
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app(scope, receive, send)
+        return Response(sent[0]["status"], {name.decode(): value.decode() for name, value in sent[0]["headers"]},
+                        b"".join(message.get("body", b"") for message in sent[1:]))
+
+    async def get(self, path, headers=None):
+        return await self.request("GET", path, headers)
+
+    async def post(self, path, document):
+        return await self.request("POST", path, {"content-type": "application/json"},
+                                  json.dumps(document).encode("utf-8"))
+
+
+# ---- benchmark -----------------------------------------------------------
+
+async def _timed_calls(call, requests, concurrency, expect):
+    latencies, unexpected = [], []
+
+    async def worker(first):
+        for i in range(first, requests, concurrency):
+            started = time.perf_counter()
+            response = await call(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status != expect:
+                unexpected.append(response.status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(first) for first in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {"requests": requests, "per_second": round(requests / elapsed),
+            "p50_ms": round(latencies[len(latencies) // 2], 2),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)], 2),
+            "unexpected": len(unexpected)}
+
+
+async def _bench(requests, concurrency, history_days=365):
+    from bench import BENCH_USER, seed_history
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        seed_history(data_dir, history_days)
+        app = create_app("sqlite", data_dir)
+        client = LocalClient(app)
+        logs_path = f"/v1/users/{BENCH_USER}/logs"
+        plan_etag = (await client.get("/v1/plans/workout")).headers["etag"]
+        logs_etag = (await client.get(logs_path)).headers["etag"]
+        today = date.today()
+        routes = {
+            "plan": (lambda i: client.get("/v1/plans/workout"), 200),
+            "plan 304": (lambda i: client.get("/v1/plans/workout", {"if-none-match": plan_etag}), 304),
+            "logs 304": (lambda i: client.get(logs_path, {"if-none-match": logs_etag}), 304),
+            "weights": (lambda i: client.post(f"/v1/users/bench{i % 100}/weights",
+                                              {"date": (today - timedelta(days=i // 100)).isoformat(),
+                                               "kg": 80 + i % 10}), 200),
+        }
+        report = {}
+        for name, (call, expect) in routes.items():
+            report[name] = await _timed_calls(call, requests, concurrency, expect)
+            print(f"{name}: {report[name]['per_second']} req/s, p50 {report[name]['p50_ms']} ms, "
+                  f"p99 {report[name]['p99_ms']} ms", file=sys.stderr)
+        await app.aclose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the plans and member logs as JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--bench", type=int, metavar="REQUESTS",
+                        help="time REQUESTS in-process calls per route against a seeded temporary store")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.bench:
+        print(json.dumps(asyncio.run(_bench(args.bench, args.concurrency)), indent=2))
+        return
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("Serving needs uvicorn: pip install uvicorn")
+    uvicorn.run(create_app(args.backend, args.data_dir), host=args.host, port=args.port,
+                access_log=False, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
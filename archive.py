@@ -0,0 +1,359 @@
+"""Columnar export of member logs and the memory-mapped weight archive.
+
+Exports write weights, workouts, meals and sets as Parquet, Arrow IPC or CSV,
+one row group (record batch for Arrow) per calendar month, so analytics
+tools can read them directly and skip months they don't need:
+
+    python archive.py export --user alice --format parquet --out exports/
+
+Weights older than HOT_DAYS move out of the live store into a per-member
+Arrow IPC file, also one record batch per month. The file is memory-mapped
+and range scans return numpy views into the mapping, so the app's memory
+stays flat however long a member has been logging:
+
+    python archive.py archive --keep-days 365
+"""
+import argparse
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from adherence import epoch_day, epoch_days
+from storage import DATA_DIR, STORE_BACKEND, check_user_id, open_store
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_FILE = "weights.arrow"
+# Weights from the last HOT_DAYS stay in the live store; older whole months
+# are moved once the oldest live weight is ARCHIVE_SLACK_DAYS past that.
+# Days count back from the newest weight when it is older than today, so a
+# member who stopped logging keeps their last year live
+HOT_DAYS = 365
+ARCHIVE_SLACK_DAYS = 31
+
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+# Archives kept mapped per process, least recently opened unmapped first
+ARCHIVE_CACHE_SIZE = 256
+
+_archives = OrderedDict()
+_lock = threading.Lock()
+
+
+def schemas():
+    """Arrow schema of each exported table. pyarrow is only imported by
+    exports and archives, so a page load without either doesn't pay for it."""
+    import pyarrow as pa
+
+    return {
+        "weights": pa.schema([("date", pa.date32()), ("kg", pa.float32())]),
+        "workouts": pa.schema([("date", pa.date32()), ("day", pa.string())]),
+        "meals": pa.schema([("date", pa.date32()), ("slot", pa.string())]),
+        "sets": pa.schema([("date", pa.date32()), ("exercise", pa.dictionary(pa.int32(), pa.string())),
+                           ("set", pa.int16()), ("reps", pa.int16()), ("kg", pa.float32())]),
+    }
+
+
+def archive_path(data_dir, user_id):
+    return Path(data_dir) / ARCHIVE_DIR / check_user_id(user_id) / ARCHIVE_FILE
+
+
+class WeightArchive:
+    """Read-only view of one member's archived weights.
+
+    Opening reads the file footer and the first and last date of each
+    monthly batch; range() then touches only the batches it overlaps.
+    """
+
+    def __init__(self, path):
+        import pyarrow as pa
+
+        self.path = Path(path)
+        stat = self.path.stat()
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+        self._source = pa.memory_map(str(self.path), "r")
+        self._reader = pa.ipc.open_file(self._source)
+        batches = self._reader.num_record_batches
+        self._first = np.empty(batches, dtype=np.int64)
+        self._last = np.empty(batches, dtype=np.int64)
+        self.rows = 0
+        for i in range(batches):
+            days, _ = self._columns(i)
+            self._first[i], self._last[i] = days[0], days[-1]
+            self.rows += len(days)
+
+    def _columns(self, i):
+        import pyarrow as pa
+
+        # Zero-copy numpy views: epoch days (int32) and kg (float32)
+        batch = self._reader.get_batch(i)
+        return (batch.column(0).view(pa.int32()).to_numpy(zero_copy_only=True),
+                batch.column(1).to_numpy(zero_copy_only=True))
+
+    def range(self, start=None, end=None):
+        """(epoch days, kg) for the inclusive 'YYYY-MM-DD' range; None = unbounded.
+
+        A range within one month is returned as views into the mapping; a
+        longer one is copied once, covering just that range.
+        """
+        first = epoch_day(start) if start else np.iinfo(np.int32).min
+        last = epoch_day(end) if end else np.iinfo(np.int32).max
+        parts = []
+        for i in np.flatnonzero((self._last >= first) & (self._first <= last)):
+            days, kg = self._columns(int(i))
+            lo = np.searchsorted(days, first)
+            hi = np.searchsorted(days, last, side="right")
+            parts.append((days[lo:hi], kg[lo:hi]))
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([d for d, _ in parts]), np.concatenate([k for _, k in parts])
+
+    def close(self):
+        # Views already handed out keep the mapped pages alive until dropped
+        self._source.close()
+
+    @property
+    def last_day(self):
+        return int(self._last[-1]) if len(self._last) else None
+
+    def __len__(self):
+        return self.rows
+
+
+def open_archive(path):
+    """Shared WeightArchive for path, reopened when the file changes; None if absent."""
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    with _lock:
+        archive = _archives.get(path)
+        # Replaced files stay mapped for whoever still holds the old views
+        if archive is None or archive.stamp != (stat.st_mtime_ns, stat.st_size):
+            if archive is not None:
+                archive.close()
+            archive = _archives[path] = WeightArchive(path)
+        _archives.move_to_end(path)
+        while len(_archives) > ARCHIVE_CACHE_SIZE:
+            _archives.popitem(last=False)[1].close()
+    return archive
+
+
+def weight_series(logs, archive=None, start=None, end=None):
+    """Weights for the inclusive range as (datetime64[D] array, float32 array).
+
+    Archived and live weights are combined; where both hold a day (a
+    backdated entry after archiving) the live value wins.
+    """
+    hot_dates, hot_kg = logs.weights_between(start or "0000-01-01", end or "9999-12-31")
+    days = epoch_days(hot_dates).astype(np.int32)
+    kg = np.asarray(hot_kg, dtype=np.float32)
+    if archive is not None:
+        cold_days, cold_kg = archive.range(start, end)
+        keep = ~np.isin(cold_days, days)
+        if keep.any():
+            # Archived days normally all precede the live ones
+            overlap = len(days) and cold_days[keep][-1] > days[0]
+            days = np.concatenate((cold_days[keep], days))
+            kg = np.concatenate((cold_kg[keep], kg))
+            if overlap:
+                order = np.argsort(days, kind="stable")
+                days, kg = days[order], kg[order]
+    return days.astype("datetime64[D]"), kg
+
+
+# ---- export ----------------------------------------------------------------
+
+def log_tables(logs, archive=None):
+    """The member's logs as Arrow tables sorted by date."""
+    import pyarrow as pa
+
+    schema = schemas()
+    days, kg = weight_series(logs, archive)
+    weights = pa.table([pa.array(days), pa.array(kg)], schema=schema["weights"])
+
+    workout_dates = sorted(logs.workout_completed)
+    workouts = pa.table([pa.array(epoch_days(workout_dates).astype("datetime64[D]")),
+                         pa.array([logs.workout_completed[d] for d in workout_dates], pa.string())],
+                        schema=schema["workouts"])
+
+    meals = list(logs.meal_bits.items())
+    meals = pa.table([pa.array(epoch_days([d for d, _ in meals]).astype("datetime64[D]")),
+                      pa.array([slot for _, slot in meals], pa.string())],
+                     schema=schema["meals"])
+
+    n = logs.sets.length
+    order = np.argsort(logs.sets.day[:n], kind="stable")
+    sets = pa.table([pa.array(logs.sets.day[:n][order].astype("datetime64[D]")),
+                     pa.DictionaryArray.from_arrays(pa.array(logs.sets.exercise[:n][order]),
+                                                    pa.array(logs.sets.names, pa.string())),
+                     pa.array(logs.sets.set_no[:n][order]), pa.array(logs.sets.reps[:n][order]),
+                     pa.array(logs.sets.kg[:n][order])],
+                    schema=schema["sets"])
+    return {"weights": weights, "workouts": workouts, "meals": meals, "sets": sets}
+
+
+def _months(table):
+    import pyarrow as pa
+
+    # One single-chunk slice per calendar month of a date-sorted table
+    table = table.combine_chunks()
+    days = table.column("date").chunk(0).view(pa.int32()).to_numpy() if table.num_rows else []
+    months = np.asarray(days, dtype="datetime64[D]").astype("datetime64[M]")
+    cuts = np.flatnonzero(months[1:] != months[:-1]) + 1
+    bounds = [0, *cuts.tolist(), table.num_rows]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi > lo:
+            yield table.slice(lo, hi - lo)
+
+
+def write_table(table, sink, fmt):
+    """Write table to a path or pyarrow sink, one row group per month."""
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(sink, table.schema) as writer:
+            for month in _months(table):
+                writer.write_table(month)
+    elif fmt == "arrow":
+        import pyarrow as pa
+
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            for month in _months(table):
+                writer.write_batch(month.to_batches()[0])
+    elif fmt == "csv":
+        import pyarrow.csv as pa_csv
+
+        with pa_csv.CSVWriter(sink, table.schema) as writer:
+            for month in _months(table):
+                writer.write_table(month)
+    else:
+        raise ValueError(f"Unknown export format: {fmt!r} (use {', '.join(EXPORT_FORMATS)})")
+
+
+def export_logs(logs, directory, fmt="parquet", archive=None):
+    """Write weights, workouts, meals and sets files into directory; returns their paths."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, table in log_tables(logs, archive).items():
+        path = directory / (name + EXPORT_FORMATS[fmt])
+        write_table(table, str(path), fmt)
+        paths.append(path)
+    return paths
+
+
+def export_zip(logs, fmt="parquet", archive=None):
+    """The same files zipped in memory, for a download button."""
+    import pyarrow as pa
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, table in log_tables(logs, archive).items():
+            sink = pa.BufferOutputStream()
+            write_table(table, sink, fmt)
+            zf.writestr(name + EXPORT_FORMATS[fmt], sink.getvalue().to_pybytes())
+    return out.getvalue()
+
+
+# ---- archiving -------------------------------------------------------------
+
+def _newest(logs, today=None):
+    # The day HOT_DAYS count back from: today, or the newest weight if older
+    return min(today or date.today(), date.fromisoformat(logs.weight_dates[-1]))
+
+
+def _cutoff(keep_days, newest):
+    # First day of the oldest month that stays live
+    return (newest - timedelta(days=keep_days)).replace(day=1)
+
+
+def archive_due(logs, keep_days=HOT_DAYS, today=None):
+    # O(1) check run on every page load
+    if not logs.weight_dates:
+        return False
+    oldest = _newest(logs, today) - timedelta(days=keep_days + ARCHIVE_SLACK_DAYS)
+    return logs.weight_dates[0] < oldest.isoformat()
+
+
+def archive_weights(store, user_id, data_dir=DATA_DIR, keep_days=HOT_DAYS, today=None):
+    """Move the member's weights before the cutoff month into their archive.
+
+    The newest weight and the keep_days before it always stay live.
+
+    The archive is rewritten next to the old one and swapped in before the
+    weights are dropped from the store, so a crash in between leaves them
+    in both places rather than in neither. Returns the days moved.
+    """
+    import pyarrow as pa
+
+    logs = store.logs(user_id)
+    if not logs.weight_dates:
+        return 0
+    cutoff = _cutoff(keep_days, _newest(logs, today))
+    dates, weights = logs.weights_between("0000-01-01", (cutoff - timedelta(days=1)).isoformat())
+    if not dates:
+        return 0
+
+    days = epoch_days(dates).astype(np.int32)
+    kg = np.asarray(weights, dtype=np.float32)
+    path = archive_path(data_dir, user_id)
+    existing = open_archive(path)
+    if existing is not None:
+        old_days, old_kg = existing.range()
+        keep = ~np.isin(old_days, days)
+        days = np.concatenate((old_days[keep], days))
+        kg = np.concatenate((old_kg[keep], kg))
+        order = np.argsort(days, kind="stable")
+        days, kg = days[order], kg[order]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    table = pa.table([pa.array(days.astype("datetime64[D]")), pa.array(kg)], schema=schemas()["weights"])
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        write_table(table, sink, "arrow")
+    os.replace(tmp_path, path)
+
+    store.drop_weights_before(user_id, cutoff.isoformat())
+    return len(dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export member logs or archive old weights")
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="write weights, workouts, meals and sets files")
+    export.add_argument("--user", required=True)
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="parquet")
+    export.add_argument("--out", type=Path, default=Path("exports"))
+
+    archive = commands.add_parser("archive", help="move old weights into the archive")
+    archive.add_argument("--user", help="one member (default: every member)")
+    archive.add_argument("--keep-days", type=int, default=HOT_DAYS)
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.data_dir)
+    if args.command == "export":
+        weights = open_archive(archive_path(args.data_dir, args.user))
+        for path in export_logs(store.logs(args.user), args.out / args.user, args.format, weights):
+            print(path)
+    else:
+        user_ids = [args.user] if args.user else [user_id for user_id, _ in store.members()]
+        for user_id in user_ids:
+            moved = archive_weights(store, user_id, args.data_dir, args.keep_days)
+            if moved:
+                print(f"{user_id}: archived {moved} days")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
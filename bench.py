@@ -0,0 +1,213 @@
+"""Headless rerun-latency benchmark for fitness_app.py.
+
+Each scenario seeds a fresh SQLite store with a synthetic member history
+(weights, workouts, meals and sets), then drives the app with Streamlit's
+AppTest: it opens every section and interacts with every widget on it,
+ROUNDS times. Scenarios run in their own process, so peak memory and the
+process-wide caches are per scenario, as on a fresh server.
+
+    python bench.py --out bench.json
+    python bench.py --scenarios 1y --baseline bench.json   # exit 1 on a p95 regression
+"""
+import argparse
+import importlib.metadata
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent / "fitness_app.py"
+
+# Scenario name -> days of history
+SCENARIOS = {"1d": 1, "1y": 365, "10y": 3650}
+ROUNDS = 5
+BENCH_USER = "default"
+# Allowed p95 growth over a baseline before --baseline fails
+REGRESSION_TOLERANCE = 0.2
+# Widgets the click-through leaves alone: sidebar profile saves reset
+# nothing worth measuring and uploads need a file
+SKIP_LABELS = ("Save Profile", "Import")
+
+
+def seed_history(data_dir, days, seed=0):
+    """A member with days of history ending yesterday, written straight to SQLite."""
+    from plans import CURRENT_WEIGHT, GOAL_PERIOD, MEAL_PLAN, TARGET_WEIGHT, WORKOUT_PLAN
+    from storage import SQLiteStore
+
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+    store = SQLiteStore(data_dir)
+    store.save_profile(BENCH_USER, {"start_date": start.isoformat(), "start_weight": CURRENT_WEIGHT,
+                                    "target_weight": TARGET_WEIGHT, "goal_period": GOAL_PERIOD})
+    weights, workouts, meals, sets = {}, {}, [], []
+    kg = CURRENT_WEIGHT
+    for i in range(days):
+        day = start + timedelta(days=i)
+        iso, weekday = day.isoformat(), day.strftime("%A")
+        # Eases toward the target and wanders around it, however long the history
+        kg += 0.005 * (TARGET_WEIGHT - kg) + rng.gauss(0, 0.1)
+        weights[iso] = round(kg + rng.gauss(0, 0.4), 1)
+        if rng.random() < 0.7:
+            workouts[iso] = weekday
+            for exercise in WORKOUT_PLAN[weekday]["exercises"]:
+                load = 20 + 40 * rng.random() + i * 0.01
+                sets += [(BENCH_USER, iso, exercise["name"], n, rng.randint(6, 12), round(load, 1))
+                         for n in range(1, exercise["sets"] + 1)]
+        meals += [(BENCH_USER, iso, slot) for slot in MEAL_PLAN if rng.random() < 0.8]
+    store.bulk_merge(BENCH_USER, weights, workouts)
+    with store.pool.transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO meals (user_id, date, slot) VALUES (?, ?, ?)", meals)
+        conn.executemany("INSERT OR REPLACE INTO sets (user_id, date, exercise, set_no, reps, kg) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", sets)
+        conn.execute("UPDATE members SET version = version + 1 WHERE user_id = ?", (BENCH_USER,))
+    store.close()
+
+
+def _interactions(at):
+    # (label, action) for every widget in the main area, found afresh each call
+    sidebar = {id(widget) for widget in at.sidebar}
+    for kind in ("button", "radio", "selectbox", "checkbox", "toggle"):
+        for widget in getattr(at, kind):
+            if id(widget) in sidebar or widget.label in SKIP_LABELS or widget.key == "section":
+                continue
+            if kind == "button":
+                yield f"button:{widget.label}", widget.click
+            elif kind in ("radio", "selectbox"):
+                for option in widget.options[1:]:
+                    yield f"{kind}:{widget.label}={option}", lambda w=widget, o=option: w.set_value(o)
+            else:
+                yield f"{kind}:{widget.label}", widget.toggle if kind == "toggle" else widget.check
+
+
+def run_scenario(rounds):
+    """Time every rerun of the click-through; returns the scenario report."""
+    from streamlit.testing.v1 import AppTest
+
+    timings, errors = {}, []
+
+    def timed(at, section, run):
+        started = time.perf_counter()
+        run()
+        elapsed = (time.perf_counter() - started) * 1000
+        timings.setdefault(section, []).append(elapsed)
+        errors.extend(f"{section}: {error.message}" for error in at.exception)
+        return elapsed
+
+    at = AppTest.from_file(str(APP), default_timeout=600)
+    first_run = timed(at, "first run", at.run)
+    sections = list(at.radio(key="section").options)
+    for _ in range(rounds):
+        for section in sections:
+            timed(at, section, at.radio(key="section").set_value(section).run)
+            timed(at, section, at.run)
+            seen = set()
+            while True:
+                # Widgets come and go as others are used; take the next one not yet used
+                pending = [(label, act) for label, act in _interactions(at) if label not in seen]
+                if not pending:
+                    break
+                label, act = pending[0]
+                seen.add(label)
+                timed(at, section, lambda: act().run())
+                if at.radio(key="section").value != section:
+                    break
+
+    # The app runs in this process, so its startup timings are here too
+    from metrics import totals
+
+    return {"first_run_ms": round(first_run, 1),
+            "startup_ms": {name: round(total, 1) for name, (_, total) in totals("startup").items()},
+            "errors": len(errors),
+            "error_messages": sorted(set(errors)),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            **_summary([t for section, values in timings.items() if section != "first run" for t in values]),
+            "sections": {section: _summary(values) for section, values in timings.items()
+                         if section != "first run"}}
+
+
+def _summary(values):
+    import numpy as np
+
+    values = np.asarray(values)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0, 0, 0)
+    return {"reruns": len(values), "p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1), "max_ms": round(float(values.max()), 1) if len(values) else 0}
+
+
+def _days(scenario):
+    if scenario in SCENARIOS:
+        return SCENARIOS[scenario]
+    count, unit = int(scenario[:-1]), scenario[-1]
+    return count * {"d": 1, "y": 365}[unit]
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP.parent, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _regressions(report, baseline):
+    for name, scenario in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before and scenario["p95_ms"] > before["p95_ms"] * (1 + REGRESSION_TOLERANCE):
+            yield f"{name}: p95 {before['p95_ms']:.0f} -> {scenario['p95_ms']:.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fitness_app.py reruns headlessly")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma-separated history lengths: 1d, 1y, 10y, 30d, ...")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--out", type=Path, help="JSON report (default: stdout)")
+    parser.add_argument("--baseline", type=Path, help="earlier report; exit 1 if a scenario's p95 regressed")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # One scenario in this process; the store was seeded by the parent
+        print(json.dumps(run_scenario(args.rounds)))
+        return
+
+    report = {"commit": _commit(), "python": platform.python_version(),
+              "streamlit": importlib.metadata.version("streamlit"), "rounds": args.rounds,
+              "scenarios": {}}
+    for name in args.scenarios.split(","):
+        with tempfile.TemporaryDirectory() as data_dir:
+            seed_history(data_dir, _days(name))
+            env = {**os.environ, "FITNESS_DATA_DIR": data_dir, "FITNESS_STORE": "sqlite"}
+            worker = subprocess.run([sys.executable, __file__, "--worker", name, "--rounds", str(args.rounds)],
+                                    env=env, capture_output=True, text=True)
+        if worker.returncode:
+            sys.exit(f"{name} failed:\n{worker.stderr}")
+        scenario = json.loads(worker.stdout.strip().splitlines()[-1])
+        report["scenarios"][name] = {"history_days": _days(name), **scenario}
+        print(f"{name}: p50 {scenario['p50_ms']:.0f} ms, p95 {scenario['p95_ms']:.0f} ms, "
+              f"p99 {scenario['p99_ms']:.0f} ms, peak {scenario['peak_rss_mb']:.0f} MB "
+              f"({scenario['reruns']} reruns, {scenario['errors']} errors)", file=sys.stderr)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        args.out.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if args.baseline:
+        regressions = list(_regressions(report, json.loads(args.baseline.read_text(encoding="utf-8"))))
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from adherence import calendar_heatmap
+from archive import weight_series
+from metrics import span
+from trend import BAND_Z, MAX_HORIZON_DAYS, TREND_DAYS, smooth
+
+# Roughly the plot width of the wide layout in pixels; there is no point
+# shipping more points than can be drawn
+CHART_POINTS = 1000
+# Above this many points the trace is drawn with WebGL
+WEBGL_THRESHOLD = 2000
+FIGURE_CACHE_SIZE = 256
+# The forecast runs to the later of the projected target date and the goal
+# date, but at least this many days
+MIN_FORECAST_DAYS = 30
+
+_figures = OrderedDict()
+_lock = threading.Lock()
+
+
+def weight_columns(dates, weights):
+    # Columnar copy of a weight log: day-resolution datetime64 and float32
+    return np.asarray(dates, dtype="datetime64[D]"), np.asarray(weights, dtype=np.float32)
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most n_out points that preserve the visual
+    shape of the series (peaks and troughs survive, unlike plain striding).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Bucket means from prefix sums, computed for all buckets at once
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    next_start = edges[1:]
+    next_end = np.append(edges[2:], n)
+    counts = next_end - next_start
+    avg_x = (cx[next_end] - cx[next_start]) / counts
+    avg_y = (cy[next_end] - cy[next_start]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def build_weight_figure(dates, weights, start_date, start_weight, target_weight, goal_period,
+                        points=CHART_POINTS, levels=None, forecast=None):
+    import plotly.graph_objects as go
+
+    # levels: smoothed trend at each reading; forecast: (dates, mean, lower, upper)
+    x, y = weight_columns(dates, weights)
+    keep = lttb(x, y, points)
+    x, y = x[keep], y[keep]
+
+    scatter = go.Scattergl if len(dates) > WEBGL_THRESHOLD else go.Scatter
+    mode = 'lines' if len(x) > 200 else 'lines+markers'
+
+    fig = go.Figure()
+    fig.add_trace(scatter(x=x, y=y, mode=mode,
+                          name='Actual Weight', line=dict(color='#FF4B4B', width=3)))
+    if levels is not None:
+        fig.add_trace(scatter(x=x, y=np.round(levels[keep], 2), mode='lines',
+                              name='Trend', line=dict(color='#2CA02C', width=2)))
+    if forecast is not None:
+        days, mean, lower, upper = forecast
+        fig.add_trace(go.Scatter(x=days, y=upper, mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=days, y=lower, mode='lines', line=dict(width=0),
+                                 fill='tonexty', fillcolor='rgba(44, 160, 44, 0.15)',
+                                 name='Forecast range', hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=days, y=mean, mode='lines', name='Forecast',
+                                 line=dict(color='#2CA02C', width=2, dash='dot')))
+
+    # Add target line
+    goal_date = datetime.strptime(start_date, '%Y-%m-%d') + timedelta(days=goal_period)
+    target_dates = [start_date, goal_date.strftime('%Y-%m-%d')]
+    target_weights = [start_weight, target_weight]
+    fig.add_trace(go.Scatter(x=target_dates, y=target_weights, mode='lines',
+                             name='Target', line=dict(color='#1F77B4', width=2, dash='dash')))
+
+    # A windowed chart stays on its window although the target line starts earlier
+    if len(x) and str(x[0]) > start_date:
+        last = str(forecast[0][-1]) if forecast is not None else str(x[-1])
+        fig.update_xaxes(range=[str(x[0]), max(last, target_dates[1])])
+
+    fig.update_layout(title='Weight Loss Journey',
+                      xaxis_title='Date',
+                      yaxis_title='Weight (kg)',
+                      hovermode='x unified')
+    return fig
+
+
+def build_heatmap_figure(z, week_starts, title):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Heatmap(
+        z=z.T, x=week_starts, y=['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+        zmin=0, zmax=1, colorscale='Greens', xgap=2, ygap=2,
+        hovertemplate='Week of %{x}, %{y}: %{z:.0%}<extra></extra>'))
+    fig.update_layout(title=title, yaxis_autorange='reversed', height=300,
+                      margin=dict(t=40, b=20))
+    return fig
+
+
+def _cached_figure(key, build):
+    # Keys include the member's log version, which every write bumps, so an
+    # unchanged log costs a dictionary lookup
+    with _lock:
+        fig = _figures.get(key)
+        if fig is not None:
+            _figures.move_to_end(key)
+            return fig
+
+    # Only misses are timed; key[0] names the chart
+    with span("figure", key[0]):
+        fig = build()
+    with _lock:
+        _figures[key] = fig
+        while len(_figures) > FIGURE_CACHE_SIZE:
+            _figures.popitem(last=False)
+    return fig
+
+
+def trend_forecast(trend, target_weight, goal_date):
+    """(dates, mean, lower, upper) of a member's TrendFilter from the last
+    reading onwards, or None until the trend is ready."""
+    if not trend.ready:
+        return None
+    last = np.datetime64(date.fromordinal(trend.day), 'D')
+    expected = trend.target_dates(target_weight)[0]
+    end = max(expected or goal_date, goal_date)
+    horizon = min(max((np.datetime64(end, 'D') - last).astype(int), MIN_FORECAST_DAYS), MAX_HORIZON_DAYS)
+    steps = np.arange(horizon + 1)
+    mean, sd = trend.forecast(steps)
+    return (last + steps, np.round(mean, 2), np.round(mean - BAND_Z * sd, 2),
+            np.round(mean + BAND_Z * sd, 2))
+
+
+def weight_figure(user_id, logs, profile, points=CHART_POINTS, archive=None, start=None):
+    # start: first 'YYYY-MM-DD' to plot (None = whole history, archive included)
+    key = ('weight', user_id, logs.version, archive.stamp if archive else None, start,
+           profile['start_date'], profile['start_weight'], profile['target_weight'],
+           profile['goal_period'], points)
+
+    def build():
+        # The trend line is warmed up on readings before the window
+        warmup = (date.fromisoformat(start) - timedelta(days=TREND_DAYS)).isoformat() if start else None
+        dates, weights = weight_series(logs, archive, warmup)
+        levels = smooth(dates.astype(np.int64), weights)
+        if start:
+            shown = dates >= np.datetime64(start, 'D')
+            dates, weights, levels = dates[shown], weights[shown], levels[shown]
+        goal_date = date.fromisoformat(profile['start_date']) + timedelta(days=profile['goal_period'])
+        return build_weight_figure(dates, weights,
+                                   profile['start_date'], profile['start_weight'],
+                                   profile['target_weight'], profile['goal_period'], points,
+                                   levels, trend_forecast(logs.aggregates.trend, profile['target_weight'],
+                                                          goal_date))
+
+    return _cached_figure(key, build)
+
+
+def build_volume_figure(volume, weeks):
+    import plotly.graph_objects as go
+
+    volume = volume.tail(weeks)
+    fig = go.Figure([go.Bar(x=volume.index, y=volume[focus].round(), name=focus)
+                     for focus in volume.columns])
+    fig.update_layout(title='Weekly Volume by Focus', barmode='stack', xaxis_title='Week of',
+                      yaxis_title='Volume (reps x kg)', hovermode='x unified')
+    return fig
+
+
+def build_1rm_figure(best, records, exercise):
+    import plotly.graph_objects as go
+
+    series = best[exercise].dropna()
+    scatter = go.Scattergl if len(series) > WEBGL_THRESHOLD else go.Scatter
+    fig = go.Figure()
+    fig.add_trace(scatter(x=series.index, y=series.to_numpy(), mode='lines+markers',
+                          name='Best estimated 1RM', line=dict(color='#1F77B4', width=2)))
+    prs = records[records['exercise'] == exercise]
+    fig.add_trace(go.Scatter(x=prs['date'], y=prs['e1rm'], mode='markers', name='Personal record',
+                             marker=dict(color='#FF4B4B', size=10, symbol='star')))
+    fig.update_layout(title=f'{exercise} - Estimated 1RM', xaxis_title='Date',
+                      yaxis_title='kg', hovermode='x unified')
+    return fig
+
+
+def volume_figure(user_id, logs, report, weeks=26):
+    key = ('volume', user_id, logs.version, tuple(report.weekly_volume.columns), weeks)
+    return _cached_figure(key, lambda: build_volume_figure(report.weekly_volume, weeks))
+
+
+def one_rm_figure(user_id, logs, report, exercise):
+    key = ('1rm', user_id, logs.version, exercise)
+    return _cached_figure(key, lambda: build_1rm_figure(report.best_1rm, report.records, exercise))
+
+
+def adherence_heatmap_figure(user_id, logs, slots, first, last):
+    key = ('adherence', user_id, logs.version, tuple(slots), first, last)
+
+    def build():
+        z, week_starts = calendar_heatmap(logs.meal_bits, slots, first, last)
+        return build_heatmap_figure(z, week_starts, 'Meals Completed per Day')
+
+    return _cached_figure(key, build)
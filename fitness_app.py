@@ -1,317 +1,202 @@
+import time
+# The first run in a process times the cold imports below
+IMPORTS_STARTED = time.perf_counter()
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
+import streamlit.components.v1 as components
 from datetime import datetime, timedelta
 import json
+from collections import deque
+import os
 from pathlib import Path
+from string import Template
+from zoneinfo import ZoneInfo, available_timezones
+
+from adherence import epoch_day, worst_slot
+from archive import EXPORT_FORMATS, archive_due, archive_path, archive_weights, export_zip, open_archive
+from charts import adherence_heatmap_figure, one_rm_figure, volume_figure, weight_figure
+from ical import member_feed
+from importer import MAX_WEIGHT_KG, MIN_WEIGHT_KG, import_file
+from meal_generator import DIETS, TOLERANCE, generate_plan, missed_targets
+from media import MEASUREMENT_PARTS, PHOTO_TYPES, MediaStore
+from metrics import (METRICS_FILE, METRICS_PORT, TimedCalls, add_listener, begin_rerun, export_file,
+                     finish_rerun, observe, observe_size, payload_bytes, preload, serve, slowest, span,
+                     timed, totals)
+from notifier import current_reminder, next_reminder
+from overload import member_schedule
+from plan_compiler import (compile_bullets, compile_meal_plan, compile_milestones, compile_program,
+                           compile_workout_plan, markdown_table)
+from plans import (AVOID_FOODS, CURRENT_WEIGHT, GOAL_PERIOD, MEAL_PLAN, MILESTONES, NOTIFICATIONS,
+                   NUTRITION_TIPS, SUCCESS_FACTORS, TARGET_WEIGHT, WORKOUT_PLAN, WORKOUT_TIPS)
+from storage import DATA_DIR, STORE_BACKEND, open_store
+from strength import strength_report
+from targets import ACTIVITY_FACTORS, BODY_DEFAULTS, SEXES, member_targets
+
+IMPORT_MS = (time.perf_counter() - IMPORTS_STARTED) * 1000
+
+# Everything from here to the end of the script is one page rerun
+page_rerun = begin_rerun("page")
+
+STYLE_FILE = Path(__file__).resolve().parent / "style.css"
+# Libraries the default page doesn't need; after the first page is sent
+# they are imported in the background so other sections don't wait on
+# them (FITNESS_PRELOAD=0 leaves them to load on first use)
+PRELOAD_MODULES = ("pandas", "pyarrow", "plotly.graph_objects")
+PRELOAD = os.environ.get("FITNESS_PRELOAD", "1") == "1"
 
 # Page configuration
 st.set_page_config(page_title="Fitness & Nutrition Tracker", page_icon="💪", layout="wide")
 
-# Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #FF4B4B;
-        text-align: center;
-        padding: 1rem;
-    }
-    .sub-header {
-        font-size: 1.8rem;
-        font-weight: bold;
-        color: #1F77B4;
-        margin-top: 2rem;
-    }
-    .meal-card {
-        background-color: #f0f2f6;
-        padding: 1.5rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border-left: 5px solid #FF4B4B;
-    }
-    .workout-card {
-        background-color: #e8f4f8;
-        padding: 1.5rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border-left: 5px solid #1F77B4;
-    }
-    .metric-card {
-        background-color: #fff;
-        padding: 1rem;
-        border-radius: 8px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    .notification-box {
-        background-color: #fff3cd;
-        border: 2px solid #ffc107;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'start_date' not in st.session_state:
-    st.session_state.start_date = datetime.now()
-if 'current_weight' not in st.session_state:
-    st.session_state.current_weight = 74.5
-if 'weight_log' not in st.session_state:
-    st.session_state.weight_log = {datetime.now().strftime('%Y-%m-%d'): 74.5}
-if 'workout_completed' not in st.session_state:
-    st.session_state.workout_completed = {}
-if 'meals_completed' not in st.session_state:
-    st.session_state.meals_completed = {}
-
-# Your personalized data
-CURRENT_WEIGHT = 74.5
-TARGET_WEIGHT = 70.0
-GOAL_PERIOD = 90  # 3 months
-WEEKLY_LOSS = (CURRENT_WEIGHT - TARGET_WEIGHT) / (GOAL_PERIOD / 7)  # ~0.38 kg per week
-
-# Calculate daily caloric needs
-# For 74.5 kg, moderate activity, male (assumed): BMR ≈ 1800
-# For muscle gain + fat loss: deficit of 300-500 calories
-DAILY_CALORIES = 2200
-PROTEIN_G = 150  # 2g per kg body weight
-CARBS_G = 220
-FATS_G = 60
-
-# Comprehensive 3-Month Workout Plan
-WORKOUT_PLAN = {
-    "Monday": {
-        "focus": "Chest & Triceps",
-        "exercises": [
-            {"name": "Bench Press", "sets": 4, "reps": "8-10", "rest": "90s"},
-            {"name": "Incline Dumbbell Press", "sets": 3, "reps": "10-12", "rest": "60s"},
-            {"name": "Cable Chest Fly", "sets": 3, "reps": "12-15", "rest": "60s"},
-            {"name": "Push-ups", "sets": 3, "reps": "15-20", "rest": "45s"},
-            {"name": "Tricep Dips", "sets": 3, "reps": "10-12", "rest": "60s"},
-            {"name": "Tricep Pushdowns", "sets": 3, "reps": "12-15", "rest": "45s"},
-            {"name": "Overhead Tricep Extension", "sets": 3, "reps": "12-15", "rest": "45s"},
-        ],
-        "cardio": "10 min treadmill warm-up, 15 min HIIT post-workout"
-    },
-    "Tuesday": {
-        "focus": "Back & Biceps",
-        "exercises": [
-            {"name": "Pull-ups/Lat Pulldown", "sets": 4, "reps": "8-10", "rest": "90s"},
-            {"name": "Barbell Rows", "sets": 4, "reps": "8-10", "rest": "90s"},
-            {"name": "Seated Cable Rows", "sets": 3, "reps": "10-12", "rest": "60s"},
-            {"name": "Face Pulls", "sets": 3, "reps": "15-20", "rest": "45s"},
-            {"name": "Dumbbell Bicep Curls", "sets": 4, "reps": "10-12", "rest": "60s"},
-            {"name": "Hammer Curls", "sets": 3, "reps": "12-15", "rest": "45s"},
-            {"name": "Cable Bicep Curls", "sets": 3, "reps": "12-15", "rest": "45s"},
-        ],
-        "cardio": "10 min cycling warm-up, 20 min steady-state cardio"
-    },
-    "Wednesday": {
-        "focus": "Legs & Core",
-        "exercises": [
-            {"name": "Squats", "sets": 4, "reps": "8-10", "rest": "2min"},
-            {"name": "Leg Press", "sets": 3, "reps": "10-12", "rest": "90s"},
-            {"name": "Romanian Deadlifts", "sets": 3, "reps": "10-12", "rest": "90s"},
-            {"name": "Leg Curls", "sets": 3, "reps": "12-15", "rest": "60s"},
-            {"name": "Calf Raises", "sets": 4, "reps": "15-20", "rest": "45s"},
-            {"name": "Planks", "sets": 3, "reps": "60s hold", "rest": "60s"},
-            {"name": "Hanging Leg Raises", "sets": 3, "reps": "12-15", "rest": "60s"},
-        ],
-        "cardio": "15 min stair climber"
-    },
-    "Thursday": {
-        "focus": "Shoulders & Arms",
-        "exercises": [
-            {"name": "Overhead Press", "sets": 4, "reps": "8-10", "rest": "90s"},
-            {"name": "Lateral Raises", "sets": 4, "reps": "12-15", "rest": "60s"},
-            {"name": "Front Raises", "sets": 3, "reps": "12-15", "rest": "60s"},
-            {"name": "Rear Delt Fly", "sets": 3, "reps": "12-15", "rest": "60s"},
-            {"name": "Barbell Curls", "sets": 3, "reps": "10-12", "rest": "60s"},
-            {"name": "Skull Crushers", "sets": 3, "reps": "10-12", "rest": "60s"},
-            {"name": "21s (Biceps)", "sets": 2, "reps": "21", "rest": "90s"},
-        ],
-        "cardio": "20 min cycling intervals"
-    },
-    "Friday": {
-        "focus": "Full Body Power",
-        "exercises": [
-            {"name": "Deadlifts", "sets": 4, "reps": "6-8", "rest": "2min"},
-            {"name": "Incline Bench Press", "sets": 3, "reps": "8-10", "rest": "90s"},
-            {"name": "Weighted Pull-ups", "sets": 3, "reps": "6-8", "rest": "90s"},
-            {"name": "Dumbbell Shoulder Press", "sets": 3, "reps": "10-12", "rest": "60s"},
-            {"name": "Cable Rows", "sets": 3, "reps": "10-12", "rest": "60s"},
-            {"name": "Dips", "sets": 3, "reps": "10-12", "rest": "60s"},
-        ],
-        "cardio": "15 min HIIT treadmill sprints"
-    },
-    "Saturday": {
-        "focus": "Active Recovery & Core",
-        "exercises": [
-            {"name": "Light Cardio (Walking/Cycling)", "sets": 1, "reps": "30-45 min", "rest": "-"},
-            {"name": "Yoga/Stretching", "sets": 1, "reps": "20 min", "rest": "-"},
-            {"name": "Planks", "sets": 3, "reps": "60s", "rest": "60s"},
-            {"name": "Russian Twists", "sets": 3, "reps": "20", "rest": "45s"},
-            {"name": "Mountain Climbers", "sets": 3, "reps": "30s", "rest": "45s"},
-        ],
-        "cardio": "Light activity only"
-    },
-    "Sunday": {
-        "focus": "Rest Day",
-        "exercises": [
-            {"name": "Complete Rest or Light Walk", "sets": 1, "reps": "30 min", "rest": "-"},
-            {"name": "Meal Prep for Week", "sets": 1, "reps": "-", "rest": "-"},
-            {"name": "Recovery & Sleep Focus", "sets": 1, "reps": "8+ hours", "rest": "-"},
-        ],
-        "cardio": "Optional: 20 min walk"
-    }
-}
+# Custom CSS, read once per process. Style-only HTML goes to the page's
+# event container, so it takes no space and skips markdown rendering
+@st.cache_resource
+def page_style():
+    return f"<style>{STYLE_FILE.read_text(encoding='utf-8')}</style>"
+
+st.html(page_style())
+
+# "lazy" renders only the selected section; "tabs" renders every section on
+# each rerun inside st.tabs
+RENDER_MODE = os.environ.get("FITNESS_RENDER_MODE", "lazy")
+
+def _no_fragment(func=None, **kwargs):
+    return func if func is not None else (lambda f: f)
+
+# Widgets inside a fragment rerun only their own function, not the whole page
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or _no_fragment
+# Self-contained HTML + JS in an iframe (st.iframe supersedes components.html)
+embed_html = getattr(st, "iframe", None) or components.html
+
+def render(element, name, data, **kwargs):
+    # Elements serialize their data inside the call (Plotly figures to JSON),
+    # so this times the serialization too
+    observe_size(name, payload_bytes(data))
+    with span("render", name):
+        return element(data, **kwargs)
 
-# Comprehensive Meal Plan
-MEAL_PLAN = {
-    "Early Morning (6:00 AM)": {
-        "items": [
-            "1 glass warm water with lemon",
-            "5-10 soaked almonds",
-        ],
-        "calories": 80,
-        "protein": 3,
-        "purpose": "Kickstart metabolism"
-    },
-    "Pre-Workout (7:00 AM)": {
-        "items": [
-            "1 banana",
-            "1 scoop whey protein with water",
-            "Black coffee (optional)",
-        ],
-        "calories": 200,
-        "protein": 25,
-        "purpose": "Energy for workout"
-    },
-    "Breakfast (9:00 AM)": {
-        "items": [
-            "4 egg whites + 1 whole egg (scrambled/boiled)",
-            "2 whole wheat bread slices or 1 cup oats",
-            "1 cup milk or greek yogurt",
-            "Mixed vegetables (cucumber, tomato)",
-        ],
-        "calories": 450,
-        "protein": 35,
-        "purpose": "Post-workout recovery"
-    },
-    "Mid-Morning Snack (11:30 AM)": {
-        "items": [
-            "1 apple or orange",
-            "10-12 roasted cashews or peanuts",
-            "Green tea",
-        ],
-        "calories": 180,
-        "protein": 5,
-        "purpose": "Sustained energy"
-    },
-    "Lunch (1:30 PM)": {
-        "items": [
-            "150g grilled chicken breast or 200g paneer/tofu",
-            "1.5 cups brown rice or 3 chapatis",
-            "1 cup dal (lentils)",
-            "Large mixed salad with olive oil",
-            "1 cup curd/yogurt",
-        ],
-        "calories": 600,
-        "protein": 45,
-        "purpose": "Main meal - muscle building"
-    },
-    "Evening Snack (4:30 PM)": {
-        "items": [
-            "1 cup sprouts or boiled chickpeas",
-            "Green tea or buttermilk",
-            "4-5 whole grain crackers",
-        ],
-        "calories": 200,
-        "protein": 12,
-        "purpose": "Pre-evening energy"
-    },
-    "Dinner (8:00 PM)": {
-        "items": [
-            "150g grilled fish/chicken or 150g paneer",
-            "2 chapatis or 1 cup quinoa",
-            "Mixed vegetable curry (no oil)",
-            "Clear vegetable soup",
-            "Small bowl of salad",
-        ],
-        "calories": 450,
-        "protein": 40,
-        "purpose": "Light dinner for recovery"
-    },
-    "Before Bed (10:00 PM)": {
-        "items": [
-            "1 glass warm milk or casein protein shake",
-            "5 almonds",
-        ],
-        "calories": 150,
-        "protein": 10,
-        "purpose": "Overnight muscle recovery"
+# ?debug=1 (or FITNESS_DEBUG=1) adds a sidebar panel with the slowest spans
+# of the session's last DEBUG_RERUNS reruns
+DEBUG_PANEL = os.environ.get("FITNESS_DEBUG") == "1"
+DEBUG_RERUNS = 20
+
+def remember_rerun(rerun):
+    st.session_state.setdefault('reruns', deque(maxlen=DEBUG_RERUNS)).append(rerun)
+
+# Metric exporters and the per-session rerun log are set up once per process
+@st.cache_resource
+def start_metrics(_import_ms):
+    observe("startup", "imports", _import_ms)
+    add_listener(remember_rerun)
+    if METRICS_FILE:
+        export_file(METRICS_FILE)
+    if METRICS_PORT:
+        serve(METRICS_PORT)
+    return True
+
+start_metrics(IMPORT_MS)
+
+@st.cache_resource
+def preload_libraries():
+    if PRELOAD:
+        preload(PRELOAD_MODULES)
+    return True
+
+# Member store - opened once per server process; connections are pooled
+# and shared by every session. Every call is timed
+@st.cache_resource
+def get_store():
+    return TimedCalls(open_store(STORE_BACKEND, DATA_DIR), "store")
+
+store = get_store()
+
+def current_logs():
+    # Fragments rerun without the top of the script, and writes replace the
+    # cached logs rather than changing them, so fragments read them afresh
+    return store.logs(user_id)
+
+# Progress photos and their thumbnail workers, shared by every session
+@st.cache_resource
+def get_media():
+    return MediaStore(DATA_DIR)
+
+media = get_media()
+# Photo dates per timeline page; only that page's thumbnails are read
+PHOTO_DATES_PER_PAGE = 6
+PHOTO_COLUMNS = 4
+MEASUREMENT_ROWS = 12
+
+# Each member is identified by ?user=<id> in the URL
+user_id = st.query_params.get("user", "default")
+try:
+    profile = store.profile(user_id)
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+
+if profile['start_date'] is None:
+    # First visit - start the member on the default program. Weights already
+    # on file (imported before the first visit) are kept, and the latest one
+    # is the start weight; CURRENT_WEIGHT is only logged when there are none
+    today = datetime.now().strftime('%Y-%m-%d')
+    logs = store.logs(user_id)
+    start_weight = logs.weight_log[logs.weight_dates[-1]] if logs.weight_dates else CURRENT_WEIGHT
+    profile = {
+        'start_date': today,
+        'start_weight': start_weight,
+        'target_weight': TARGET_WEIGHT,
+        'goal_period': GOAL_PERIOD,
+        'timezone': None,
+        'diet': None,
+        'sex': None,
+        'age': None,
+        'height_cm': None,
+        'activity': None,
     }
-}
+    store.save_profile(user_id, profile)
+    if not logs.weight_dates:
+        store.log_weight(user_id, today, CURRENT_WEIGHT)
 
-# Notification schedule
-NOTIFICATIONS = {
-    "06:00": "⏰ Good Morning! Time to wake up and drink warm lemon water",
-    "07:00": "🍌 Pre-workout meal time! Have banana + protein shake",
-    "07:30": "💪 GYM TIME! Let's crush today's workout",
-    "09:00": "🍳 Post-workout breakfast - Your muscles need protein!",
-    "11:30": "🍎 Mid-morning snack time - Stay fueled",
-    "13:30": "🍽️ Lunch time - Your biggest meal of the day",
-    "16:30": "☕ Evening snack - Healthy options only",
-    "20:00": "🌙 Dinner time - Keep it light and protein-rich",
-    "22:00": "🥛 Before bed - Warm milk for recovery",
-    "22:30": "😴 Sleep time - Recovery is crucial for muscle growth"
-}
+logs = store.logs(user_id)
+# Weights older than a year move to a memory-mapped archive, so the live
+# logs stay the same size however old the account gets
+if archive_due(logs):
+    archive_weights(store, user_id, DATA_DIR)
+    logs = store.logs(user_id)
+weight_archive = open_archive(archive_path(DATA_DIR, user_id))
+weekly_loss = (profile['start_weight'] - profile['target_weight']) / (profile['goal_period'] / 7)
 
-# Tips and guidelines
-NUTRITION_TIPS = [
-    "Drink 3-4 liters of water daily",
-    "Avoid sugar, fried foods, and processed snacks",
-    "Eat protein with every meal (eggs, chicken, fish, paneer, dal)",
-    "Include green vegetables in lunch and dinner",
-    "No eating after 10 PM",
-    "Cheat meal allowed once per week (Sunday lunch)",
-    "Track your weight every Monday morning",
-    "Sleep 7-8 hours daily for muscle recovery",
-    "Take rest days seriously - muscles grow during rest",
-    "Progressive overload - increase weight gradually"
-]
-
-WORKOUT_TIPS = [
-    "Warm up for 10 minutes before lifting",
-    "Focus on form over heavy weights initially",
-    "Breathe properly - exhale on effort",
-    "Stretch after every workout for 10 minutes",
-    "Track your weights and aim to increase gradually",
-    "Rest 48 hours between training same muscle group",
-    "Stay hydrated during workouts",
-    "Mind-muscle connection is key"
-]
+st.session_state.start_date = datetime.strptime(profile['start_date'], '%Y-%m-%d')
+st.session_state.current_weight = logs.latest_weight(profile['start_weight'])
+# Daily targets follow the profile and the latest logged weight
+targets = member_targets(profile, st.session_state.current_weight)
+
+# Plan artifacts are compiled once per process and reused until the plan changes
+WORKOUT_ARTIFACTS = compile_workout_plan(WORKOUT_PLAN)
+MEAL_ARTIFACTS = compile_meal_plan(MEAL_PLAN)
+PROGRAM = compile_program(WORKOUT_PLAN)
+# The member's dated 12-week schedule; built once, then only synced with new sets
+schedule = member_schedule(user_id, profile, logs, WORKOUT_PLAN)
 
 # Main App
 def main():
     st.markdown('<div class="main-header">💪 Your Personal Fitness & Nutrition Coach</div>', unsafe_allow_html=True)
     
+    show_member_profile()
+    
     # Calculate progress
+    goal_period = profile['goal_period']
     days_elapsed = (datetime.now() - st.session_state.start_date).days
-    days_remaining = GOAL_PERIOD - days_elapsed
-    progress_percent = (days_elapsed / GOAL_PERIOD) * 100 if days_elapsed <= GOAL_PERIOD else 100
+    days_remaining = goal_period - days_elapsed
+    progress_percent = (days_elapsed / goal_period) * 100 if days_elapsed <= goal_period else 100
     
     # Top metrics
     col1, col2, col3, col4, col5 = st.columns(5)
     with col1:
         st.metric("Current Weight", f"{st.session_state.current_weight} kg", 
-                 f"{st.session_state.current_weight - CURRENT_WEIGHT:.1f} kg")
+                 f"{st.session_state.current_weight - profile['start_weight']:.1f} kg")
     with col2:
-        st.metric("Target Weight", f"{TARGET_WEIGHT} kg")
+        st.metric("Target Weight", f"{profile['target_weight']} kg")
     with col3:
-        st.metric("To Lose", f"{st.session_state.current_weight - TARGET_WEIGHT:.1f} kg")
+        st.metric("To Lose", f"{st.session_state.current_weight - profile['target_weight']:.1f} kg")
     with col4:
         st.metric("Days Elapsed", f"{days_elapsed} days")
     with col5:
@@ -321,30 +206,66 @@ def main():
     st.progress(min(progress_percent / 100, 1.0))
     st.markdown(f"**Progress: {min(progress_percent, 100):.1f}% Complete**")
     
-    # Tabs for different sections
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-        "📅 Today's Plan", "🍽️ Full Meal Plan", "💪 Workout Details", 
-        "📊 Progress Tracker", "🔔 Notifications", "📚 Guidelines"
-    ])
-    
-    with tab1:
-        show_todays_plan()
-    
-    with tab2:
-        show_full_meal_plan()
-    
-    with tab3:
-        show_workout_details()
-    
-    with tab4:
-        show_progress_tracker()
-    
-    with tab5:
-        show_notifications()
+    if RENDER_MODE == "tabs":
+        # Tabs for different sections
+        for tab, show_section in zip(st.tabs(list(SECTIONS)), SECTIONS.values()):
+            with tab:
+                show_section()
+    else:
+        # Only the selected section is built on each rerun
+        section = st.radio("Section", list(SECTIONS), horizontal=True,
+                           key="section", label_visibility="collapsed")
+        SECTIONS[section]()
     
-    with tab6:
-        show_guidelines()
+    if DEBUG_PANEL or st.query_params.get("debug") == "1":
+        show_debug_panel()
+
+@timed("section")
+def show_member_profile():
+    with st.sidebar:
+        st.markdown(f"### 👤 Member: {user_id}")
+        with st.form("member_profile"):
+            start_weight = st.number_input("Starting weight (kg)", min_value=30.0, max_value=300.0,
+                                           value=float(profile['start_weight']), step=0.1)
+            target_weight = st.number_input("Target weight (kg)", min_value=30.0, max_value=300.0,
+                                            value=float(profile['target_weight']), step=0.1)
+            goal_period = st.number_input("Goal period (days)", min_value=7, max_value=730,
+                                          value=int(profile['goal_period']), step=1)
+            zones = timezone_options()
+            timezone = st.selectbox("Time zone for reminders", zones,
+                                    index=zones.index(profile['timezone'] or SERVER_TIME))
+            sex = st.selectbox("Sex", SEXES, index=SEXES.index(profile['sex'] or BODY_DEFAULTS['sex']),
+                               format_func=str.capitalize)
+            age = st.number_input("Age", min_value=14, max_value=100,
+                                  value=int(profile['age'] or BODY_DEFAULTS['age']), step=1)
+            height_cm = st.number_input("Height (cm)", min_value=120.0, max_value=230.0,
+                                        value=float(profile['height_cm'] or BODY_DEFAULTS['height_cm']), step=0.5)
+            levels = list(ACTIVITY_FACTORS)
+            activity = st.selectbox("Activity level", levels,
+                                    index=levels.index(profile['activity'] or BODY_DEFAULTS['activity']),
+                                    format_func=lambda level: level.replace('_', ' ').capitalize())
+            diets = list(DIETS)
+            diet = st.selectbox("Diet", diets, index=diets.index(profile['diet'] or "any"),
+                                format_func=str.capitalize)
+            if st.form_submit_button("Save Profile"):
+                store.save_profile(user_id, {'start_weight': start_weight,
+                                             'target_weight': target_weight,
+                                             'goal_period': int(goal_period),
+                                             'timezone': None if timezone == SERVER_TIME else timezone,
+                                             'diet': diet,
+                                             'sex': sex,
+                                             'age': int(age),
+                                             'height_cm': height_cm,
+                                             'activity': activity})
+                st.rerun()
 
+SERVER_TIME = "Server time"
+
+@st.cache_data
+def timezone_options():
+    return [SERVER_TIME] + sorted(available_timezones())
+
+@timed("section")
 def show_todays_plan():
     st.markdown('<div class="sub-header">📅 Today\'s Complete Schedule</div>', unsafe_allow_html=True)
     
@@ -355,50 +276,225 @@ def show_todays_plan():
     
     # Today's Workout
     st.markdown("### 💪 Today's Workout")
-    workout = WORKOUT_PLAN.get(today, {})
+    workout = WORKOUT_ARTIFACTS.days.get(today)
     
     if workout:
-        st.markdown(f"**Focus: {workout['focus']}**")
-        
-        workout_df = pd.DataFrame(workout['exercises'])
-        st.table(workout_df)
-        
-        st.markdown(f"**Cardio:** {workout['cardio']}")
+        st.markdown(f"**Focus: {workout.focus}**")
+        show_session_estimate(today)
+        date_key = datetime.now().strftime('%Y-%m-%d')
+        week = schedule.week_of(date_key)
+        if week is not None:
+            st.caption(f"Week {week} - {schedule.phase(week).name} phase")
+            render(st.markdown, "schedule table", schedule.markdown(date_key))
+        else:
+            render(st.markdown, "schedule table", workout.table_md)
+        st.markdown(workout.cardio_md)
         
-        if st.button(f"✅ Mark {today}'s Workout Complete"):
-            date_key = datetime.now().strftime('%Y-%m-%d')
-            st.session_state.workout_completed[date_key] = today
-            st.success(f"Great job! {today}'s workout marked complete! 🎉")
+        show_live_session(today)
+        show_set_logger(today)
+        show_workout_complete_button(today)
     
     st.markdown("---")
     
     # Today's Meals
     st.markdown("### 🍽️ Today's Meal Schedule")
-    
-    for meal_time, meal_info in MEAL_PLAN.items():
-        with st.expander(f"**{meal_time}** - {meal_info['purpose']}", expanded=False):
-            st.markdown(f"**Calories:** {meal_info['calories']} | **Protein:** {meal_info['protein']}g")
-            for item in meal_info['items']:
-                st.markdown(f"- {item}")
-            
-            if st.checkbox(f"Completed {meal_time}", key=f"meal_{meal_time}"):
-                date_key = f"{datetime.now().strftime('%Y-%m-%d')}_{meal_time}"
-                st.session_state.meals_completed[date_key] = True
+    show_meal_checklist()
     
     # Daily summary
-    total_calories = sum(meal['calories'] for meal in MEAL_PLAN.values())
-    total_protein = sum(meal['protein'] for meal in MEAL_PLAN.values())
-    
     st.markdown("---")
     st.markdown("### 📊 Daily Nutrition Summary")
-    col1, col2, col3 = st.columns(3)
+    # Totals are computed from the plan items; deltas are against the member's targets
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Calories", f"{total_calories} kcal")
+        st.metric("Total Calories", f"{MEAL_ARTIFACTS.total_calories} kcal",
+                  f"{MEAL_ARTIFACTS.total_calories - targets['calories']:+.0f} vs {targets['calories']:.0f} target",
+                  delta_color="off")
     with col2:
-        st.metric("Total Protein", f"{total_protein}g")
+        st.metric("Total Protein", f"{MEAL_ARTIFACTS.total_protein}g",
+                  f"{MEAL_ARTIFACTS.total_protein - targets['protein']:+.0f}g vs {targets['protein']:.0f}g target",
+                  delta_color="off")
     with col3:
-        st.metric("Target", f"{DAILY_CALORIES} kcal")
+        st.metric("Total Carbs", f"{MEAL_ARTIFACTS.total_carbs}g",
+                  f"{MEAL_ARTIFACTS.total_carbs - targets['carbs']:+.0f}g vs {targets['carbs']:.0f}g target",
+                  delta_color="off")
+    with col4:
+        st.metric("Total Fats", f"{MEAL_ARTIFACTS.total_fats}g",
+                  f"{MEAL_ARTIFACTS.total_fats - targets['fats']:+.0f}g vs {targets['fats']:.0f}g target",
+                  delta_color="off")
+    st.caption(f"Targets from your profile: BMR {targets['bmr']:.0f} kcal, TDEE {targets['tdee']:.0f} kcal, "
+               f"{targets['weekly_loss']:.2f} kg/week still to lose to reach {profile['target_weight']} kg on time.")
+
+@timed("section")
+def show_session_estimate(day):
+    stats = PROGRAM.day_stats(day)
+    st.caption(f"⏱️ ~{stats.session_minutes} min session incl. rest and cardio | "
+               f"{stats.total_sets} sets | ~{stats.total_reps} reps")
+
+# Rest countdown drawn in the browser: it ticks every 100 ms without any
+# server round trip, so resting members cost nothing until their next set
+REST_TIMER_HTML = Template("""
+<div id="timer" style="font: 600 2rem sans-serif; color: #1F77B4; text-align: center;"></div>
+<script>
+const end = Date.now() + $remaining_ms;
+const timer = document.getElementById("timer");
+function tick() {
+    const left = Math.max(0, end - Date.now());
+    if (left > 0) {
+        const seconds = Math.floor(left / 1000);
+        timer.textContent = "⏱️ Rest " + Math.floor(seconds / 60) + ":" +
+            String(seconds % 60).padStart(2, "0") + "." + Math.floor(left % 1000 / 100);
+        setTimeout(tick, 100);
+    } else {
+        timer.textContent = "💪 Go! " + $next;
+        timer.style.color = "#FF4B4B";
+    }
+}
+tick();
+</script>
+""")
+
+@fragment
+@timed("section")
+def show_live_session(today):
+    # Set-by-set mode for today's schedule; every widget here reruns only this fragment
+    logs = current_logs()
+    date_key = datetime.now().strftime('%Y-%m-%d')
+    steps = schedule.session(date_key)
+    if not steps:
+        return
+    prefix = f"live_{user_id}_{date_key}"
+    if not st.session_state.get(prefix):
+        st.button("▶️ Start Live Session", on_click=start_live_session, args=(prefix,))
+        return
+    
+    done = [st.session_state.get(f"{prefix}_{i}", False) for i in range(len(steps))]
+    st.progress(sum(done) / len(steps), text=f"{sum(done)} of {len(steps)} sets done")
+    current = next((i for i, finished in enumerate(done) if not finished), None)
+    
+    rest_until = st.session_state.get(f"{prefix}_rest")
+    if current is not None and rest_until and rest_until > time.time():
+        step = steps[current]
+        embed_html(REST_TIMER_HTML.substitute(
+            remaining_ms=int((rest_until - time.time()) * 1000),
+            next=json.dumps(f"{step.exercise}, set {step.set_no}")), height=60)
+    
+    if current is None:
+        st.success("🏁 Session complete - great work!")
+        if date_key not in logs.workout_completed:
+            store.mark_workout(user_id, date_key, today)
+    else:
+        step = steps[current]
+        target = f"{step.reps} reps" if step.loaded else step.reps
+        if step.kg is not None:
+            target += f" @ {step.kg:g} kg"
+        st.markdown(f"#### {step.exercise} - set {step.set_no} of {step.sets}: {target}")
+        if step.loaded:
+            last = logs.sets.last(step.exercise)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.number_input("Reps done", min_value=0, max_value=100, value=step.reps, step=1,
+                                key=f"{prefix}_{current}_reps")
+            with col2:
+                st.number_input("Weight (kg)", min_value=0.0, max_value=500.0, step=2.5,
+                                value=step.kg if step.kg is not None else (last[1] if last else 0.0),
+                                key=f"{prefix}_{current}_kg")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.button("✅ Set Done", on_click=finish_set, args=(prefix, current, step, date_key))
+        with col2:
+            st.button("⏭️ Skip Set", on_click=skip_set, args=(prefix, current))
+        with col3:
+            st.button("⏹️ End Session", on_click=end_live_session, args=(prefix, len(steps)))
+    
+    with st.expander("☑️ Set checklist"):
+        for i, step in enumerate(steps):
+            st.checkbox(f"{step.exercise} - set {step.set_no}/{step.sets}", key=f"{prefix}_{i}")
+
+def start_live_session(prefix):
+    st.session_state[prefix] = True
+
+def finish_set(prefix, i, step, date_key):
+    st.session_state[f"{prefix}_{i}"] = True
+    if step.loaded:
+        reps = st.session_state[f"{prefix}_{i}_reps"]
+        if reps:
+            store.log_set(user_id, date_key, step.exercise, step.set_no, int(reps),
+                          st.session_state[f"{prefix}_{i}_kg"])
+    st.session_state[f"{prefix}_rest"] = time.time() + step.rest_seconds if step.rest_seconds else None
+
+def skip_set(prefix, i):
+    st.session_state[f"{prefix}_{i}"] = True
+    st.session_state[f"{prefix}_rest"] = None
+
+def end_live_session(prefix, count):
+    for key in [prefix, f"{prefix}_rest", *(f"{prefix}_{i}" for i in range(count))]:
+        st.session_state.pop(key, None)
+
+@fragment
+@timed("section")
+def show_set_logger(today):
+    # Loaded lifts only; timed holds and lifestyle items have nothing to log
+    logs = current_logs()
+    exercises = [exercise for exercise in PROGRAM.exercises(today)
+                 if exercise.reps_high and not exercise.hold_seconds]
+    if not exercises:
+        return
+    date_key = datetime.now().strftime('%Y-%m-%d')
+    logged = st.session_state.pop('set_logged', None)
+    if logged:
+        st.toast(logged)
+    with st.expander("🏋️ Log Sets", expanded=logged is not None):
+        col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+        with col1:
+            names = [exercise.name for exercise in exercises]
+            name = st.selectbox("Exercise", names)
+        exercise = exercises[names.index(name)]
+        done = logs.sets.count(date_key, name)
+        # Fresh inputs for every set; defaults carry over from the last session
+        key = f"set_{date_key}_{name}_{done}"
+        last_reps, last_kg = logs.sets.last(name) or (exercise.reps_high, 0.0)
+        with col2:
+            st.number_input("Set", min_value=1, max_value=20, value=min(done + 1, 20), step=1, key=f"{key}_no")
+        with col3:
+            st.number_input("Reps", min_value=1, max_value=100, value=last_reps, step=1, key=f"{key}_reps")
+        with col4:
+            st.number_input("Weight (kg)", min_value=0.0, max_value=500.0, value=last_kg, step=2.5,
+                            key=f"{key}_kg")
+        # Logged in the click callback, so this run already shows the new set
+        st.button("Log Set", on_click=log_set, args=(date_key, name, key))
+        # The frame (and pandas) only once something was logged today
+        if logs.sets.count(date_key):
+            render(st.dataframe, "sets table", logs.sets.on(date_key), hide_index=True,
+                   use_container_width=True)
+
+def log_set(date_key, name, key):
+    set_no, reps, kg = (st.session_state[f"{key}_{field}"] for field in ("no", "reps", "kg"))
+    store.log_set(user_id, date_key, name, int(set_no), int(reps), kg)
+    st.session_state.set_logged = f"{name}: set {set_no} - {reps} x {kg:g} kg logged"
+
+@fragment
+@timed("section")
+def show_workout_complete_button(today):
+    if st.button(f"✅ Mark {today}'s Workout Complete"):
+        date_key = datetime.now().strftime('%Y-%m-%d')
+        store.mark_workout(user_id, date_key, today)
+        st.success(f"Great job! {today}'s workout marked complete! 🎉")
+
+@fragment
+@timed("section")
+def show_meal_checklist():
+    logs = current_logs()
+    date_key = datetime.now().strftime('%Y-%m-%d')
+    for meal_time, meal in MEAL_ARTIFACTS.slots.items():
+        with st.expander(meal.expander_label, expanded=False):
+            st.markdown(meal.summary_md)
+            st.markdown(meal.items_md)
+            
+            done = st.checkbox(f"Completed {meal_time}", key=f"meal_{user_id}_{date_key}_{meal_time}",
+                               value=logs.meal_done(date_key, meal_time))
+            store.set_meal(user_id, date_key, meal_time, done)
 
+@timed("section")
 def show_full_meal_plan():
     st.markdown('<div class="sub-header">🍽️ Complete 3-Month Meal Plan</div>', unsafe_allow_html=True)
     
@@ -410,14 +506,9 @@ def show_full_meal_plan():
     - Support recovery and muscle growth
     """)
     
-    for meal_time, meal_info in MEAL_PLAN.items():
+    for meal in MEAL_ARTIFACTS.slots.values():
         st.markdown(f'<div class="meal-card">', unsafe_allow_html=True)
-        st.markdown(f"### {meal_time}")
-        st.markdown(f"**Purpose:** {meal_info['purpose']}")
-        st.markdown(f"**Nutrition:** {meal_info['calories']} calories | {meal_info['protein']}g protein")
-        st.markdown("**Items:**")
-        for item in meal_info['items']:
-            st.markdown(f"- {item}")
+        st.markdown(meal.card_md)
         st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown("---")
@@ -435,7 +526,47 @@ def show_full_meal_plan():
     - Fruits: Apple, Orange, Banana, Berries, Papaya
     - Nuts: Almonds, Walnuts, Cashews, Peanuts (limited quantity)
     """)
+    
+    show_plan_generator()
+
+@fragment
+@timed("section")
+def show_plan_generator():
+    st.markdown("### 🧮 Generate a Plan")
+    diet = profile['diet'] or "any"
+    st.caption(f"Swaps and portions chosen to land within ±{TOLERANCE['calories']:.0%} of "
+               f"{targets['calories']:.0f} kcal and close to your macro targets ({diet} diet - change it in your profile).")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        days = st.radio("Length", [1, 7], horizontal=True, format_func=lambda n: "Day" if n == 1 else "Week")
+    with col2:
+        if st.button("🔀 Shuffle"):
+            st.session_state.plan_seed = st.session_state.get('plan_seed', 0) + 1
+    
+    generated = generate_plan(targets, diet, days, st.session_state.get('plan_seed', 0))
+    missed = [number for number, day in enumerate(generated.days, 1) if not day.within_tolerance]
+    if missed:
+        which = "this day" if days == 1 else "day " + ", ".join(map(str, missed))
+        st.warning(f"⚠️ Targets not met for {which}: no mix of {diet} swaps and portions lands within "
+                   f"tolerance of your targets. Use the closest plan below as a starting point, or "
+                   f"try Shuffle or another diet.")
+    for number, day in enumerate(generated.days, 1):
+        totals = day.totals
+        status = "✅" if day.within_tolerance else "⚠️"
+        label = (f"{status} Day {number}: {totals['calories']:.0f} kcal | {totals['protein']:.0f}g protein | "
+                 f"{totals['carbs']:.0f}g carbs | {totals['fats']:.0f}g fats")
+        with st.expander(label, expanded=days == 1):
+            misses = missed_targets(totals, generated.targets)
+            if misses:
+                st.caption("Targets not met: " + ", ".join(
+                    f"{macro} {deviation:+.0%} (target {generated.targets[macro]:.0f}"
+                    f"{' kcal' if macro == 'calories' else 'g'})"
+                    for macro, deviation in misses.items()))
+            for meal in compile_meal_plan(day.plan).slots.values():
+                st.markdown(f"**{meal.slot}** - {meal.summary_md}")
+                st.markdown(meal.items_md)
 
+@timed("section")
 def show_workout_details():
     st.markdown('<div class="sub-header">💪 Complete Workout Program</div>', unsafe_allow_html=True)
     
@@ -447,28 +578,7 @@ def show_workout_details():
     - Adequate cardio for fat loss
     """)
     
-    # Week selector
-    week_num = st.selectbox("Select Week to View", 
-                            ["Week 1-4 (Foundation)", "Week 5-8 (Building)", "Week 9-12 (Peak)"])
-    
-    if "Week 1-4" in week_num:
-        st.info("🎯 **Focus:** Learn proper form, build base strength, moderate weights")
-    elif "Week 5-8" in week_num:
-        st.info("🎯 **Focus:** Increase weights by 5-10%, focus on mind-muscle connection")
-    else:
-        st.info("🎯 **Focus:** Peak performance, maximum intensity, push your limits")
-    
-    # Show all days
-    for day, workout in WORKOUT_PLAN.items():
-        st.markdown(f'<div class="workout-card">', unsafe_allow_html=True)
-        st.markdown(f"### {day} - {workout['focus']}")
-        
-        # Create DataFrame for exercises
-        df = pd.DataFrame(workout['exercises'])
-        st.table(df)
-        
-        st.markdown(f"**Cardio:** {workout['cardio']}")
-        st.markdown('</div>', unsafe_allow_html=True)
+    show_week_schedule()
     
     st.markdown("---")
     st.markdown("### 📈 Progressive Overload Strategy")
@@ -484,65 +594,152 @@ def show_workout_details():
     - Rest is crucial - don't train same muscle group on consecutive days
     """)
 
+@fragment
+@timed("section")
+def show_week_schedule():
+    # Week selector over the member's dated schedule, opening on the current week
+    weeks = list(range(1, schedule.weeks + 1))
+    current = schedule.week_of(datetime.now().strftime('%Y-%m-%d')) or 1
+    week = st.selectbox("Select Week to View", weeks, index=current - 1,
+                        format_func=lambda w: f"Week {w} ({schedule.phase(w).name})")
+    st.info(f"🎯 **Focus:** {schedule.phase(week).focus}")
+    
+    for date_key in schedule.dates(week):
+        day = datetime.strptime(date_key, '%Y-%m-%d').strftime('%A')
+        workout = WORKOUT_ARTIFACTS.days.get(day)
+        if workout is None:
+            continue
+        st.markdown(f'<div class="workout-card">', unsafe_allow_html=True)
+        st.markdown(f"{workout.heading_md} ({date_key})")
+        show_session_estimate(day)
+        render(st.markdown, "schedule table", schedule.markdown(date_key))
+        st.markdown(workout.cardio_md)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+@fragment
+@timed("section")
+def show_weight_entry():
+    st.markdown("### ⚖️ Log Today's Weight")
+    new_weight = st.number_input("Enter your weight (kg)", 
+                                 min_value=MIN_WEIGHT_KG, max_value=MAX_WEIGHT_KG, 
+                                 value=float(st.session_state.current_weight), step=0.1)
+    
+    if st.button("Update Weight"):
+        today = datetime.now().strftime('%Y-%m-%d')
+        store.log_weight(user_id, today, new_weight)
+        st.session_state.current_weight = new_weight
+        st.toast(f"Weight updated to {new_weight} kg! Keep going! 💪")
+        # The stats and chart depend on the new weight
+        st.rerun()
+
+@timed("section")
+def show_history_import():
+    report = st.session_state.pop('import_report', None)
+    if report is not None:
+        summary = report.summary()
+        st.success(f"Imported {summary['weights']:,} daily weights and {summary['workouts']:,} workouts "
+                   f"from {summary['rows']:,} rows ({summary['duplicates']:,} duplicates skipped).")
+        if report.rejected:
+            st.warning("Rejected rows: " + ", ".join(f"{reason} ({count:,})"
+                                                    for reason, count in report.rejected.items()))
+            st.download_button("Download rejected rows", report.rejected_csv(),
+                               file_name="rejected_rows.csv", mime="text/csv")
+    
+    with st.expander("📥 Import history from a scale or tracker export"):
+        upload = st.file_uploader("CSV, JSON or JSON Lines export", type=["csv", "json", "jsonl", "ndjson"])
+        if upload is not None and st.button("Import"):
+            bar = st.progress(0.0, text="Importing...")
+            try:
+                report = import_file(store, user_id, upload, upload.name, upload.size,
+                                     lambda fraction, rows: bar.progress(fraction, text=f"{rows:,} rows read"),
+                                     tz=profile['timezone'])
+            except ValueError as e:
+                st.error(f"Could not import {upload.name}: {e}")
+                return
+            st.session_state.import_report = report
+            # The stats and chart need the merged logs
+            st.rerun()
+
+@fragment
+@timed("section")
+def show_history_export():
+    logs = current_logs()
+    with st.expander("📤 Export history"):
+        fmt = st.selectbox("Format", list(EXPORT_FORMATS), format_func=str.capitalize)
+        if st.button("Prepare export"):
+            st.download_button(f"Download {fmt} files (zip)", export_zip(logs, fmt, weight_archive),
+                               file_name=f"{user_id}-{fmt}.zip", mime="application/zip")
+
+# Chart window -> days back from today (None = whole history)
+CHART_RANGES = {"90 days": 90, "1 year": 365, "All": None}
+
+@fragment
+@timed("section")
+def show_weight_chart():
+    st.markdown("### 📉 Weight Progress Chart")
+    logs = current_logs()
+    window = st.radio("Range", list(CHART_RANGES), horizontal=True, label_visibility="collapsed")
+    days = CHART_RANGES[window]
+    start = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d') if days else None
+    render(st.plotly_chart, "weight chart", weight_figure(user_id, logs, profile, archive=weight_archive,
+                                                         start=start), use_container_width=True)
+
+@timed("section")
 def show_progress_tracker():
     st.markdown('<div class="sub-header">📊 Progress Tracking & Analytics</div>', unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown("### ⚖️ Log Today's Weight")
-        new_weight = st.number_input("Enter your weight (kg)", 
-                                     min_value=60.0, max_value=90.0, 
-                                     value=st.session_state.current_weight, step=0.1)
-        
-        if st.button("Update Weight"):
-            today = datetime.now().strftime('%Y-%m-%d')
-            st.session_state.weight_log[today] = new_weight
-            st.session_state.current_weight = new_weight
-            st.success(f"Weight updated to {new_weight} kg! Keep going! 💪")
+        show_weight_entry()
     
     with col2:
         st.markdown("### 📈 Current Stats")
-        weight_lost = CURRENT_WEIGHT - st.session_state.current_weight
-        remaining_loss = st.session_state.current_weight - TARGET_WEIGHT
+        weight_lost = profile['start_weight'] - st.session_state.current_weight
+        remaining_loss = st.session_state.current_weight - profile['target_weight']
+        goal_loss = profile['start_weight'] - profile['target_weight']
         
         st.metric("Total Weight Lost", f"{weight_lost:.1f} kg", 
-                 f"{(weight_lost/4.5)*100:.1f}% of goal")
+                 f"{(weight_lost/goal_loss)*100 if goal_loss else 0:.1f}% of goal")
         st.metric("Remaining to Lose", f"{remaining_loss:.1f} kg")
         
-        expected_loss = WEEKLY_LOSS * ((datetime.now() - st.session_state.start_date).days / 7)
-        if weight_lost >= expected_loss:
-            st.success("🎉 You're on track or ahead!")
+        # Judged on the smoothed trend so one heavy morning doesn't flip the banner
+        trend = logs.aggregates.trend
+        if trend.ready:
+            st.metric("Trend Weight", f"{trend.level:.1f} kg", f"{trend.weekly_change:+.2f} kg/wk",
+                      delta_color="inverse")
+            goal_date = (st.session_state.start_date + timedelta(days=profile['goal_period'])).date()
+            expected, earliest, latest = trend.target_dates(profile['target_weight'])
+            if trend.level <= profile['target_weight']:
+                st.success("🎯 Your trend has reached the target weight!")
+            elif expected is not None and expected <= goal_date:
+                st.success(f"🎉 You're on track or ahead! Trend reaches {profile['target_weight']} kg "
+                           f"around {expected:%d %b %Y}" + (f" ({earliest:%d %b} – {latest:%d %b %Y})"
+                                                            if latest else ""))
+            elif expected is not None:
+                st.warning(f"⚠️ Need to push harder on diet and cardio: at this rate you reach "
+                           f"{profile['target_weight']} kg around {expected:%d %b %Y}, after your "
+                           f"{goal_date:%d %b %Y} goal date")
+            else:
+                st.warning("⚠️ Need to push harder on diet and cardio: your trend isn't heading "
+                           "to the target yet")
         else:
-            st.warning("⚠️ Need to push harder on diet and cardio")
+            expected_loss = weekly_loss * ((datetime.now() - st.session_state.start_date).days / 7)
+            if weight_lost >= expected_loss:
+                st.success("🎉 You're on track or ahead!")
+            else:
+                st.warning("⚠️ Need to push harder on diet and cardio")
+    
+    show_history_import()
+    show_history_export()
     
     # Weight chart
-    if len(st.session_state.weight_log) > 1:
-        st.markdown("### 📉 Weight Progress Chart")
-        
-        dates = list(st.session_state.weight_log.keys())
-        weights = list(st.session_state.weight_log.values())
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=dates, y=weights, mode='lines+markers',
-                                name='Actual Weight', line=dict(color='#FF4B4B', width=3)))
-        
-        # Add target line
-        target_dates = [dates[0], (st.session_state.start_date + timedelta(days=GOAL_PERIOD)).strftime('%Y-%m-%d')]
-        target_weights = [CURRENT_WEIGHT, TARGET_WEIGHT]
-        fig.add_trace(go.Scatter(x=target_dates, y=target_weights, mode='lines',
-                                name='Target', line=dict(color='#1F77B4', width=2, dash='dash')))
-        
-        fig.update_layout(title='Weight Loss Journey',
-                         xaxis_title='Date',
-                         yaxis_title='Weight (kg)',
-                         hovermode='x unified')
-        
-        st.plotly_chart(fig, use_container_width=True)
+    if len(logs.weight_dates) + (len(weight_archive) if weight_archive else 0) > 1:
+        show_weight_chart()
     
     # Workout completion
     st.markdown("### 💪 Workout Completion")
-    completed_days = len(st.session_state.workout_completed)
+    completed_days = len(logs.workout_completed)
     total_days = (datetime.now() - st.session_state.start_date).days
     completion_rate = (completed_days / total_days * 100) if total_days > 0 else 0
     
@@ -555,7 +752,185 @@ def show_progress_tracker():
         st.info("👍 Good job, but room for improvement")
     else:
         st.warning("⚠️ Need more consistency for best results")
+    
+    show_strength_progress()
+    show_trend_cards(total_days)
+
+@fragment
+@timed("section")
+def show_strength_progress():
+    st.markdown("### 🏋️ Strength Progress")
+    logs = current_logs()
+    if not len(logs.sets):
+        st.info("Log your sets from Today's Workout to track volume, estimated 1RM and personal records.")
+        return
+    report = strength_report(user_id, logs, WORKOUT_PLAN)
+    render(st.plotly_chart, "volume chart", volume_figure(user_id, logs, report), use_container_width=True)
+    lifts = list(report.best_1rm.columns)
+    if lifts:
+        lift = st.selectbox("Exercise", lifts, key="strength_lift")
+        render(st.plotly_chart, "1rm chart", one_rm_figure(user_id, logs, report, lift),
+               use_container_width=True)
+    if len(report.records):
+        st.markdown("**🏆 Recent Personal Records**")
+        render(st.dataframe, "records table", report.records.tail(10).iloc[::-1], hide_index=True,
+               use_container_width=True)
+
+@timed("section")
+def show_trend_cards(total_days):
+    # Every value here is read from the aggregates kept current on each write
+    aggregates = logs.aggregates
+    st.markdown("### 🔥 Streaks & Trends")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("Current Streak", f"{aggregates.current_streak()} days")
+    with col2:
+        st.metric("Longest Streak", f"{aggregates.longest_streak} days")
+    with col3:
+        avg7 = aggregates.rolling_average(7)
+        st.metric("7-Day Average", f"{avg7:.1f} kg" if avg7 is not None else "-")
+    with col4:
+        avg28 = aggregates.rolling_average(28)
+        st.metric("28-Day Average", f"{avg28:.1f} kg" if avg28 is not None else "-")
+    with col5:
+        rate = aggregates.weekly_loss_rate(profile['start_date'], profile['start_weight'])
+        st.metric("Weekly Loss Rate", f"{rate:.2f} kg/wk" if rate is not None else "-",
+                  f"{rate - weekly_loss:+.2f} vs target" if rate is not None else None)
+    
+    st.markdown("### 🍽️ Meal Adherence")
+    days_tracked = max(total_days, 0) + 1
+    for meal_time in MEAL_PLAN:
+        adherence = aggregates.meal_adherence(meal_time, days_tracked)
+        st.progress(adherence, text=f"{meal_time}: {adherence * 100:.0f}%")
+    
+    show_adherence_heatmap()
+
+@timed("section")
+def show_adherence_heatmap():
+    st.markdown("### 🗓️ Last 90 Days")
+    slots = list(MEAL_PLAN)
+    last = epoch_day(datetime.now().strftime('%Y-%m-%d'))
+    first = last - 89
+    
+    render(st.plotly_chart, "adherence heatmap", adherence_heatmap_figure(user_id, logs, slots, first, last),
+           use_container_width=True)
+    
+    slot, rate = worst_slot(logs.meal_bits, slots, first, last)
+    st.info(f"🎯 Most skipped meal: **{slot}** ({rate * 100:.0f}% completed)")
+
+@timed("section")
+def show_progress_media():
+    st.markdown('<div class="sub-header">📸 Progress Photos & Measurements</div>', unsafe_allow_html=True)
+    st.markdown("Take progress photos every 2 weeks and measure chest, arms and waist monthly.")
+    
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        show_photo_upload()
+        show_photo_timeline()
+    with col2:
+        show_measurements()
+
+@fragment
+@timed("section")
+def show_photo_upload():
+    with st.expander("📤 Add progress photos"):
+        # A fresh key empties the uploader once its photos are saved
+        uploads = st.file_uploader("Photos", type=PHOTO_TYPES, accept_multiple_files=True,
+                                   key=f"photos_{st.session_state.get('photo_uploads', 0)}")
+        taken = st.date_input("Taken on", value=datetime.now().date(), key="photo_date")
+        if uploads and st.button("Save Photos"):
+            failed = False
+            for upload in uploads:
+                try:
+                    digest = media.put(upload.getvalue())
+                except ValueError as e:
+                    st.error(f"Could not save {upload.name}: {e}")
+                    failed = True
+                    continue
+                store.set_photo(user_id, taken.isoformat(), digest, True)
+            if not failed:
+                st.session_state.photo_uploads = st.session_state.get('photo_uploads', 0) + 1
+                # The timeline is a separate fragment
+                st.rerun()
+
+def show_thumbnails(digests, columns=PHOTO_COLUMNS):
+    # Thumbnails only; a photo whose thumbnail isn't made yet gets a placeholder
+    for start in range(0, len(digests), columns):
+        for col, digest in zip(st.columns(columns), digests[start:start + columns]):
+            with col:
+                thumb = media.thumbnail(digest)
+                if thumb is not None:
+                    render(st.image, "thumbnail", thumb, width="stretch")
+                elif media.failed(digest):
+                    st.caption("⚠️ This photo couldn't be read")
+                else:
+                    st.caption("⏳ Preparing thumbnail...")
 
+@fragment
+@timed("section")
+def show_photo_timeline():
+    logs = current_logs()
+    by_date = {}
+    for day, digest in logs.photos:
+        by_date.setdefault(day, []).append(digest)
+    if not by_date:
+        st.info("No progress photos yet. Add your first one above!")
+        return
+    dates = sorted(by_date)
+    
+    st.markdown("### 🔍 Side by Side")
+    col1, col2 = st.columns(2)
+    for col, label, default in ((col1, "Before", 0), (col2, "After", len(dates) - 1)):
+        with col:
+            day = st.selectbox(label, dates, index=default, key=f"compare_{label}")
+            show_thumbnails(by_date[day][:1], columns=1)
+    
+    st.markdown("### 🗓️ Timeline")
+    pages = (len(dates) + PHOTO_DATES_PER_PAGE - 1) // PHOTO_DATES_PER_PAGE
+    page = st.selectbox("Page", range(1, pages + 1), format_func=lambda n: f"{n} of {pages}",
+                        key="photo_page") if pages > 1 else 1
+    newest_first = dates[::-1]
+    for day in newest_first[(page - 1) * PHOTO_DATES_PER_PAGE:page * PHOTO_DATES_PER_PAGE]:
+        st.markdown(f"**{datetime.strptime(day, '%Y-%m-%d'):%d %b %Y}**")
+        show_thumbnails(by_date[day])
+
+@fragment
+@timed("section")
+def show_measurements():
+    st.markdown("### 📏 Body Measurements")
+    logs = current_logs()
+    latest = {}
+    for day in sorted(logs.measurements):
+        latest.update(logs.measurements[day])
+    with st.form("measurements", clear_on_submit=True):
+        measured = st.date_input("Measured on", value=datetime.now().date())
+        # Left empty, a part keeps its last measurement
+        values = {part: st.number_input(f"{part.title()} (cm)", min_value=10.0, max_value=250.0,
+                                        value=None, step=0.5, key=f"measure_{part}",
+                                        placeholder=f"Last: {latest[part]:g}" if part in latest else None)
+                  for part in MEASUREMENT_PARTS}
+        if st.form_submit_button("Save Measurements"):
+            for part, cm in values.items():
+                if cm is not None:
+                    store.log_measurement(user_id, measured.isoformat(), part, cm)
+            logs = current_logs()
+            st.toast("Measurements saved! 📏")
+    
+    rows = sorted(logs.measurements.items())
+    if not rows:
+        st.info("Log your first measurements to track them here.")
+        return
+    first, last = rows[0][1], rows[-1][1]
+    for col, part in zip(st.columns(len(MEASUREMENT_PARTS)), MEASUREMENT_PARTS):
+        if part in last:
+            col.metric(part.title(), f"{last[part]:g} cm", f"{last[part] - first.get(part, last[part]):+.1f} cm",
+                       delta_color="inverse" if part == "waist" else "normal")
+    table = markdown_table(("Date", *(part.title() for part in MEASUREMENT_PARTS)),
+                           [(day, *(f"{parts[part]:g}" if part in parts else "-" for part in MEASUREMENT_PARTS))
+                            for day, parts in rows[::-1][:MEASUREMENT_ROWS]])
+    render(st.markdown, "measurements table", table)
+
+@timed("section")
 def show_notifications():
     st.markdown('<div class="sub-header">🔔 Daily Notification Schedule</div>', unsafe_allow_html=True)
     
@@ -564,18 +939,34 @@ def show_notifications():
     You can use any reminder app or alarm app to set these up.
     """)
     
-    current_time = datetime.now().strftime("%H:%M")
+    zone = ZoneInfo(profile['timezone']) if profile['timezone'] else None
+    current_time = datetime.now(zone).strftime("%H:%M")
+    
+    # Reminders are actually sent by notifier.py; this only highlights them
+    current = current_reminder(NOTIFICATIONS, current_time)
+    next_time, next_message = next_reminder(NOTIFICATIONS, current_time)
+    st.info(f"⏭️ **Next reminder at {next_time}:** {next_message}")
     
-    for time, notification in NOTIFICATIONS.items():
-        is_current = time == current_time[:5]
+    for slot, notification in NOTIFICATIONS.items():
+        is_current = current is not None and slot == current_time
         
         if is_current:
             st.markdown(f'<div class="notification-box">', unsafe_allow_html=True)
-            st.markdown(f"### 🔔 **RIGHT NOW** - {time}")
+            st.markdown(f"### 🔔 **RIGHT NOW** - {slot}")
             st.markdown(f"## {notification}")
             st.markdown('</div>', unsafe_allow_html=True)
         else:
-            st.markdown(f"**{time}** - {notification}")
+            st.markdown(f"**{slot}** - {notification}")
+    
+    st.markdown("---")
+    st.markdown("### 📅 Add to Your Calendar")
+    st.markdown("Every reminder, meal and workout as recurring events with alerts, "
+                "until the end of your goal period.")
+    _, chunks = member_feed(user_id, profile)
+    st.download_button("📅 Download calendar (.ics)", b"".join(chunks), file_name="fitness-plan.ics",
+                       mime="text/calendar")
+    st.caption(f"To keep it current, subscribe to `/v1/users/{user_id}/calendar.ics` on the API "
+               "server (`python api.py`) instead.")
     
     st.markdown("---")
     st.markdown("### 📱 How to Set Up Notifications")
@@ -587,6 +978,7 @@ def show_notifications():
     5. Set notifications 5 minutes before meal times as reminders
     """)
 
+@timed("section")
 def show_guidelines():
     st.markdown('<div class="sub-header">📚 Essential Guidelines & Tips</div>', unsafe_allow_html=True)
     
@@ -594,71 +986,55 @@ def show_guidelines():
     
     with col1:
         st.markdown("### 🥗 Nutrition Guidelines")
-        for tip in NUTRITION_TIPS:
-            st.markdown(f"- {tip}")
+        st.markdown(compile_bullets(NUTRITION_TIPS))
         
         st.markdown("---")
         st.markdown("### ⚠️ Foods to AVOID")
-        avoid_foods = [
-            "Sugar and sweets (chocolates, candies, ice cream)",
-            "Fried foods (pakoras, samosas, chips)",
-            "Processed foods (biscuits, instant noodles)",
-            "Soft drinks and fruit juices (high sugar)",
-            "White bread and refined flour products",
-            "High-fat dairy (full cream milk, butter in excess)",
-            "Alcohol (empty calories)",
-            "Late night snacking after 10 PM"
-        ]
-        for food in avoid_foods:
-            st.markdown(f"- ❌ {food}")
+        st.markdown(compile_bullets(AVOID_FOODS, "❌ "))
     
     with col2:
         st.markdown("### 💪 Workout Guidelines")
-        for tip in WORKOUT_TIPS:
-            st.markdown(f"- {tip}")
+        st.markdown(compile_bullets(WORKOUT_TIPS))
         
         st.markdown("---")
         st.markdown("### 🎯 Key Success Factors")
-        success_factors = [
-            "Consistency > Perfection (80% adherence is success)",
-            "Track everything - weight, meals, workouts",
-            "Take progress photos every 2 weeks",
-            "Measure body parts monthly (chest, arms, waist)",
-            "Sleep 7-8 hours daily",
-            "Manage stress - it affects results",
-            "Be patient - visible results in 4-6 weeks",
-            "Join a gym partner for accountability"
-        ]
-        for factor in success_factors:
-            st.markdown(f"- ✅ {factor}")
+        st.markdown(compile_bullets(SUCCESS_FACTORS, "✅ "))
     
     st.markdown("---")
     st.markdown("### 📅 Monthly Milestones")
-    
-    milestones = {
-        "Month 1 (Days 1-30)": {
-            "Weight Target": "72.5 kg (-2.0 kg)",
-            "Focus": "Building habit, learning form, initial fat loss",
-            "Expectations": "Initial water weight loss, feeling energetic"
-        },
-        "Month 2 (Days 31-60)": {
-            "Weight Target": "71.0 kg (-1.5 kg)",
-            "Focus": "Muscle definition starts showing, strength increases",
-            "Expectations": "Clothes fit better, visible chest and arm development"
-        },
-        "Month 3 (Days 61-90)": {
-            "Weight Target": "70.0 kg (-1.0 kg)",
-            "Focus": "Peak performance, final push, maintenance planning",
-            "Expectations": "Clear muscle definition, significant transformation"
-        }
-    }
-    
-    for month, details in milestones.items():
-        st.markdown(f"#### {month}")
-        for key, value in details.items():
-            st.markdown(f"**{key}:** {value}")
-        st.markdown("")
+    st.markdown(compile_milestones(MILESTONES))
+
+def show_debug_panel():
+    # Spans of the session's previous reruns; this one is still running
+    reruns = list(st.session_state.get('reruns', ()))
+    with st.sidebar.expander(f"⏱️ Slowest spans of the last {len(reruns)} reruns", expanded=True):
+        if not reruns:
+            st.caption("Timings appear from the next rerun on.")
+            return
+        last = reruns[-1]
+        st.caption(f"Last rerun: {last.name} in {last.ms:.0f} ms | "
+                   f"slowest rerun {max(rerun.ms for rerun in reruns):.0f} ms")
+        startup = totals("startup")
+        if startup:
+            st.caption("Cold start: " + ", ".join(f"{name} {total:.0f} ms"
+                                                  for name, (_, total) in startup.items()))
+        st.dataframe([{"Kind": kind, "Name": name, "Calls": calls, "Mean (ms)": round(mean, 1),
+                       "Max (ms)": round(worst, 1)}
+                      for kind, name, calls, mean, worst in slowest(reruns)],
+                     hide_index=True, use_container_width=True)
+
+SECTIONS = {
+    "📅 Today's Plan": show_todays_plan,
+    "🍽️ Full Meal Plan": show_full_meal_plan,
+    "💪 Workout Details": show_workout_details,
+    "📊 Progress Tracker": show_progress_tracker,
+    "📸 Photos & Measurements": show_progress_media,
+    "🔔 Notifications": show_notifications,
+    "📚 Guidelines": show_guidelines,
+}
 
 # Run the app
 if __name__ == "__main__":
     main()
+    finish_rerun(page_rerun)
+    preload_libraries()
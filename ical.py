@@ -0,0 +1,201 @@
+"""iCalendar (.ics) feed of a member's daily schedule.
+
+One recurring event per NOTIFICATIONS reminder and MEAL_PLAN slot (daily)
+and per WORKOUT_PLAN day (weekly), running from the member's start date
+to the end of the goal period. Times are floating local times, so a
+07:30 workout stays at 07:30 wherever the phone is.
+
+A feed depends only on the plans and a few profile fields, so its ETag
+is a hash of exactly those: conditional GETs are answered without
+rendering anything. Feeds are generated line by line and streamed in
+chunks; the chunks of recently served feeds are kept, keyed by that
+hash, so repeat downloads are served from memory.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from plan_compiler import compile_program, content_hash
+from plans import MEAL_PLAN, NOTIFICATIONS, WORKOUT_PLAN
+
+# Bump when the generated events change, so every client refetches
+FEED_LAYOUT = 1
+FEED_CHUNK_BYTES = 16 * 1024
+FEED_CACHE_SIZE = 1024
+PRODID = "-//Fitness App//Plan Feed//EN"
+UID_DOMAIN = "fitness-app"
+# Used as DTSTART when a member has no start date yet
+FEED_EPOCH = date(2024, 1, 1)
+# The "GYM TIME" reminder of NOTIFICATIONS
+WORKOUT_TIME = "07:30"
+MEAL_MINUTES = 30
+REMINDER_MINUTES = 5
+# Alarms before meals (as the app suggests) and workouts
+MEAL_ALARM_MINUTES = 5
+WORKOUT_ALARM_MINUTES = 15
+# Profile fields the feed is built from
+FEED_FIELDS = ("start_date", "goal_period", "timezone")
+
+_CLOCK = re.compile(r"\((\d{1,2}):(\d{2})\s*([AP]M)\)")
+_WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+_DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+PLANS_HASH = content_hash(NOTIFICATIONS, MEAL_PLAN, WORKOUT_PLAN)
+
+_feeds = OrderedDict()    # user_id -> (etag, chunks)
+_lock = threading.Lock()
+
+
+def feed_etag(user_id, profile):
+    return f'"{content_hash(user_id, [profile.get(field) for field in FEED_FIELDS], PLANS_HASH, FEED_LAYOUT)[:32]}"'
+
+
+def slot_time(slot):
+    # "Breakfast (9:00 AM)" -> "09:00"; None when the label has no time
+    match = _CLOCK.search(slot)
+    if not match:
+        return None
+    hour, minute, half = int(match.group(1)) % 12, match.group(2), match.group(3)
+    return f"{hour + (12 if half == 'PM' else 0):02d}:{minute}"
+
+
+def _escape(text):
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\n", "\\n"))
+
+
+def _fold(line):
+    # RFC 5545 lines are at most 75 octets; continuations start with a space
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split a UTF-8 sequence
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _stamp(day, hhmm="00:00"):
+    return f"{day:%Y%m%d}T{hhmm.replace(':', '')}00"
+
+
+def _event(uid, dtstamp, start, minutes, rule, summary, description=None, alarm=None, busy=False):
+    yield "BEGIN:VEVENT"
+    yield f"UID:{uid}@{UID_DOMAIN}"
+    yield f"DTSTAMP:{dtstamp}"
+    yield f"DTSTART:{start}"
+    yield f"DURATION:PT{minutes}M"
+    yield f"RRULE:{rule}"
+    yield f"SUMMARY:{_escape(summary)}"
+    if description:
+        yield f"DESCRIPTION:{_escape(description)}"
+    if not busy:
+        yield "TRANSP:TRANSPARENT"
+    if alarm is not None:
+        yield "BEGIN:VALARM"
+        yield "ACTION:DISPLAY"
+        yield f"TRIGGER:{'-' if alarm else ''}PT{alarm}M"
+        yield f"DESCRIPTION:{_escape(summary)}"
+        yield "END:VALARM"
+    yield "END:VEVENT"
+
+
+def feed_lines(user_id, profile):
+    """The feed's content lines, folded and CRLF-terminated, one at a time."""
+    first = date.fromisoformat(profile["start_date"]) if profile.get("start_date") else FEED_EPOCH
+    until = ""
+    if profile.get("start_date") and profile.get("goal_period"):
+        last = first + timedelta(days=int(profile["goal_period"]) - 1)
+        until = f";UNTIL={_stamp(last, '23:59')}"
+    # Fixed, so an unchanged feed renders byte for byte the same
+    dtstamp = f"{_stamp(first)}Z"
+
+    def lines():
+        yield "BEGIN:VCALENDAR"
+        yield "VERSION:2.0"
+        yield f"PRODID:{PRODID}"
+        yield "CALSCALE:GREGORIAN"
+        yield "METHOD:PUBLISH"
+        yield "X-WR-CALNAME:Fitness Plan"
+        if profile.get("timezone"):
+            yield f"X-WR-TIMEZONE:{profile['timezone']}"
+        yield "REFRESH-INTERVAL;VALUE=DURATION:PT1H"
+        yield "X-PUBLISHED-TTL:PT1H"
+
+        for hhmm, message in NOTIFICATIONS.items():
+            yield from _event(f"reminder-{hhmm.replace(':', '')}-{user_id}", dtstamp, _stamp(first, hhmm),
+                              REMINDER_MINUTES, f"FREQ=DAILY{until}", message, alarm=0)
+
+        for slot, meal in MEAL_PLAN.items():
+            hhmm = slot_time(slot)
+            if hhmm is None:
+                continue
+            name = slot.split("(")[0].strip()
+            description = "\n".join([*meal.get("items", ()), meal.get("purpose", "")]).strip()
+            yield from _event(f"meal-{hhmm.replace(':', '')}-{user_id}", dtstamp, _stamp(first, hhmm),
+                              MEAL_MINUTES, f"FREQ=DAILY{until}", f"🍽️ {name}", description,
+                              alarm=MEAL_ALARM_MINUTES)
+
+        program = compile_program(WORKOUT_PLAN)
+        for day_name, workout in WORKOUT_PLAN.items():
+            weekday = _DAY_NAMES.index(day_name)
+            day = first + timedelta(days=(weekday - first.weekday()) % 7)
+            exercises = [f"{exercise['name']}: {exercise['sets']} x {exercise['reps']}, rest {exercise['rest']}"
+                         for exercise in workout["exercises"]]
+            if workout.get("cardio"):
+                exercises.append(f"Cardio: {workout['cardio']}")
+            yield from _event(f"workout-{_WEEKDAYS[weekday]}-{user_id}", dtstamp, _stamp(day, WORKOUT_TIME),
+                              max(program.day_stats(day_name).session_minutes, 1),
+                              f"FREQ=WEEKLY;BYDAY={_WEEKDAYS[weekday]}{until}",
+                              f"💪 {day_name}: {workout['focus']}", "\n".join(exercises),
+                              alarm=WORKOUT_ALARM_MINUTES, busy=True)
+        yield "END:VCALENDAR"
+
+    for line in lines():
+        yield _fold(line)
+
+
+def feed_chunks(user_id, profile, chunk_bytes=FEED_CHUNK_BYTES):
+    """feed_lines encoded and grouped into chunks of about chunk_bytes."""
+    buffer, size = [], 0
+    for line in feed_lines(user_id, profile):
+        encoded = line.encode("utf-8")
+        buffer.append(encoded)
+        size += len(encoded)
+        if size >= chunk_bytes:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def member_feed(user_id, profile):
+    """(etag, chunks) of the member's feed.
+
+    Chunks come from memory when this feed was served before; otherwise
+    they are generated as they are consumed and kept once the last one is
+    out, so a download cut short caches nothing.
+    """
+    etag = feed_etag(user_id, profile)
+    with _lock:
+        cached = _feeds.get(user_id)
+        if cached is not None and cached[0] == etag:
+            _feeds.move_to_end(user_id)
+            return etag, cached[1]
+
+    def stream():
+        chunks = []
+        for chunk in feed_chunks(user_id, profile):
+            chunks.append(chunk)
+            yield chunk
+        with _lock:
+            _feeds[user_id] = (etag, tuple(chunks))
+            while len(_feeds) > FEED_CACHE_SIZE:
+                _feeds.popitem(last=False)
+
+    return etag, stream()
@@ -0,0 +1,373 @@
+"""Streaming import of smart-scale and fitness-tracker exports.
+
+Files are read in chunks of CHUNK_ROWS and never held in memory whole:
+CSV goes through pandas' chunked reader, JSON Lines and JSON arrays through
+incremental decoders. Each chunk is validated and reduced with vectorized
+operations to one weight per day (the earliest reading, i.e. the morning
+weigh-in) and one workout per day; the result is merged into the store in
+a single transaction.
+
+    python importer.py --user alice export.csv
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from storage import DATA_DIR, STORE_BACKEND, open_store
+
+CHUNK_ROWS = 100_000
+READ_BYTES = 1 << 20
+# Rejected rows kept verbatim for the report; the rest are only counted
+REJECT_SAMPLE = 1000
+
+MIN_WEIGHT_KG = 20.0
+MAX_WEIGHT_KG = 400.0
+LB_TO_KG = 0.45359237
+
+TIME_COLUMNS = ("timestamp", "datetime", "date", "time", "start_time", "measured_at")
+WEIGHT_COLUMNS = {"weight_kg": 1.0, "weight": 1.0, "kg": 1.0, "body_weight": 1.0,
+                  "weight_lb": LB_TO_KG, "weight_lbs": LB_TO_KG, "lbs": LB_TO_KG}
+WORKOUT_COLUMNS = ("workout", "activity", "activity_type", "exercise", "session")
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.weights = 0
+        self.workouts = 0
+        self.duplicates = 0
+        self.rejected = Counter()
+        self.rejected_rows = []
+
+    def reject(self, reason, rows):
+        # rows: the rejected slice of a chunk, indexed by file row number
+        if rows.empty:
+            return
+        self.rejected[reason] += len(rows)
+        room = REJECT_SAMPLE - len(self.rejected_rows)
+        for row_number, row in rows.head(max(room, 0)).iterrows():
+            self.rejected_rows.append((row_number, reason, json.dumps(row.to_dict(), default=str)))
+
+    def rejected_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["row", "reason", "data"])
+        writer.writerows(self.rejected_rows)
+        return out.getvalue()
+
+    def summary(self):
+        return {"rows": self.rows, "weights": self.weights, "workouts": self.workouts,
+                "duplicates": self.duplicates, "rejected": dict(self.rejected)}
+
+
+# ---- readers ---------------------------------------------------------------
+
+def _text(stream):
+    # Accept binary uploads as well as text files
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+class _Prefixed(io.TextIOBase):
+    """Text stream with already-consumed characters pushed back in front."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        prefix, self._prefix = self._prefix, ""
+        if size is None or size < 0:
+            return prefix + self._stream.read()
+        return prefix + self._stream.read(max(size - len(prefix), 0))
+
+    def readline(self, size=-1):
+        prefix, self._prefix = self._prefix, ""
+        return prefix + self._stream.readline()
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+
+def _iter_json_array(stream):
+    # Decode one item at a time from a top-level [...] array
+    decoder = json.JSONDecoder()
+    buffer = stream.read(READ_BYTES).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    pos = 1
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer):
+                break
+            more = stream.read(READ_BYTES)
+            if not more:
+                return
+            buffer, pos = buffer[pos:] + more, 0
+        if buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            more = stream.read(READ_BYTES)
+            if not more:
+                raise
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield item if isinstance(item, dict) else {"_malformed": item}
+        pos = end
+        if pos > READ_BYTES:
+            buffer, pos = buffer[pos:], 0
+
+
+def _iter_json_lines(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line
+        yield item if isinstance(item, dict) else {"_malformed": item}
+
+
+def _batched_frames(items):
+    import pandas as pd
+
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == CHUNK_ROWS:
+            yield pd.DataFrame.from_records(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch)
+
+
+def read_chunks(stream, name):
+    """Yield DataFrames of at most CHUNK_ROWS rows with lower-cased column names.
+
+    Each frame is indexed by 1-based row number within the file.
+    """
+    import pandas as pd
+
+    text = _text(stream)
+    suffix = Path(name).suffix.lower()
+    if suffix == ".csv":
+        frames = pd.read_csv(text, chunksize=CHUNK_ROWS, dtype=str, keep_default_na=False,
+                             skipinitialspace=True)
+    elif suffix in (".jsonl", ".ndjson"):
+        frames = _batched_frames(_iter_json_lines(text))
+    elif suffix == ".json":
+        # A .json export is either an array or JSON Lines; peek to find out
+        head = text.read(1)
+        while head and head.isspace():
+            head = text.read(1)
+        items = _iter_json_array if head == "[" else _iter_json_lines
+        frames = _batched_frames(items(_Prefixed(head, text)))
+    else:
+        raise ValueError(f"Unsupported file type: {name}")
+
+    offset = 0
+    for frame in frames:
+        frame.columns = [str(column).strip().lower() for column in frame.columns]
+        frame.index = pd.RangeIndex(offset + 1, offset + 1 + len(frame))
+        offset += len(frame)
+        yield frame
+
+
+# ---- validation ------------------------------------------------------------
+
+def _first_column(frame, names):
+    for name in names:
+        if name in frame.columns:
+            return name
+    return None
+
+
+def _blank(series):
+    return series.isna() | (series.astype(str).str.strip() == "")
+
+
+def _parse_times(raw, tz):
+    """Vectorized timestamp parsing to naive wall-clock time in the member's zone.
+
+    Epoch seconds/milliseconds and ISO strings with an offset are converted
+    to tz (server local when None); ISO strings without one are taken as
+    already being local.
+    """
+    import pandas as pd
+
+    zone = tz or datetime.now().astimezone().tzinfo
+    numeric = pd.to_numeric(raw, errors="coerce")
+    if numeric.notna().all():
+        unit = "ms" if numeric.abs().max() > 1e11 else "s"
+        times = pd.to_datetime(numeric, unit=unit, utc=True, errors="coerce")
+        return times.dt.tz_convert(zone).dt.tz_localize(None)
+    text = raw.astype(str).str.strip()
+    try:
+        times = pd.to_datetime(text, format="ISO8601", errors="coerce")
+    except (ValueError, TypeError):
+        # Mixed offsets: normalise through UTC
+        times = pd.to_datetime(text, format="ISO8601", errors="coerce", utc=True)
+    if getattr(times.dt, "tz", None) is not None:
+        times = times.dt.tz_convert(zone).dt.tz_localize(None)
+    return times
+
+
+class _Reducer:
+    """Folds validated chunks into one weight and one workout per day."""
+
+    def __init__(self, tz, report):
+        self.tz = tz
+        self.report = report
+        self.weights = {}    # day Timestamp -> (reading Timestamp, kg)
+        self.workouts = {}   # day Timestamp -> weekday name
+
+    def add(self, frame):
+        import pandas as pd
+
+        report = self.report
+        report.rows += len(frame)
+
+        if "_malformed" in frame.columns:
+            malformed = frame["_malformed"].notna()
+            report.reject("malformed row", frame[malformed])
+            frame = frame[~malformed].drop(columns="_malformed")
+
+        time_column = _first_column(frame, TIME_COLUMNS)
+        if time_column is None:
+            report.reject("missing timestamp", frame)
+            return
+        missing = _blank(frame[time_column])
+        report.reject("missing timestamp", frame[missing])
+        frame = frame[~missing]
+        if frame.empty:
+            return
+
+        times = _parse_times(frame[time_column], self.tz)
+        bad = times.isna()
+        report.reject("bad timestamp", frame[bad])
+        frame, times = frame[~bad], times[~bad]
+
+        weight_column = _first_column(frame, WEIGHT_COLUMNS)
+        workout_column = _first_column(frame, WORKOUT_COLUMNS)
+        no_value = pd.Series(False, index=frame.index)
+        has_weight = ~_blank(frame[weight_column]) if weight_column else no_value
+        has_workout = ~_blank(frame[workout_column]) if workout_column else no_value
+        neither = ~(has_weight | has_workout)
+        report.reject("no weight or workout", frame[neither])
+
+        # Exact repeats of a reading (same timestamp and values) are dropped
+        key_columns = [column for column in (weight_column, workout_column) if column]
+        duplicate = frame[key_columns].assign(_t=times).duplicated() & ~neither
+        report.duplicates += int(duplicate.sum())
+        keep = ~(neither | duplicate)
+        frame, times = frame[keep], times[keep]
+        has_weight, has_workout = has_weight[keep], has_workout[keep]
+
+        if weight_column:
+            kg = pd.to_numeric(frame[weight_column], errors="coerce") * WEIGHT_COLUMNS[weight_column]
+            unreadable = has_weight & kg.isna()
+            report.reject("bad weight", frame[unreadable])
+            out_of_range = has_weight & kg.notna() & ~kg.between(MIN_WEIGHT_KG, MAX_WEIGHT_KG)
+            report.reject("weight out of range", frame[out_of_range])
+            valid = has_weight & ~unreadable & ~out_of_range
+            self._merge_weights(times[valid], kg[valid])
+
+        if workout_column:
+            for day in times[has_workout].dt.normalize().unique():
+                self.workouts[day] = day.day_name()
+
+    def _merge_weights(self, times, kg):
+        import pandas as pd
+
+        if times.empty:
+            return
+        readings = pd.DataFrame({"t": times.to_numpy(), "kg": kg.to_numpy()})
+        readings["day"] = readings["t"].dt.normalize()
+        earliest = readings.loc[readings.groupby("day")["t"].idxmin()]
+        # Python work here is per day, not per row
+        for day, stamp, weight in zip(earliest["day"], earliest["t"], earliest["kg"]):
+            kept = self.weights.get(day)
+            if kept is None or stamp < kept[0]:
+                self.weights[day] = (stamp, round(float(weight), 2))
+            elif stamp == kept[0]:
+                # The same reading repeated across a chunk boundary
+                self.report.duplicates += 1
+
+    def result(self):
+        weights = {day.strftime("%Y-%m-%d"): kg for day, (_, kg) in self.weights.items()}
+        workouts = {day.strftime("%Y-%m-%d"): name for day, name in self.workouts.items()}
+        return weights, workouts
+
+
+def import_file(store, user_id, stream, name, size=None, progress=None, tz=None):
+    """Stream one export file into a member's logs.
+
+    progress(fraction, rows) is called after every chunk when given.
+    Returns an ImportReport.
+    """
+    report = ImportReport()
+    reducer = _Reducer(tz, report)
+    for frame in read_chunks(stream, name):
+        reducer.add(frame)
+        if progress is not None:
+            position = stream.tell() if hasattr(stream, "tell") else None
+            progress(min(position / size, 1.0) if size and position else 0.0, report.rows)
+
+    weights, workouts = reducer.result()
+    store.bulk_merge(user_id, weights, workouts)
+    report.weights = len(weights)
+    report.workouts = len(workouts)
+    if progress is not None:
+        progress(1.0, report.rows)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import scale/tracker exports for a member")
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--rejected", type=Path,
+                        help="write rejected rows of every input to this CSV")
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.data_dir)
+    tz = store.profile(args.user).get("timezone")
+    # One rejects file for the whole run, with a column naming the input
+    rejected = open(args.rejected, "w", newline="", encoding="utf-8") if args.rejected else None
+    if rejected is not None:
+        rejects = csv.writer(rejected)
+        rejects.writerow(["file", "row", "reason", "data"])
+    for path in args.files:
+        def show(fraction, rows):
+            print(f"\r{path.name}: {fraction:.0%} ({rows:,} rows)", end="", file=sys.stderr)
+
+        with open(path, "rb") as f:
+            report = import_file(store, args.user, f, path.name, path.stat().st_size, show, tz=tz)
+        print(file=sys.stderr)
+        print(json.dumps({"file": str(path), **report.summary()}))
+        if rejected is not None:
+            rejects.writerows((str(path), *row) for row in report.rejected_rows)
+    if rejected is not None:
+        rejected.close()
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Meal plans generated to hit the daily calorie and macro targets.
+
+Every MEAL_PLAN item can be replaced by its own "or" alternatives or by
+the other entries of its SUBSTITUTIONS group (portioned to the same
+calories), and every slot can be served at one of PORTIONS. The
+generator enumerates each slot's options with their macros as arrays and
+runs a beam search across the slots, keeping the BEAM_WIDTH partial days
+closest to the targets pro rata. Plans are memoized per (targets, diet,
+days, seed), so members with the same profile share one search.
+
+    python meal_generator.py --days 7 --out plans.jsonl
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+
+from metrics import timed
+from nutrition import MACROS, alternatives, food_table, scale_item
+from plan_compiler import content_hash
+from plans import CARBS_G, DAILY_CALORIES, FATS_G, MEAL_PLAN, PROTEIN_G, SUBSTITUTIONS
+from storage import DATA_DIR, STORE_BACKEND, open_store
+from targets import cohort_targets
+
+DEFAULT_TARGETS = {"calories": DAILY_CALORIES, "protein": PROTEIN_G, "carbs": CARBS_G, "fats": FATS_G}
+# Allowed relative deviation from each target
+TOLERANCE = {"calories": 0.05, "protein": 0.10, "carbs": 0.10, "fats": 0.15}
+# Targets are rounded to these steps, well inside TOLERANCE, so members
+# with nearly the same targets share one generated plan
+TARGET_STEP = {"calories": 50, "protein": 5, "carbs": 5, "fats": 5}
+
+# foods.csv diet tags each diet allows; None allows everything
+DIETS = {
+    "any": None,
+    "pescatarian": {"vegan", "dairy", "egg", "fish"},
+    "eggetarian": {"vegan", "dairy", "egg"},
+    "vegetarian": {"vegan", "dairy"},
+    "vegan": {"vegan"},
+}
+
+PORTIONS = (0.5, 0.75, 1.0, 1.25, 1.5)
+# Items with fewer calories than this (tea, lemon water) are served as written
+FIXED_BELOW_KCAL = 25
+# Candidate foods kept per item, own alternatives first
+MAX_CANDIDATES = 6
+BEAM_WIDTH = 100
+# Score added for each earlier day of the week that used the same option
+REPEAT_PENALTY = 0.5
+PLAN_CACHE_SIZE = 1024
+
+GeneratedDay = namedtuple("GeneratedDay", "plan totals within_tolerance")
+GeneratedPlan = namedtuple("GeneratedPlan", "days targets diet")
+
+_plans = OrderedDict()
+_lock = threading.Lock()
+
+
+def _primary_food(table, item):
+    components = table.parse(item)
+    return components[0][0] if components else -1
+
+
+def _group_index(table, substitutions):
+    # primary food -> group entries
+    groups = {}
+    for entries in substitutions.values():
+        for entry in entries:
+            groups.setdefault(_primary_food(table, entry), entries)
+    groups.pop(-1, None)
+    return groups
+
+
+def _allowed(table, item, diet):
+    allowed = DIETS[diet]
+    return allowed is None or table.diets(item) <= allowed
+
+
+def _candidates(table, item, groups, diet):
+    """Replacements for one plan item, allowed by diet, one per food."""
+    choices = alternatives(item)
+    entries = groups.get(_primary_food(table, choices[0]), [])
+    if entries:
+        # Group entries are portioned to the calories of the item they replace
+        calories = table.item_macros([choices[0], *entries])[:, 0]
+        choices += [scale_item(entry, calories[0] / kcal) if kcal else entry
+                    for entry, kcal in zip(entries, calories[1:])]
+    seen, candidates = set(), []
+    for choice in choices:
+        food = _primary_food(table, choice)
+        if food not in seen and _allowed(table, choice, diet):
+            seen.add(food)
+            candidates.append(choice)
+    return candidates[:MAX_CANDIDATES]
+
+
+class _SlotOptions:
+    """Every (candidate per item, portion) combination of one slot."""
+
+    def __init__(self, table, slot, meal, groups, diet):
+        self.slot = slot
+        self.purpose = meal["purpose"]
+        items = [c for c in (_candidates(table, item, groups, diet) for item in meal["items"]) if c]
+        # rendered[k][c][p]: item k, candidate c at PORTIONS[p]
+        self.rendered = []
+        for candidates in items:
+            calories = table.item_macros(candidates)[:, 0]
+            self.rendered.append([[scale_item(candidate, portion) if kcal >= FIXED_BELOW_KCAL else candidate
+                                   for portion in PORTIONS]
+                                  for candidate, kcal in zip(candidates, calories)])
+        flat = [text for item in self.rendered for candidate in item for text in candidate]
+        macros = table.item_macros(flat).reshape(-1, len(PORTIONS), len(MACROS)) if flat else None
+
+        combos = np.array(list(product(*(range(len(c)) for c in items))), dtype=np.intp)
+        self.combos = combos.reshape(len(combos), len(items))
+        self.macros = np.zeros((len(self.combos), len(PORTIONS), len(MACROS)), dtype=np.float32)
+        offset = 0
+        for k, candidates in enumerate(items):
+            self.macros += macros[offset + self.combos[:, k]]
+            offset += len(candidates)
+        # Options are (combo, portion) pairs, flattened combo-major
+        self.macros = self.macros.reshape(-1, len(MACROS))
+
+    def __len__(self):
+        return len(self.macros)
+
+    def items(self, option):
+        combo, portion = divmod(int(option), len(PORTIONS))
+        return [self.rendered[k][c][portion] for k, c in enumerate(self.combos[combo])]
+
+
+def _search(slots, target, scale, shares, penalties):
+    # Beam search: after slot s keep the partial days closest to
+    # target * shares[s]; penalties[s] is added per option of slot s
+    sums = np.zeros((1, len(MACROS)), dtype=np.float32)
+    paid = np.zeros(1, dtype=np.float32)
+    history = []
+    for s, options in enumerate(slots):
+        totals = sums[:, None, :] + options.macros[None, :, :]
+        deviation = (totals - target * shares[s]) / scale
+        paid_next = paid[:, None] + penalties[s][None, :]
+        score = ((deviation ** 2).sum(axis=2) + paid_next).ravel()
+        if score.size > BEAM_WIDTH:
+            best = np.argpartition(score, BEAM_WIDTH - 1)[:BEAM_WIDTH]
+        else:
+            best = np.arange(score.size)
+        history.append(np.divmod(best, len(options)))
+        sums = totals.reshape(-1, len(MACROS))[best]
+        paid = paid_next.ravel()[best]
+        score = score[best]
+
+    # The last slot's shares are 1, so the score is the whole day's deviation;
+    # days within TOLERANCE of every target win over closer-on-average ones
+    outside = (np.abs(sums - target) > scale).any(axis=1)
+    winner = int(np.argmin(score + outside * score.max(initial=0) * 2))
+    totals = sums[winner]
+    choice = []
+    for parent, option in reversed(history):
+        choice.append(int(option[winner]))
+        winner = int(parent[winner])
+    return choice[::-1], totals
+
+
+def missed_targets(totals, targets):
+    """{macro: relative deviation} of the totals outside TOLERANCE of targets."""
+    return {m: totals[m] / targets[m] - 1 for m in MACROS
+            if abs(totals[m] - targets[m]) > TOLERANCE[m] * targets[m]}
+
+
+def _generate(plan, substitutions, targets, diet, days, seed):
+    table = food_table()
+    groups = _group_index(table, substitutions)
+    slots = [options for options in (_SlotOptions(table, slot, meal, groups, diet)
+                                     for slot, meal in plan.items()) if options.combos.shape[1]]
+
+    target = np.array([targets[m] for m in MACROS], dtype=np.float32)
+    scale = target * np.array([TOLERANCE[m] for m in MACROS], dtype=np.float32)
+    # Where a partial day should be after each slot: the plan's own split
+    base = np.array([options.macros[PORTIONS.index(1.0)] for options in slots])
+    shares = np.cumsum(base, axis=0) / np.maximum(base.sum(axis=0), 1e-9)
+
+    rng = np.random.default_rng(seed)
+    uses = [np.zeros(len(options), dtype=np.float32) for options in slots]
+    generated = []
+    for _ in range(days):
+        # A little noise so equally good options rotate between days and seeds
+        penalties = [REPEAT_PENALTY * used + rng.uniform(0, 0.05, len(used)).astype(np.float32)
+                     for used in uses]
+        choice, totals = _search(slots, target, scale, shares, penalties)
+        day_plan = {}
+        for options, option, used in zip(slots, choice, uses):
+            used[option] += 1
+            day_plan[options.slot] = {"items": options.items(option), "purpose": options.purpose}
+        totals = {m: round(float(v), 1) for m, v in zip(MACROS, totals)}
+        generated.append(GeneratedDay(day_plan, totals, not missed_targets(totals, targets)))
+    return GeneratedPlan(tuple(generated), dict(targets), diet)
+
+
+@timed("data")
+def generate_plan(targets=None, diet="any", days=1, seed=0, plan=MEAL_PLAN, substitutions=SUBSTITUTIONS):
+    """Generated days in MEAL_PLAN shape, ready for compile_meal_plan.
+
+    targets maps MACROS to daily amounts (default: the plan constants),
+    e.g. from targets.member_targets(); diet is a DIETS key. Results are shared across sessions.
+    """
+    if diet not in DIETS:
+        raise ValueError(f"Unknown diet: {diet!r} (use {', '.join(DIETS)})")
+    if targets is None:
+        targets = DEFAULT_TARGETS
+    targets = {m: float(round(targets[m] / TARGET_STEP[m]) * TARGET_STEP[m]) for m in MACROS}
+    key = content_hash(plan, substitutions, targets, diet, days, seed)
+    with _lock:
+        generated = _plans.get(key)
+        if generated is not None:
+            _plans.move_to_end(key)
+            return generated
+
+    generated = _generate(plan, substitutions, targets, diet, days, seed)
+    with _lock:
+        _plans[key] = generated
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate meal plans for every member")
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0, help="e.g. the week number, to rotate plans")
+    parser.add_argument("--out", type=Path, required=True, help="JSON Lines file, one member per line")
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.data_dir)
+    started = time.perf_counter()
+    targets = cohort_targets(store)
+    members = 0
+    with open(args.out, "w", encoding="utf-8") as f:
+        for user_id, profile in store.members():
+            if user_id not in targets.index:
+                continue
+            diet = profile.get("diet") or "any"
+            generated = generate_plan(targets.loc[user_id].to_dict(), diet, args.days, args.seed)
+            f.write(json.dumps({"user_id": user_id, "diet": diet, "targets": generated.targets,
+                                "days": [day._asdict() for day in generated.days]},
+                               ensure_ascii=False) + "\n")
+            members += 1
+    store.close()
+    print(f"{members} members, {len(_plans)} distinct plans in {time.perf_counter() - started:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
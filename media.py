@@ -0,0 +1,154 @@
+"""Progress photos, stored content-addressed, and their thumbnails.
+
+An upload is kept once under the SHA-256 of its bytes, in
+media/blobs/<first two hex digits>/<digest>; a member's logs only record
+(date, digest), so a photo uploaded twice takes no extra disk. Thumbnails
+(media/thumbs/.../<digest>.jpg) are made by a small pool of background
+threads, so an upload returns as soon as the original is on disk. Pages
+only ever read thumbnails: the original is decoded once, by a worker, at
+reduced scale where the format allows it.
+
+    python media.py --rebuild      # make any thumbnails that are missing
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from storage import DATA_DIR
+
+MEDIA_DIR = "media"
+THUMB_SIZE = (320, 320)
+THUMB_QUALITY = 80
+THUMB_WORKERS = 2
+MAX_PHOTO_BYTES = 25 * 1024 * 1024
+# Larger images are refused from their header, before any pixels are decoded
+MAX_PHOTO_PIXELS = 60_000_000
+# MPO is the multi-picture JPEG some phone cameras write
+PHOTO_FORMATS = ("JPEG", "MPO", "PNG", "WEBP")
+PHOTO_TYPES = ["jpg", "jpeg", "png", "webp"]
+MEASUREMENT_PARTS = ("chest", "arms", "waist")
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    partial.write_bytes(data)
+    os.replace(partial, path)
+
+
+class MediaStore:
+    """Content-addressed photo blobs and a background thumbnail pool."""
+
+    def __init__(self, data_dir=DATA_DIR, workers=THUMB_WORKERS):
+        self.directory = Path(data_dir) / MEDIA_DIR
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="thumbs")
+        self._pending = {}      # digest -> Future of its thumbnail
+        self._failed = set()    # digests whose image could not be decoded
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest):
+        return self.directory / "blobs" / digest[:2] / digest
+
+    def thumb_path(self, digest):
+        return self.directory / "thumbs" / digest[:2] / f"{digest}.jpg"
+
+    def put(self, data):
+        """Store a photo's bytes and queue its thumbnail; returns the digest.
+
+        Raises ValueError for anything that isn't a supported image.
+        """
+        from PIL import Image
+
+        if len(data) > MAX_PHOTO_BYTES:
+            raise ValueError(f"Photos are limited to {MAX_PHOTO_BYTES // (1024 * 1024)} MB")
+        try:
+            # Opening reads the header only
+            with Image.open(io.BytesIO(data)) as image:
+                fmt, (width, height) = image.format, image.size
+        except (OSError, Image.DecompressionBombError):
+            raise ValueError("Not a readable image") from None
+        if fmt not in PHOTO_FORMATS:
+            raise ValueError(f"Unsupported image format {fmt}; use {', '.join(PHOTO_TYPES)}")
+        if width * height > MAX_PHOTO_PIXELS:
+            raise ValueError(f"Image is too large ({width} x {height})")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not path.exists():
+            _write_atomic(path, data)
+        self.request_thumbnail(digest)
+        return digest
+
+    def request_thumbnail(self, digest):
+        """Queue the thumbnail unless it exists, is queued or can't be made."""
+        if digest in self._failed or self.thumb_path(digest).exists():
+            return None
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is None:
+                future = self._pending[digest] = self._executor.submit(self._make_thumbnail, digest)
+        return future
+
+    def _make_thumbnail(self, digest):
+        from PIL import Image, ImageOps
+
+        try:
+            with Image.open(self.blob_path(digest)) as image:
+                # JPEGs decode straight at 1/2, 1/4 or 1/8 scale
+                image.draft("RGB", (THUMB_SIZE[0] * 2, THUMB_SIZE[1] * 2))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail(THUMB_SIZE)
+                buffer = io.BytesIO()
+                image.convert("RGB").save(buffer, "JPEG", quality=THUMB_QUALITY, optimize=True)
+            _write_atomic(self.thumb_path(digest), buffer.getvalue())
+        except (OSError, SyntaxError, ValueError) as error:
+            print(f"Thumbnail for {digest} failed: {error!r}", file=sys.stderr)
+            self._failed.add(digest)
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+
+    def thumbnail(self, digest):
+        """The thumbnail's JPEG bytes, or None while it is being made (or if it can't be)."""
+        try:
+            return self.thumb_path(digest).read_bytes()
+        except FileNotFoundError:
+            # Queued again in case it was lost or its worker died
+            self.request_thumbnail(digest)
+            return None
+
+    def failed(self, digest):
+        return digest in self._failed
+
+    def rebuild(self):
+        """Queue thumbnails for every stored photo that lacks one and wait for them."""
+        blobs = self.directory / "blobs"
+        futures = [self.request_thumbnail(path.name) for path in blobs.glob("*/*")
+                   if not path.name.endswith(".tmp")]
+        futures = [future for future in futures if future is not None]
+        wait(futures)
+        return len(futures)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the progress photo store")
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--rebuild", action="store_true", help="make any missing thumbnails")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or THUMB_WORKERS)
+    args = parser.parse_args()
+
+    media = MediaStore(args.data_dir, args.workers)
+    if args.rebuild:
+        print(f"{media.rebuild()} thumbnails made", file=sys.stderr)
+    media.close()
+
+
+if __name__ == "__main__":
+    main()
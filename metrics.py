@@ -0,0 +1,309 @@
+"""In-process timing of the app's hot paths.
+
+Spans time a block of code under a kind (page, section, store, data,
+figure, render) and a name. Every span feeds a fixed-bucket histogram, so
+recording costs a bisect and a few additions under one lock. Spans are
+also collected per rerun: a full page run (begin_rerun .. finish_rerun)
+or a fragment rerun (a section span with no rerun open). Finished reruns,
+with every span inside them, go to the listeners; the app keeps the last
+few per session for its debug panel.
+
+Histograms are exported in the Prometheus text format, to a file
+(FITNESS_METRICS_FILE) and/or over HTTP at /metrics (FITNESS_METRICS_PORT).
+"""
+import contextvars
+import functools
+import importlib
+import os
+import sys
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Upper bounds (ms) of the duration histogram buckets
+DURATION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Upper bounds (bytes) of the payload histogram buckets
+PAYLOAD_BUCKETS = tuple(4 ** i * 1024 for i in range(8))  # 1 KB .. 16 MB
+# Seconds between rewrites of the metrics file
+WRITE_INTERVAL = 10.0
+
+METRICS_FILE = os.environ.get("FITNESS_METRICS_FILE")
+METRICS_PORT = os.environ.get("FITNESS_METRICS_PORT")
+
+PREFIX = "fitness"
+HELP = {
+    "startup": "Cold imports: the app's own on its first run, heavy libraries when preloaded",
+    "page": "Full page reruns",
+    "section": "App sections (show_* functions, including fragment reruns)",
+    "store": "Data store calls",
+    "data": "DataFrames, reports and schedules built for display",
+    "figure": "Plotly figure construction (cached figures return in microseconds)",
+    "render": "Streamlit element calls, including Plotly serialization",
+    "api": "JSON API requests, by method and route",
+}
+
+_histograms = {}            # (metric, name) -> Histogram
+_lock = threading.Lock()
+_listeners = []
+_active = contextvars.ContextVar("metrics_rerun", default=None)
+
+
+class Histogram:
+    """Cumulative-on-export bucket counts with sum and count."""
+
+    __slots__ = ("buckets", "counts", "count", "total")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_right(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+class Rerun:
+    """One page or fragment rerun: its root span and every span inside it."""
+
+    __slots__ = ("kind", "name", "started", "ms", "spans")
+
+    def __init__(self, name, kind="page"):
+        self.kind = kind
+        self.name = name
+        self.started = time.time()
+        self.ms = None
+        self.spans = []          # (kind, name, ms) in completion order
+
+
+def observe(metric, name, value, buckets=DURATION_BUCKETS_MS):
+    key = (metric, name)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def observe_size(name, nbytes):
+    observe("payload", name, nbytes, PAYLOAD_BUCKETS)
+
+
+def totals(metric):
+    """{name: (count, total)} of one metric's histograms."""
+    with _lock:
+        return {name: (h.count, h.total) for (kind, name), h in _histograms.items() if kind == metric}
+
+
+def add_listener(listener):
+    # listener(rerun) is called on the thread that ran the rerun
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def begin_rerun(name, kind="page"):
+    """Open a rerun on this thread; spans until finish_rerun belong to it.
+
+    A rerun left open by an interrupted script run is simply replaced.
+    """
+    rerun = Rerun(name, kind)
+    _active.set(rerun)
+    return rerun
+
+
+def finish_rerun(rerun):
+    rerun.ms = (time.time() - rerun.started) * 1000
+    _active.set(None)
+    observe(rerun.kind, rerun.name, rerun.ms)
+    rerun.spans.append((rerun.kind, rerun.name, rerun.ms))
+    for listener in _listeners:
+        listener(rerun)
+
+
+@contextmanager
+def span(kind, name):
+    """Time the block as kind/name.
+
+    A section span outside any rerun is a fragment rerun and closes its
+    own Rerun; other kinds outside a rerun only feed their histogram.
+    """
+    rerun = _active.get()
+    if rerun is None and kind == "section":
+        rerun = begin_rerun(name, kind)
+        try:
+            yield rerun
+        finally:
+            finish_rerun(rerun)
+        return
+    started = time.perf_counter()
+    try:
+        yield rerun
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        observe(kind, name, ms)
+        if rerun is not None:
+            rerun.spans.append((kind, name, ms))
+
+
+def timed(kind, name=None):
+    """Decorator form of span, named after the function by default."""
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TimedCalls:
+    """Proxy that times every public method call of the wrapped object."""
+
+    def __init__(self, target, kind):
+        self._target = target
+        self._kind = kind
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if attr.startswith("_") or not callable(value):
+            return value
+        wrapped = timed(self._kind, attr)(value)
+        # Cached on the proxy, so later lookups skip __getattr__
+        setattr(self, attr, wrapped)
+        return wrapped
+
+
+def preload(modules):
+    """Import modules on a daemon thread, timing each as startup/<module>.
+
+    A session that needs one meanwhile waits on the import lock for the
+    same import rather than starting another.
+    """
+    def load():
+        for module in modules:
+            if module in sys.modules:
+                continue
+            started = time.perf_counter()
+            importlib.import_module(module)
+            observe("startup", module, (time.perf_counter() - started) * 1000)
+
+    thread = threading.Thread(target=load, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def payload_bytes(obj):
+    """Approximate in-memory size of what an element ships: DataFrames by
+    their column buffers, Plotly figures by their trace arrays, images by
+    their encoded bytes."""
+    if isinstance(obj, str):
+        return len(obj.encode("utf-8"))
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if hasattr(obj, "memory_usage"):
+        return int(obj.memory_usage(index=True).sum())
+    total = 0
+    for trace in getattr(obj, "data", ()):
+        for attr in ("x", "y", "z", "text", "customdata"):
+            value = getattr(trace, attr, None)
+            if value is None:
+                continue
+            total += getattr(value, "nbytes", None) or 8 * len(value)
+    return total
+
+
+# ---- export --------------------------------------------------------------
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Every histogram in the Prometheus text exposition format.
+
+    Durations are exported in seconds, as fitness_<kind>_seconds.
+    """
+    with _lock:
+        snapshot = sorted((metric, name, list(h.counts), h.count, h.total, h.buckets)
+                          for (metric, name), h in _histograms.items())
+    lines, declared = [], set()
+    for metric, name, counts, count, total, buckets in snapshot:
+        if metric == "payload":
+            family, scale = f"{PREFIX}_payload_bytes", 1
+        else:
+            family, scale = f"{PREFIX}_{metric}_seconds", 1000
+        if family not in declared:
+            declared.add(family)
+            lines.append(f"# HELP {family} {HELP.get(metric, 'Payload sizes of rendered elements')}")
+            lines.append(f"# TYPE {family} histogram")
+        label = f'name="{_label(name)}"'
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{family}_bucket{{{label},le="{bound / scale:g}"}} {cumulative}')
+        lines.append(f'{family}_bucket{{{label},le="+Inf"}} {count}')
+        lines.append(f"{family}_sum{{{label}}} {total / scale:.6g}")
+        lines.append(f"{family}_count{{{label}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    # Written aside and renamed, so scrapers never read half a file
+    path = Path(path)
+    partial = path.with_name(path.name + ".tmp")
+    partial.write_text(prometheus_text(), encoding="utf-8")
+    os.replace(partial, path)
+
+
+def export_file(path, every=WRITE_INTERVAL):
+    """Rewrite path after reruns, at most once every `every` seconds."""
+    last = [0.0]
+
+    def write(rerun):
+        if rerun.started - last[0] >= every:
+            last[0] = rerun.started
+            write_prometheus(path)
+
+    add_listener(write)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def slowest(reruns, top=10):
+    """[(kind, name, calls, mean ms, max ms)] over reruns, slowest first by max."""
+    stats = {}
+    for rerun in reruns:
+        for kind, name, ms in rerun.spans:
+            calls, total, worst = stats.get((kind, name), (0, 0.0, 0.0))
+            stats[(kind, name)] = (calls + 1, total + ms, max(worst, ms))
+    rows = [(kind, name, calls, total / calls, worst)
+            for (kind, name), (calls, total, worst) in stats.items()]
+    return sorted(rows, key=lambda row: row[4], reverse=True)[:top]
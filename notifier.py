@@ -0,0 +1,316 @@
+"""Background reminder scheduler for the NOTIFICATIONS schedule.
+
+Run next to the Streamlit app:
+
+    python notifier.py --sink file:reminders.jsonl
+    python notifier.py --sink http://localhost:8080/reminders
+
+Members who share a time zone and schedule are grouped, so the timer heap
+holds one entry per (time zone, reminder time) however many members there
+are. Each entry is re-armed for the next local day when it fires. The
+member list is re-read every --refresh-every seconds, so new members and
+time zone changes are picked up without a restart. Each firing is sent
+as its own task (at most MAX_INFLIGHT at once), so a slow sink does not
+hold up the timers of other groups.
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import time
+import sys
+import urllib.request
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from plans import NOTIFICATIONS
+from storage import DATA_DIR, STORE_BACKEND, open_store
+
+# Members per sink call
+BATCH_SIZE = 500
+# Upper bounds (ms) of the dispatch latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+# Seconds between re-reads of the member list
+REFRESH_SECONDS = 60
+# Dispatches sending at once; the timer loop waits for a free slot beyond this
+MAX_INFLIGHT = 64
+
+
+def next_reminder(schedule, now_hhmm):
+    # (time, message) of the first reminder after now, wrapping to tomorrow
+    times = sorted(schedule)
+    i = bisect_right(times, now_hhmm)
+    time_key = times[i % len(times)]
+    return time_key, schedule[time_key]
+
+
+def current_reminder(schedule, now_hhmm):
+    return schedule.get(now_hhmm[:5])
+
+
+def next_occurrence(hhmm, tz, now=None):
+    """UTC timestamp of the next local hh:mm in time zone tz (None = server local)."""
+    zone = ZoneInfo(tz) if tz else None
+    now = datetime.now(zone).astimezone(zone) if now is None else now.astimezone(zone)
+    hour, minute = map(int, hhmm.split(":"))
+    due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if due <= now:
+        due = (due + timedelta(days=1)).replace(hour=hour, minute=minute)
+    return due.timestamp()
+
+
+class LatencyStats:
+    """Dispatch lateness (actual send time minus due time) histogram."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, latency_ms):
+        self.counts[bisect_right(self.buckets_ms, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets_ms + (self.max_ms,), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            "dispatches": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max_ms,
+        }
+
+
+class FileSink:
+    """Appends each reminder as a JSON line; the local stand-in for a push service."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    async def send(self, reminders):
+        lines = "".join(json.dumps(reminder, ensure_ascii=False) + "\n" for reminder in reminders)
+        await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class WebhookSink:
+    """POSTs each batch as a JSON array."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    async def send(self, reminders):
+        await asyncio.to_thread(self._post, json.dumps(reminders).encode("utf-8"))
+
+    def _post(self, body):
+        request = urllib.request.Request(self.url, data=body, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def read_roster(store):
+    # {user_id: time zone} of every member
+    return {user_id: profile.get("timezone") for user_id, profile in store.members()}
+
+
+def make_sink(spec):
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec)
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    raise ValueError(f"Unknown sink: {spec!r} (use file:<path> or an http(s) URL)")
+
+
+class ReminderScheduler:
+    def __init__(self, sinks, schedule=NOTIFICATIONS):
+        self.sinks = list(sinks)
+        self.schedule = schedule
+        self.latency = LatencyStats()
+        self.sent = 0
+        self.errors = 0
+        self._heap = []       # (due timestamp, (tz, hhmm))
+        self._groups = {}     # (tz, hhmm) -> set of member ids
+        self._member_tz = {}
+        self._rejected = {}   # user_id -> unknown time zone, reported once
+        self._wakeup = None
+        self._inflight = set()
+
+    def add_member(self, user_id, tz=None):
+        self.remove_member(user_id)
+        if tz:
+            ZoneInfo(tz)  # reject unknown zones up front
+        self._member_tz[user_id] = tz
+        for hhmm in self.schedule:
+            key = (tz or "", hhmm)
+            members = self._groups.get(key)
+            if members is None:
+                members = self._groups[key] = set()
+                heapq.heappush(self._heap, (next_occurrence(hhmm, tz), key))
+                if self._wakeup is not None:
+                    self._wakeup.set()
+            members.add(user_id)
+
+    def remove_member(self, user_id):
+        if user_id not in self._member_tz:
+            return
+        tz = self._member_tz.pop(user_id)
+        for hhmm in self.schedule:
+            members = self._groups.get((tz or "", hhmm))
+            if members is not None:
+                # Empty groups are dropped when their timer next fires
+                members.discard(user_id)
+
+    def sync_members(self, roster):
+        """Make the scheduled members match roster ({user_id: time zone}).
+
+        Only the differences touch the timers: new members and changed time
+        zones are (re)added, members no longer listed are removed.
+        """
+        for user_id in self._member_tz.keys() - roster.keys():
+            self.remove_member(user_id)
+        for user_id, tz in roster.items():
+            tz = tz or None
+            if user_id in self._member_tz and self._member_tz[user_id] == tz:
+                continue
+            if user_id in self._rejected and self._rejected[user_id] == tz:
+                continue
+            try:
+                self.add_member(user_id, tz)
+                self._rejected.pop(user_id, None)
+            except (ValueError, ZoneInfoNotFoundError):
+                self.remove_member(user_id)
+                self._rejected[user_id] = tz
+                print(f"Skipping {user_id}: unknown time zone {tz!r}", file=sys.stderr, flush=True)
+
+    def load_members(self, store):
+        self.sync_members(read_roster(store))
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    async def run(self, until=None):
+        self._wakeup = asyncio.Event()
+        try:
+            await self._run(until)
+        finally:
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def _run(self, until):
+        while until is None or time.time() < until:
+            if not self._heap:
+                await self._sleep(None if until is None else until - time.time())
+                continue
+            due, key = self._heap[0]
+            delay = due - time.time()
+            if until is not None:
+                delay = min(delay, until - time.time())
+            if delay > 0:
+                await self._sleep(delay)
+                continue
+            heapq.heappop(self._heap)
+            members = self._groups.get(key)
+            if not members:
+                self._groups.pop(key, None)
+                continue
+            tz, hhmm = key
+            heapq.heappush(self._heap, (next_occurrence(hhmm, tz or None), key))
+            if len(self._inflight) >= MAX_INFLIGHT:
+                await asyncio.wait(self._inflight, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.create_task(self._dispatch(due, hhmm, sorted(members)))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _sleep(self, timeout):
+        # Wake early when a member added meanwhile has an earlier reminder
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self, due, hhmm, members):
+        message = self.schedule[hhmm]
+        due_iso = datetime.fromtimestamp(due).astimezone().isoformat()
+        self.latency.observe((time.time() - due) * 1000)
+        for start in range(0, len(members), BATCH_SIZE):
+            batch = [{"user_id": user_id, "time": hhmm, "message": message, "due": due_iso}
+                     for user_id in members[start:start + BATCH_SIZE]]
+            results = await asyncio.gather(*(sink.send(batch) for sink in self.sinks),
+                                           return_exceptions=True)
+            self.errors += sum(isinstance(result, Exception) for result in results)
+            self.sent += len(batch)
+
+    def metrics(self):
+        return {**self.latency.snapshot(), "sent": self.sent, "errors": self.errors,
+                "members": len(self._member_tz), "timers": len(self._heap),
+                "inflight": len(self._inflight)}
+
+
+async def _report(scheduler, every):
+    while True:
+        await asyncio.sleep(every)
+        print(json.dumps(scheduler.metrics()), flush=True)
+
+
+async def _refresh(scheduler, store, every):
+    while True:
+        await asyncio.sleep(every)
+        scheduler.sync_members(await asyncio.to_thread(read_roster, store))
+
+
+async def _main(args):
+    scheduler = ReminderScheduler([make_sink(spec) for spec in args.sink])
+    store = open_store(args.backend, args.data_dir)
+    scheduler.load_members(store)
+    print(f"Scheduled {len(scheduler._member_tz)} members on {scheduler.pending} timers", flush=True)
+    reporter = asyncio.create_task(_report(scheduler, args.report_every))
+    refresher = asyncio.create_task(_refresh(scheduler, store, args.refresh_every))
+    try:
+        await scheduler.run(until=time.time() + args.duration if args.duration else None)
+    finally:
+        reporter.cancel()
+        refresher.cancel()
+        print(json.dumps(scheduler.metrics()), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the daily reminders to every member")
+    parser.add_argument("--sink", action="append", required=True,
+                        help="file:<path> or http(s) webhook URL; may be repeated")
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--report-every", type=float, default=60,
+                        help="seconds between metric lines on stdout")
+    parser.add_argument("--refresh-every", type=float, default=REFRESH_SECONDS,
+                        help="seconds between re-reads of the member list")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Food composition table and vectorized macro totals for meal plans.
+
+Meal plan items are free text ("150g grilled chicken breast or 200g
+paneer/tofu"). Each distinct item string is parsed once into
+(food, quantity, unit) components; nutrients for any number of items are
+then computed with array operations over the table in foods.csv.
+"""
+import csv
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+
+FOODS_FILE = Path(__file__).resolve().parent / "foods.csv"
+
+# Output columns, named after the plan targets (DAILY_CALORIES, PROTEIN_G, ...)
+MACROS = ("calories", "protein", "carbs", "fats")
+# foods.csv nutrient columns, per 100 g, in MACROS order
+NUTRIENT_COLUMNS = ("kcal", "protein", "carbs", "fat")
+
+# How a component's quantity turns into grams
+MASS, CUPS, PIECES, SERVINGS = range(4)
+_UNITS = {
+    "g": (MASS, 1.0), "kg": (MASS, 1000.0), "ml": (MASS, 1.0),
+    "cup": (CUPS, 1.0), "cups": (CUPS, 1.0), "glass": (CUPS, 1.0), "glasses": (CUPS, 1.0),
+    "bowl": (CUPS, 1.0), "bowls": (CUPS, 1.0), "tbsp": (CUPS, 1 / 16), "tsp": (CUPS, 1 / 48),
+    "scoop": (PIECES, 1.0), "scoops": (PIECES, 1.0), "slice": (PIECES, 1.0),
+    "slices": (PIECES, 1.0), "piece": (PIECES, 1.0), "pieces": (PIECES, 1.0),
+}
+_PLURAL = {"cup": "cups", "glass": "glasses", "bowl": "bowls", "scoop": "scoops",
+           "slice": "slices", "piece": "pieces"}
+_SINGULAR = {plural: singular for singular, plural in _PLURAL.items()}
+
+# "150g", "1.5 cups", "5-10", "small bowl of" ...
+_QUANTITY = re.compile(
+    r"^(?:(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?)?\s*(?:(?:small|medium|large)\s+)?"
+    rf"({'|'.join(sorted(_UNITS, key=len, reverse=True))})?\b\s*(?:of\s+)?", re.IGNORECASE)
+_ALTERNATIVE = re.compile(r"\s+or\s+", re.IGNORECASE)
+_COMBINED = re.compile(r"\s*\+\s*")
+_NOTE = re.compile(r"\([^)]*\)")
+
+_table = None
+_lock = threading.Lock()
+
+
+def alternatives(item):
+    """The "A or B" choices of an item, each with its own quantity.
+
+    "1 apple or orange" -> ["1 apple", "1 orange"]: a choice without a
+    quantity takes the first one's.
+    """
+    choices = _ALTERNATIVE.split(item.strip())
+    prefix = choices[0][:_QUANTITY.match(choices[0]).end()]
+    return [choice if i == 0 or _QUANTITY.match(choice).end() else prefix + choice
+            for i, choice in enumerate(choices)]
+
+
+def _round_quantity(value, kind, counted=False):
+    # counted: a bare number of things ("2 chapatis"), kept whole
+    if kind == MASS:
+        step = 10 if value >= 50 else 5
+    elif kind == CUPS:
+        step = 0.25
+    else:
+        step = 1 if counted or value >= 2 else 0.5
+    return max(round(value / step) * step, step)
+
+
+def _count_noun(text, count):
+    # The noun of a bare count in number: "bread slices" -> "bread slice" for 1,
+    # "banana" -> "bananas" for 2; a trailing note is kept
+    note = _NOTE.search(text)
+    head = text[:note.start() if note else len(text)].rstrip()
+    match = re.search(r"[A-Za-z]+$", head)
+    if not match:
+        return text
+    word = match.group(0)
+    if count <= 1 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    elif count > 1 and not word.endswith("s"):
+        word += "s"
+    return head[:match.start()] + word + text[len(head):]
+
+
+def scale_item(item, factor):
+    """Item text with every quantity multiplied by factor and rounded to a
+    sensible step (10 g, a quarter cup, half a scoop, whole pieces where no
+    unit is given); items without a quantity are returned unchanged."""
+    if factor == 1:
+        return item
+    parts = []
+    for part in _COMBINED.split(item):
+        match = _QUANTITY.match(part)
+        low, high, unit = match.groups()
+        if low is None:
+            parts.append(part)
+            continue
+        kind = _UNITS[unit.lower()][0] if unit else PIECES
+        low = _round_quantity(float(low) * factor, kind, counted=not unit)
+        high = _round_quantity(float(high) * factor, kind, counted=not unit) if high else low
+        number = f"{low:g}" if high == low else f"{low:g}-{high:g}"
+        rest = part[match.end(2 if match.group(2) else 1):]
+        singular = _SINGULAR.get(unit.lower(), unit.lower()) if unit else None
+        if singular in _PLURAL:
+            # "1.5 cups" -> "1 cup", "1 slice" -> "2 slices"
+            rest = rest.replace(unit, singular if high <= 1 else _PLURAL[singular], 1)
+        elif not unit:
+            rest = _count_noun(rest, high)
+        parts.append(part[:match.start(1)] + number + rest)
+    return " + ".join(parts)
+
+
+class FoodTable:
+    """foods.csv indexed for lookup.
+
+    Nutrients are held as one foods x MACROS matrix per 100 g; every food
+    name and alias is matched by a single regex, longest alias first.
+    """
+
+    def __init__(self, path=FOODS_FILE):
+        # Read with the csv module: the table is small, and the meal
+        # checklist shouldn't have to load pandas
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+
+        def numbers(*columns):
+            return np.array([[float(row[c]) if row[c] else np.nan for c in columns] for row in rows],
+                            dtype=np.float64).reshape(len(rows), len(columns))
+
+        self.foods = tuple(row["food"] for row in rows)
+        self.per_100g = numbers(*NUTRIENT_COLUMNS)
+        self.piece_g = numbers("piece_g")[:, 0]
+        self.cup_g = numbers("cup_g")[:, 0]
+        self.serving_g = numbers("serving_g")[:, 0]
+        self.diet = tuple(row["diet"] for row in rows)
+
+        self._aliases = {}
+        for i, (food, aliases) in enumerate((row["food"], row["aliases"]) for row in rows):
+            for alias in (food, *filter(None, aliases.split("|"))):
+                self._aliases.setdefault(alias.lower(), i)
+        names = sorted(self._aliases, key=len, reverse=True)
+        self._pattern = re.compile(rf"\b(?:{'|'.join(map(re.escape, names))})\b")
+        self._parsed = {}
+
+    def lookup(self, text):
+        # Index of the first food named in text, or -1
+        match = self._pattern.search(text.lower())
+        return self._aliases[match.group(0)] if match else -1
+
+    def parse(self, item):
+        """(food index, quantity, unit kind) components of one plan item.
+
+        Only the first of "A or B" alternatives counts; "A + B" sums both;
+        a range ("5-10") counts as its midpoint and an item without a
+        quantity as one serving. Unknown foods get index -1.
+        """
+        components = self._parsed.get(item)
+        if components is not None:
+            return components
+        components = []
+        text = _NOTE.sub("", _ALTERNATIVE.split(item.strip().lower())[0])
+        for part in _COMBINED.split(text):
+            match = _QUANTITY.match(part)
+            low, high, unit = match.groups()
+            food = self.lookup(part[match.end():] or part)
+            if low is None and unit is None:
+                components.append((food, 1.0, SERVINGS))
+                continue
+            quantity = (float(low) + float(high or low)) / 2 if low else 1.0
+            kind, factor = _UNITS[unit] if unit else (PIECES, 1.0)
+            components.append((food, quantity * factor, kind))
+        components = tuple(components)
+        self._parsed[item] = components
+        return components
+
+    def item_macros(self, items):
+        """items x MACROS array; each distinct string is parsed only once."""
+        first = {}
+        codes = np.array([first.setdefault(item, len(first)) for item in items], dtype=np.intp)
+        unique = list(first)
+        owner, food, quantity, kind = [], [], [], []
+        for i, item in enumerate(unique):
+            for component in self.parse(item):
+                owner.append(i)
+                food.append(component[0])
+                quantity.append(component[1])
+                kind.append(component[2])
+        per_unique = np.zeros((len(unique), len(MACROS)))
+        if owner:
+            food = np.asarray(food, dtype=np.intp)
+            quantity = np.asarray(quantity)
+            kind = np.asarray(kind)
+            known = food >= 0
+            index = np.where(known, food, 0)
+            serving = self.serving_g[index]
+            unit_g = np.select([kind == MASS, kind == CUPS, kind == PIECES],
+                               [1.0, self.cup_g[index], self.piece_g[index]], serving)
+            # Foods without a cup or piece weight fall back to their serving
+            grams = np.where(known, quantity * np.where(np.isnan(unit_g), serving, unit_g), 0.0)
+            np.add.at(per_unique, np.asarray(owner, dtype=np.intp),
+                      grams[:, None] * self.per_100g[index] / 100)
+        return per_unique[codes] if len(codes) else per_unique
+
+    def diets(self, item):
+        # foods.csv diet tags (vegan, dairy, egg, fish, meat) of the item's known foods
+        return {self.diet[food] for food, _, _ in self.parse(item) if food >= 0}
+
+    def unmatched(self, items):
+        # Item texts with a component that names no known food
+        return [item for item in dict.fromkeys(items)
+                if any(food < 0 for food, _, _ in self.parse(item))]
+
+    def plan_macros(self, plans):
+        """Per-slot totals for many MEAL_PLAN-shaped plans in one pass.
+
+        Returns a DataFrame indexed by (plan position, slot) with one column
+        per MACROS entry.
+        """
+        import pandas as pd
+
+        keys, items, owners = [], [], []
+        for p, plan in enumerate(plans):
+            for slot, meal in plan.items():
+                owners.extend([len(keys)] * len(meal["items"]))
+                keys.append((p, slot))
+                items.extend(meal["items"])
+        totals = np.zeros((len(keys), len(MACROS)))
+        np.add.at(totals, np.asarray(owners, dtype=np.intp), self.item_macros(items))
+        index = pd.MultiIndex.from_tuples(keys, names=["plan", "slot"])
+        return pd.DataFrame(totals, index=index, columns=list(MACROS))
+
+
+def food_table():
+    # One table per process, shared by every session
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                _table = FoodTable()
+    return _table
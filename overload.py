@@ -0,0 +1,255 @@
+"""The weekly workout template expanded into a dated progressive-overload
+schedule.
+
+Every day of a member's goal period gets the exercises of its weekday
+with a phase prescription: reps move from the top of the range
+(Foundation) to the bottom (Peak) while loads rise week over week. Where
+the member has logged sets, loads are auto-regulated: the latest
+session's best estimated 1RM is carried forward along the phase growth
+and turned back into a load that leaves the phase's reps in reserve.
+
+A schedule is materialized once per member as flat arrays with one
+slice per day, so today's workout is a constant-time lookup. New sets
+only recompute the rows of the exercises they touch, from the day after
+that session on.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+from adherence import epoch_day, iso_date
+from metrics import timed
+from plan_compiler import TRANSITION_SECONDS, compile_program, markdown_table
+
+Phase = namedtuple("Phase", "name first_week reps reserve weekly_gain focus")
+# One set of a live session; reps is a number for loaded lifts and the
+# written prescription otherwise, kg None until there is history
+SessionSet = namedtuple("SessionSet", "exercise set_no sets reps kg loaded rest_seconds")
+
+# The last phase runs to the end of goal periods longer than 12 weeks.
+# reps picks the low, mid or high end of the prescribed range; reserve is
+# reps left in the tank; weekly_gain compounds the load from week to week
+PHASES = (
+    Phase("Foundation", 1, "high", 3, 0.0,
+          "Learn proper form, build base strength, moderate weights"),
+    Phase("Building", 5, "mid", 2, 0.02,
+          "Increase weights by 5-10%, focus on mind-muscle connection"),
+    Phase("Peak", 9, "low", 1, 0.01,
+          "Peak performance, maximum intensity, push your limits"),
+)
+PLATE_STEP_KG = 2.5
+SCHEDULE_CACHE_SIZE = 1024
+
+SCHEDULE_COLUMNS = ("Exercise", "Sets", "Reps", "Load (kg)", "Rest")
+
+_schedules = OrderedDict()
+_lock = threading.Lock()
+
+
+def phase_of(week):
+    # week is 1-based
+    current = PHASES[0]
+    for phase in PHASES:
+        if week >= phase.first_week:
+            current = phase
+    return current
+
+
+def target_load(e1rm, reps, reserve):
+    """Inverse Epley: the load for reps with reserve reps to spare, on the plate step."""
+    kg = np.asarray(e1rm, dtype=np.float64) / (1 + (np.asarray(reps) + reserve) / 30)
+    return np.round(kg / PLATE_STEP_KG) * PLATE_STEP_KG
+
+
+class Schedule:
+    """A member's dated schedule as flat per-row arrays.
+
+    Rows of day i (start + i days) are day_offsets[i]:day_offsets[i + 1];
+    every row points at an exercise of the CompiledProgram.
+    """
+
+    def __init__(self, plan, start_date, days, sets):
+        program = compile_program(plan)
+        # (reps, rest) as written, in program row order
+        self.written = [(exercise["reps"], exercise["rest"])
+                        for workout in plan.values() for exercise in workout["exercises"]]
+        self.sets_per_row = np.array(program.sets, dtype=np.int64)
+        self.rest_per_row = np.array(program.rest_seconds, dtype=np.int64)
+        self.start = epoch_day(start_date)
+        self.days = days
+        self.weeks = (days + 6) // 7
+        self.phases = [phase_of(week) for week in range(1, self.weeks + 1)]
+        # Load growth index per schedule week; week -1 (before the start) is 1
+        gains = np.array([phase.weekly_gain for phase in self.phases])
+        self.growth = np.concatenate(([1.0], np.cumprod(1 + gains)))
+
+        self.weekday_rows = {}
+        for i, day_name in enumerate(program.days):
+            self.weekday_rows[day_name] = np.arange(program.day_offsets[i], program.day_offsets[i + 1])
+        self.program_names = program.names
+        self.program_reps_high = np.array(program.reps_high, dtype=np.int64)
+        self.program_loaded = (self.program_reps_high > 0) & (np.array(program.hold_seconds) == 0)
+        first = date.fromisoformat(start_date)
+        exercise, day_offsets = [], [0]
+        for i in range(days):
+            rows = self.weekday_rows.get((first + timedelta(days=i)).strftime("%A"), ())
+            exercise.extend(rows)
+            day_offsets.append(len(exercise))
+        self.day_offsets = np.array(day_offsets, dtype=np.intp)
+        self.exercise = np.array(exercise, dtype=np.intp)
+        self.row_day = np.repeat(np.arange(days), np.diff(self.day_offsets))
+        week = self.row_day // 7
+        low = np.array(program.reps_low, dtype=np.int64)[self.exercise]
+        high = np.array(program.reps_high, dtype=np.int64)[self.exercise]
+        reps_at = {"low": low, "mid": (low + high + 1) // 2, "high": high}
+        self.reps = np.select([np.array([self.phases[w].reps == end for w in week], dtype=bool)
+                               for end in reps_at], list(reps_at.values()), high)
+        self.reserve = np.array([self.phases[w].reserve for w in week], dtype=np.int64)
+        self.kg = np.full(len(self.exercise), np.nan)
+
+        # Lifts that can carry a load; holds and lifestyle items are shown as written
+        self.loaded = self.program_loaded[self.exercise]
+        self.names = np.array(program.names, dtype=object)[self.exercise]
+        self.sets = sets
+        self.synced_length = 0
+        self.synced_replaced = 0
+        self.generation = None
+        self.revision = -1
+        self.sync(sets)
+
+    def _week(self, day):
+        # Schedule week index of an epoch day, -1 before the start
+        return np.clip((np.asarray(day) - self.start) // 7, -1, self.weeks - 1)
+
+    def sync(self, sets):
+        """Bring loads up to date with sets logged since the last sync.
+
+        sets may be a later copy of the log synced before; a log of another
+        generation is read in full.
+        """
+        if sets.generation == self.generation and sets.revision == self.revision:
+            return
+        if sets.generation != self.generation:
+            changed = set(sets.names)
+        else:
+            rows = np.concatenate((np.arange(self.synced_length, sets.length),
+                                   np.asarray(sets.replaced[self.synced_replaced:], dtype=np.int64)))
+            changed = {sets.names[code] for code in np.unique(sets.exercise[rows])}
+        for exercise, (day, e1rm) in sets.latest_best(changed).items():
+            rows = np.flatnonzero((self.names == exercise) & self.loaded)
+            if self.revision >= 0:
+                # Rows up to the session keep what was prescribed at the time
+                rows = rows[self.row_day[rows] + self.start > day]
+            progressed = e1rm * self.growth[self._week(self.row_day[rows] + self.start) + 1] \
+                / self.growth[self._week(day) + 1]
+            self.kg[rows] = target_load(progressed, self.reps[rows], self.reserve[rows])
+        self.sets = sets
+        self.synced_length = sets.length
+        self.synced_replaced = len(sets.replaced)
+        self.generation = sets.generation
+        self.revision = sets.revision
+
+    # ---- reads ---------------------------------------------------------
+
+    def day_index(self, iso):
+        i = epoch_day(iso) - self.start
+        return i if 0 <= i < self.days else None
+
+    def week_of(self, iso):
+        # 1-based schedule week, None outside the goal period
+        i = self.day_index(iso)
+        return None if i is None else i // 7 + 1
+
+    def phase(self, week):
+        return self.phases[min(week, self.weeks) - 1]
+
+    def dates(self, week):
+        first = (week - 1) * 7
+        return [iso_date(self.start + i) for i in range(first, min(first + 7, self.days))]
+
+    def session(self, iso):
+        """The date's sets in training order as SessionSet tuples.
+
+        Outside the goal period the weekday's template is used, at the top
+        of each rep range and without loads. Rest after an exercise's last
+        set is the transition to the next one.
+        """
+        i = self.day_index(iso)
+        if i is None:
+            rows = self.weekday_rows.get(date.fromisoformat(iso).strftime("%A"), ())
+            entries = [(j, self.program_reps_high[j], np.nan) for j in rows]
+        else:
+            rows = range(self.day_offsets[i], self.day_offsets[i + 1])
+            entries = [(self.exercise[r], self.reps[r], self.kg[r]) for r in rows]
+        steps = []
+        for k, (j, reps, kg) in enumerate(entries):
+            loaded = bool(self.program_loaded[j])
+            sets = int(self.sets_per_row[j])
+            for set_no in range(1, sets + 1):
+                if set_no < sets:
+                    rest = int(self.rest_per_row[j])
+                else:
+                    rest = TRANSITION_SECONDS if k + 1 < len(entries) else 0
+                steps.append(SessionSet(self.program_names[j], set_no, sets,
+                                        int(reps) if loaded else self.written[j][0],
+                                        None if np.isnan(kg) else float(kg), loaded, rest))
+        return steps
+
+    def _columns(self, iso):
+        # SCHEDULE_COLUMNS -> cells of one date, None outside the period
+        i = self.day_index(iso)
+        if i is None:
+            return None
+        rows = slice(self.day_offsets[i], self.day_offsets[i + 1])
+        written = [self.written[j] for j in self.exercise[rows]]
+        reps = [str(r) if loaded else text for r, loaded, (text, _) in
+                zip(self.reps[rows], self.loaded[rows], written)]
+        # Lifts without history yet are prescribed by effort: reps in reserve
+        loads = [f"{kg:g}" if not np.isnan(kg) else f"RIR {reserve}" if loaded else "-"
+                 for kg, loaded, reserve in zip(self.kg[rows], self.loaded[rows], self.reserve[rows])]
+        return {
+            "Exercise": self.names[rows],
+            "Sets": self.sets_per_row[self.exercise[rows]],
+            "Reps": reps,
+            "Load (kg)": loads,
+            "Rest": [rest for _, rest in written],
+        }
+
+    @timed("data")
+    def table(self, iso):
+        """SCHEDULE_COLUMNS DataFrame of one date, or None outside the period."""
+        import pandas as pd
+
+        columns = self._columns(iso)
+        return None if columns is None else pd.DataFrame(columns, columns=list(SCHEDULE_COLUMNS))
+
+    @timed("data")
+    def markdown(self, iso):
+        """The same table as markdown, for pages that shouldn't load pandas."""
+        columns = self._columns(iso)
+        return None if columns is None else markdown_table(SCHEDULE_COLUMNS, zip(*columns.values()))
+
+
+@timed("data")
+def member_schedule(user_id, profile, logs, plan):
+    """The member's Schedule, built once and synced with new sets on reads.
+
+    Writes may hand back a new copy of the logs; the schedule catches up
+    from the copy's generation and revision, not from the object it saw.
+    """
+    key = (profile["start_date"], profile["goal_period"], compile_program(plan).content_hash)
+    with _lock:
+        cached = _schedules.get(user_id)
+        if cached is not None and cached[0] == key:
+            _schedules.move_to_end(user_id)
+            cached[1].sync(logs.sets)
+            return cached[1]
+
+    schedule = Schedule(plan, profile["start_date"], profile["goal_period"], logs.sets)
+    with _lock:
+        _schedules[user_id] = (key, schedule)
+        while len(_schedules) > SCHEDULE_CACHE_SIZE:
+            _schedules.popitem(last=False)
+    return schedule
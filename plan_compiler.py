@@ -0,0 +1,313 @@
+import hashlib
+import json
+import re
+import threading
+from array import array
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+from nutrition import food_table
+
+# Compiled artifacts are immutable and shared by every session in the
+# process; they are keyed by a hash of the plan contents, so editing a plan
+# simply produces a new entry on the next rerun. Generated meal plans are
+# compiled too, so the least recently used artifacts are evicted.
+WorkoutDay = namedtuple("WorkoutDay", "day focus cardio table_md exercise_count total_sets heading_md cardio_md")
+CompiledWorkoutPlan = namedtuple("CompiledWorkoutPlan", "content_hash days")
+MealSlot = namedtuple("MealSlot",
+                      "slot purpose calories protein carbs fats expander_label summary_md items_md card_md")
+CompiledMealPlan = namedtuple("CompiledMealPlan",
+                              "content_hash slots total_calories total_protein total_carbs total_fats")
+
+EXERCISE_COLUMNS = ("name", "sets", "reps", "rest")
+COMPILED_CACHE_SIZE = 1024
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def content_hash(*parts):
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cached(kind, payload, build):
+    key = (kind, content_hash(payload))
+    with _lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+
+    compiled = build(key[1])
+    with _lock:
+        # Another session may have built it meanwhile; keep the first
+        compiled = _cache.setdefault(key, compiled)
+        _cache.move_to_end(key)
+        while len(_cache) > COMPILED_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def _bullets(items, prefix=""):
+    return "\n".join(f"- {prefix}{item}" for item in items)
+
+
+def markdown_table(columns, rows):
+    # Static tables are markdown, so showing a plan needs neither pandas nor Arrow
+    lines = ["| " + " | ".join(columns) + " |", "|" + " --- |" * len(columns)]
+    lines += ["| " + " | ".join(str(cell).replace("|", "\\|") for cell in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def compile_workout_plan(plan):
+    def build(digest):
+        days = {}
+        for day, workout in plan.items():
+            exercises = workout["exercises"]
+            days[day] = WorkoutDay(
+                day=day,
+                focus=workout["focus"],
+                cardio=workout["cardio"],
+                table_md=markdown_table(EXERCISE_COLUMNS,
+                                        [[exercise[c] for c in EXERCISE_COLUMNS] for exercise in exercises]),
+                exercise_count=len(exercises),
+                total_sets=sum(exercise["sets"] for exercise in exercises),
+                heading_md=f"### {day} - {workout['focus']}",
+                cardio_md=f"**Cardio:** {workout['cardio']}",
+            )
+        return CompiledWorkoutPlan(digest, MappingProxyType(days))
+
+    return _cached("workout", plan, build)
+
+
+def compile_meal_plan(plan):
+    def build(digest):
+        # Macros for every item of the plan come from one vectorized pass
+        per_item = food_table().item_macros([item for meal in plan.values() for item in meal["items"]])
+        slots = {}
+        start = 0
+        for slot, meal in plan.items():
+            end = start + len(meal["items"])
+            calories, protein, carbs, fats = map(int, per_item[start:end].sum(axis=0).round())
+            start = end
+            items_md = _bullets(meal["items"])
+            slots[slot] = MealSlot(
+                slot=slot,
+                purpose=meal["purpose"],
+                calories=calories,
+                protein=protein,
+                carbs=carbs,
+                fats=fats,
+                expander_label=f"**{slot}** - {meal['purpose']}",
+                summary_md=(f"**Calories:** {calories} | **Protein:** {protein}g | "
+                            f"**Carbs:** {carbs}g | **Fats:** {fats}g"),
+                items_md=items_md,
+                card_md=(f"### {slot}\n\n"
+                         f"**Purpose:** {meal['purpose']}\n\n"
+                         f"**Nutrition:** {calories} calories | {protein}g protein | "
+                         f"{carbs}g carbs | {fats}g fats\n\n"
+                         f"**Items:**\n\n{items_md}"),
+            )
+        return CompiledMealPlan(
+            digest,
+            MappingProxyType(slots),
+            sum(meal.calories for meal in slots.values()),
+            sum(meal.protein for meal in slots.values()),
+            sum(meal.carbs for meal in slots.values()),
+            sum(meal.fats for meal in slots.values()),
+        )
+
+    return _cached("meal", plan, build)
+
+
+def compile_bullets(items, prefix=""):
+    return _cached(("bullets", prefix), items, lambda digest: _bullets(items, prefix))
+
+
+def compile_milestones(milestones):
+    def build(digest):
+        blocks = []
+        for month, details in milestones.items():
+            lines = [f"#### {month}"]
+            lines += [f"**{key}:** {value}" for key, value in details.items()]
+            blocks.append("\n\n".join(lines))
+        return "\n\n".join(blocks)
+
+    return _cached("milestones", milestones, build)
+
+
+# ---- typed program model -------------------------------------------------
+
+# Timing assumptions for session estimates
+SECONDS_PER_REP = 3
+TRANSITION_SECONDS = 60
+# Prescriptions longer than this ("8+ hours" of sleep) are lifestyle items,
+# not gym-floor time
+MAX_FLOOR_ITEM_SECONDS = 2 * 3600
+
+_RANGE = re.compile(r"^(\d+(?:\.\d+)?)\s*(?:-\s*(\d+(?:\.\d+)?))?\s*\+?\s*([a-z]*)")
+_UNIT_SECONDS = {"": None, "s": 1, "sec": 1, "min": 60, "mins": 60,
+                 "hour": 3600, "hours": 3600, "h": 3600}
+_CARDIO_MINUTES = re.compile(r"(\d+)\s*min")
+
+
+def _parse_quantity(text):
+    # "8-10" -> (8, 10, None); "60s hold" -> (60, 60, 1); "30-45 min" -> (30, 45, 60)
+    match = _RANGE.match(text.strip().lower())
+    if not match:
+        return None
+    low = float(match.group(1))
+    high = float(match.group(2) or low)
+    unit = match.group(3)
+    if unit not in _UNIT_SECONDS:
+        return None
+    return low, high, _UNIT_SECONDS[unit]
+
+
+def parse_reps(text):
+    """Return (reps_low, reps_high, hold_seconds) for a reps prescription.
+
+    Timed prescriptions count as a single rep held for the midpoint of the
+    given range; unparseable text ("-") yields (0, 0, 0).
+    """
+    quantity = _parse_quantity(text)
+    if quantity is None:
+        return 0, 0, 0
+    low, high, unit_seconds = quantity
+    if unit_seconds is None:
+        return int(low), int(high), 0
+    return 1, 1, int((low + high) / 2 * unit_seconds)
+
+
+def parse_rest(text):
+    quantity = _parse_quantity(text)
+    if quantity is None:
+        return 0
+    low, high, unit_seconds = quantity
+    return int((low + high) / 2 * (unit_seconds or 1))
+
+
+def parse_cardio_minutes(text):
+    return sum(int(minutes) for minutes in _CARDIO_MINUTES.findall(text))
+
+
+class Exercise:
+    __slots__ = ("name", "sets", "reps_low", "reps_high", "hold_seconds", "rest_seconds")
+
+    def __init__(self, name, sets, reps_low, reps_high, hold_seconds, rest_seconds):
+        self.name = name
+        self.sets = sets
+        self.reps_low = reps_low
+        self.reps_high = reps_high
+        self.hold_seconds = hold_seconds
+        self.rest_seconds = rest_seconds
+
+    @property
+    def work_seconds(self):
+        # Time under load for one set
+        if self.hold_seconds:
+            return self.hold_seconds
+        return (self.reps_low + self.reps_high) / 2 * SECONDS_PER_REP
+
+    @property
+    def session_seconds(self):
+        if self.work_seconds > MAX_FLOOR_ITEM_SECONDS:
+            return 0
+        return self.sets * self.work_seconds + (self.sets - 1) * self.rest_seconds
+
+    def __repr__(self):
+        return (f"Exercise({self.name!r}, sets={self.sets}, reps={self.reps_low}-{self.reps_high}, "
+                f"hold={self.hold_seconds}s, rest={self.rest_seconds}s)")
+
+
+class DayStats:
+    __slots__ = ("day", "exercise_count", "total_sets", "total_reps", "cardio_minutes",
+                 "session_seconds")
+
+    def __init__(self, day, exercise_count, total_sets, total_reps, cardio_minutes, session_seconds):
+        self.day = day
+        self.exercise_count = exercise_count
+        self.total_sets = total_sets
+        self.total_reps = total_reps
+        self.cardio_minutes = cardio_minutes
+        self.session_seconds = session_seconds
+
+    @property
+    def session_minutes(self):
+        return round(self.session_seconds / 60)
+
+
+class CompiledProgram:
+    """Column-oriented view of a workout plan with every string parsed once.
+
+    Exercises of all days are stored back to back in typed arrays;
+    day_offsets[i]:day_offsets[i + 1] is the slice belonging to days[i].
+    """
+
+    __slots__ = ("content_hash", "days", "day_offsets", "names", "sets", "reps_low",
+                 "reps_high", "hold_seconds", "rest_seconds", "cardio_minutes", "stats",
+                 "_day_index")
+
+    def __init__(self, content_hash, plan):
+        self.content_hash = content_hash
+        self.days = tuple(plan)
+        self._day_index = {day: i for i, day in enumerate(self.days)}
+        self.day_offsets = array("I", [0])
+        self.names = []
+        self.sets = array("H")
+        self.reps_low = array("H")
+        self.reps_high = array("H")
+        self.hold_seconds = array("I")
+        self.rest_seconds = array("H")
+        self.cardio_minutes = array("H")
+
+        for workout in plan.values():
+            for exercise in workout["exercises"]:
+                reps_low, reps_high, hold = parse_reps(exercise["reps"])
+                self.names.append(exercise["name"])
+                self.sets.append(exercise["sets"])
+                self.reps_low.append(reps_low)
+                self.reps_high.append(reps_high)
+                self.hold_seconds.append(hold)
+                self.rest_seconds.append(parse_rest(exercise["rest"]))
+            self.day_offsets.append(len(self.names))
+            self.cardio_minutes.append(parse_cardio_minutes(workout.get("cardio", "")))
+
+        self.names = tuple(self.names)
+        self.stats = tuple(self._day_stats(i) for i in range(len(self.days)))
+
+    def exercises(self, day):
+        i = self._day_index[day]
+        return [self._exercise(j) for j in range(self.day_offsets[i], self.day_offsets[i + 1])]
+
+    def _exercise(self, j):
+        return Exercise(self.names[j], self.sets[j], self.reps_low[j], self.reps_high[j],
+                        self.hold_seconds[j], self.rest_seconds[j])
+
+    def _day_stats(self, i):
+        start, end = self.day_offsets[i], self.day_offsets[i + 1]
+        exercises = [self._exercise(j) for j in range(start, end)]
+        lifting = sum(exercise.session_seconds for exercise in exercises)
+        transitions = max(len(exercises) - 1, 0) * TRANSITION_SECONDS
+        return DayStats(
+            day=self.days[i],
+            exercise_count=end - start,
+            total_sets=sum(self.sets[start:end]),
+            total_reps=sum(exercise.sets * (exercise.reps_low + exercise.reps_high) // 2
+                           for exercise in exercises if not exercise.hold_seconds),
+            cardio_minutes=self.cardio_minutes[i],
+            session_seconds=int(lifting + transitions + self.cardio_minutes[i] * 60),
+        )
+
+    def day_stats(self, day):
+        return self.stats[self._day_index[day]]
+
+    def floor_minutes(self, members_per_day):
+        # Total gym-floor minutes for a {day: member count} attendance forecast
+        return sum(self.day_stats(day).session_seconds * count
+                   for day, count in members_per_day.items()) / 60
+
+
+def compile_program(plan):
+    return _cached("program", plan, lambda digest: CompiledProgram(digest, plan))
@@ -0,0 +1,274 @@
+# Your personalized data
+CURRENT_WEIGHT = 74.5
+TARGET_WEIGHT = 70.0
+GOAL_PERIOD = 90  # 3 months
+WEEKLY_LOSS = (CURRENT_WEIGHT - TARGET_WEIGHT) / (GOAL_PERIOD / 7)  # ~0.38 kg per week
+
+# Default daily targets, used where no member profile applies. Members get
+# their own from targets.py (BMR/TDEE from sex, age, height, weight and
+# activity, minus the deficit their goal needs).
+# For 74.5 kg, moderate activity, male (assumed): BMR ≈ 1700
+# For muscle gain + fat loss: deficit of 300-500 calories
+DAILY_CALORIES = 2200
+PROTEIN_G = 150  # 2g per kg body weight
+CARBS_G = 220
+FATS_G = 60
+
+# Comprehensive 3-Month Workout Plan
+WORKOUT_PLAN = {
+    "Monday": {
+        "focus": "Chest & Triceps",
+        "exercises": [
+            {"name": "Bench Press", "sets": 4, "reps": "8-10", "rest": "90s"},
+            {"name": "Incline Dumbbell Press", "sets": 3, "reps": "10-12", "rest": "60s"},
+            {"name": "Cable Chest Fly", "sets": 3, "reps": "12-15", "rest": "60s"},
+            {"name": "Push-ups", "sets": 3, "reps": "15-20", "rest": "45s"},
+            {"name": "Tricep Dips", "sets": 3, "reps": "10-12", "rest": "60s"},
+            {"name": "Tricep Pushdowns", "sets": 3, "reps": "12-15", "rest": "45s"},
+            {"name": "Overhead Tricep Extension", "sets": 3, "reps": "12-15", "rest": "45s"},
+        ],
+        "cardio": "10 min treadmill warm-up, 15 min HIIT post-workout"
+    },
+    "Tuesday": {
+        "focus": "Back & Biceps",
+        "exercises": [
+            {"name": "Pull-ups/Lat Pulldown", "sets": 4, "reps": "8-10", "rest": "90s"},
+            {"name": "Barbell Rows", "sets": 4, "reps": "8-10", "rest": "90s"},
+            {"name": "Seated Cable Rows", "sets": 3, "reps": "10-12", "rest": "60s"},
+            {"name": "Face Pulls", "sets": 3, "reps": "15-20", "rest": "45s"},
+            {"name": "Dumbbell Bicep Curls", "sets": 4, "reps": "10-12", "rest": "60s"},
+            {"name": "Hammer Curls", "sets": 3, "reps": "12-15", "rest": "45s"},
+            {"name": "Cable Bicep Curls", "sets": 3, "reps": "12-15", "rest": "45s"},
+        ],
+        "cardio": "10 min cycling warm-up, 20 min steady-state cardio"
+    },
+    "Wednesday": {
+        "focus": "Legs & Core",
+        "exercises": [
+            {"name": "Squats", "sets": 4, "reps": "8-10", "rest": "2min"},
+            {"name": "Leg Press", "sets": 3, "reps": "10-12", "rest": "90s"},
+            {"name": "Romanian Deadlifts", "sets": 3, "reps": "10-12", "rest": "90s"},
+            {"name": "Leg Curls", "sets": 3, "reps": "12-15", "rest": "60s"},
+            {"name": "Calf Raises", "sets": 4, "reps": "15-20", "rest": "45s"},
+            {"name": "Planks", "sets": 3, "reps": "60s hold", "rest": "60s"},
+            {"name": "Hanging Leg Raises", "sets": 3, "reps": "12-15", "rest": "60s"},
+        ],
+        "cardio": "15 min stair climber"
+    },
+    "Thursday": {
+        "focus": "Shoulders & Arms",
+        "exercises": [
+            {"name": "Overhead Press", "sets": 4, "reps": "8-10", "rest": "90s"},
+            {"name": "Lateral Raises", "sets": 4, "reps": "12-15", "rest": "60s"},
+            {"name": "Front Raises", "sets": 3, "reps": "12-15", "rest": "60s"},
+            {"name": "Rear Delt Fly", "sets": 3, "reps": "12-15", "rest": "60s"},
+            {"name": "Barbell Curls", "sets": 3, "reps": "10-12", "rest": "60s"},
+            {"name": "Skull Crushers", "sets": 3, "reps": "10-12", "rest": "60s"},
+            {"name": "21s (Biceps)", "sets": 2, "reps": "21", "rest": "90s"},
+        ],
+        "cardio": "20 min cycling intervals"
+    },
+    "Friday": {
+        "focus": "Full Body Power",
+        "exercises": [
+            {"name": "Deadlifts", "sets": 4, "reps": "6-8", "rest": "2min"},
+            {"name": "Incline Bench Press", "sets": 3, "reps": "8-10", "rest": "90s"},
+            {"name": "Weighted Pull-ups", "sets": 3, "reps": "6-8", "rest": "90s"},
+            {"name": "Dumbbell Shoulder Press", "sets": 3, "reps": "10-12", "rest": "60s"},
+            {"name": "Cable Rows", "sets": 3, "reps": "10-12", "rest": "60s"},
+            {"name": "Dips", "sets": 3, "reps": "10-12", "rest": "60s"},
+        ],
+        "cardio": "15 min HIIT treadmill sprints"
+    },
+    "Saturday": {
+        "focus": "Active Recovery & Core",
+        "exercises": [
+            {"name": "Light Cardio (Walking/Cycling)", "sets": 1, "reps": "30-45 min", "rest": "-"},
+            {"name": "Yoga/Stretching", "sets": 1, "reps": "20 min", "rest": "-"},
+            {"name": "Planks", "sets": 3, "reps": "60s", "rest": "60s"},
+            {"name": "Russian Twists", "sets": 3, "reps": "20", "rest": "45s"},
+            {"name": "Mountain Climbers", "sets": 3, "reps": "30s", "rest": "45s"},
+        ],
+        "cardio": "Light activity only"
+    },
+    "Sunday": {
+        "focus": "Rest Day",
+        "exercises": [
+            {"name": "Complete Rest or Light Walk", "sets": 1, "reps": "30 min", "rest": "-"},
+            {"name": "Meal Prep for Week", "sets": 1, "reps": "-", "rest": "-"},
+            {"name": "Recovery & Sleep Focus", "sets": 1, "reps": "8+ hours", "rest": "-"},
+        ],
+        "cardio": "Optional: 20 min walk"
+    }
+}
+
+# Comprehensive Meal Plan
+MEAL_PLAN = {
+    "Early Morning (6:00 AM)": {
+        "items": [
+            "1 glass warm water with lemon",
+            "5-10 soaked almonds",
+        ],
+        "purpose": "Kickstart metabolism"
+    },
+    "Pre-Workout (7:00 AM)": {
+        "items": [
+            "1 banana",
+            "1 scoop whey protein with water",
+            "Black coffee (optional)",
+        ],
+        "purpose": "Energy for workout"
+    },
+    "Breakfast (9:00 AM)": {
+        "items": [
+            "3 egg whites + 1 whole egg (scrambled/boiled)",
+            "1 whole wheat bread slice or 0.5 cup oats",
+            "1 cup milk or greek yogurt",
+            "Mixed vegetables (cucumber, tomato)",
+        ],
+        "purpose": "Post-workout recovery"
+    },
+    "Mid-Morning Snack (11:30 AM)": {
+        "items": [
+            "1 apple or orange",
+            "8-10 roasted cashews or peanuts",
+            "Green tea",
+        ],
+        "purpose": "Sustained energy"
+    },
+    "Lunch (1:30 PM)": {
+        "items": [
+            "100g grilled chicken breast or 125g paneer/tofu",
+            "0.75 cup brown rice or 2 chapatis",
+            "0.5 cup dal (lentils)",
+            "Large mixed salad with olive oil",
+            "0.5 cup curd/yogurt",
+        ],
+        "purpose": "Main meal - muscle building"
+    },
+    "Evening Snack (4:30 PM)": {
+        "items": [
+            "1 cup sprouts or boiled chickpeas",
+            "Green tea or buttermilk",
+            "2-3 whole grain crackers",
+        ],
+        "purpose": "Pre-evening energy"
+    },
+    "Dinner (8:00 PM)": {
+        "items": [
+            "100g grilled fish/chicken or 100g paneer",
+            "1 chapati or 0.5 cup quinoa",
+            "Mixed vegetable curry (no oil)",
+            "Clear vegetable soup",
+            "Small bowl of salad",
+        ],
+        "purpose": "Light dinner for recovery"
+    },
+    "Before Bed (10:00 PM)": {
+        "items": [
+            "1 glass warm milk or casein protein shake",
+            "5 almonds",
+        ],
+        "purpose": "Overnight muscle recovery"
+    }
+}
+
+# Interchangeable foods for the meal plan generator. An item whose food
+# appears in a group may be swapped for any other entry of that group,
+# portioned to the same calories.
+SUBSTITUTIONS = {
+    "Lean protein": [
+        "150g grilled chicken breast", "150g grilled fish", "150g turkey breast", "120g lean beef",
+        "4 egg whites + 1 whole egg", "200g paneer", "250g tofu", "150g tempeh", "150g seitan",
+        "50g soy chunks",
+    ],
+    "Protein shake": ["1 scoop whey protein", "1 scoop plant protein", "1 scoop casein protein"],
+    "Grains": [
+        "1.5 cups brown rice", "3 chapatis", "1.5 cups quinoa", "250g sweet potato",
+        "1.5 cups whole wheat pasta", "2 whole wheat bread slices", "1 cup oats",
+    ],
+    "Dairy": ["1 cup milk", "1 cup greek yogurt", "1 cup curd", "1 cup soy milk", "1 cup buttermilk",
+              "1 cup soy yogurt"],
+    "Legumes": ["1 cup dal", "1 cup sprouts", "1 cup boiled chickpeas", "1 cup edamame"],
+    "Fruit": ["1 apple", "1 orange", "1 banana", "1 cup berries", "1 cup papaya"],
+    "Nuts": ["10 almonds", "10-12 roasted cashews", "20 peanuts", "5 walnuts"],
+}
+
+# Notification schedule
+NOTIFICATIONS = {
+    "06:00": "⏰ Good Morning! Time to wake up and drink warm lemon water",
+    "07:00": "🍌 Pre-workout meal time! Have banana + protein shake",
+    "07:30": "💪 GYM TIME! Let's crush today's workout",
+    "09:00": "🍳 Post-workout breakfast - Your muscles need protein!",
+    "11:30": "🍎 Mid-morning snack time - Stay fueled",
+    "13:30": "🍽️ Lunch time - Your biggest meal of the day",
+    "16:30": "☕ Evening snack - Healthy options only",
+    "20:00": "🌙 Dinner time - Keep it light and protein-rich",
+    "22:00": "🥛 Before bed - Warm milk for recovery",
+    "22:30": "😴 Sleep time - Recovery is crucial for muscle growth"
+}
+
+# Tips and guidelines
+NUTRITION_TIPS = [
+    "Drink 3-4 liters of water daily",
+    "Avoid sugar, fried foods, and processed snacks",
+    "Eat protein with every meal (eggs, chicken, fish, paneer, dal)",
+    "Include green vegetables in lunch and dinner",
+    "No eating after 10 PM",
+    "Cheat meal allowed once per week (Sunday lunch)",
+    "Track your weight every Monday morning",
+    "Sleep 7-8 hours daily for muscle recovery",
+    "Take rest days seriously - muscles grow during rest",
+    "Progressive overload - increase weight gradually"
+]
+
+WORKOUT_TIPS = [
+    "Warm up for 10 minutes before lifting",
+    "Focus on form over heavy weights initially",
+    "Breathe properly - exhale on effort",
+    "Stretch after every workout for 10 minutes",
+    "Track your weights and aim to increase gradually",
+    "Rest 48 hours between training same muscle group",
+    "Stay hydrated during workouts",
+    "Mind-muscle connection is key"
+]
+
+AVOID_FOODS = [
+    "Sugar and sweets (chocolates, candies, ice cream)",
+    "Fried foods (pakoras, samosas, chips)",
+    "Processed foods (biscuits, instant noodles)",
+    "Soft drinks and fruit juices (high sugar)",
+    "White bread and refined flour products",
+    "High-fat dairy (full cream milk, butter in excess)",
+    "Alcohol (empty calories)",
+    "Late night snacking after 10 PM"
+]
+
+SUCCESS_FACTORS = [
+    "Consistency > Perfection (80% adherence is success)",
+    "Track everything - weight, meals, workouts",
+    "Take progress photos every 2 weeks",
+    "Measure body parts monthly (chest, arms, waist)",
+    "Sleep 7-8 hours daily",
+    "Manage stress - it affects results",
+    "Be patient - visible results in 4-6 weeks",
+    "Join a gym partner for accountability"
+]
+
+MILESTONES = {
+    "Month 1 (Days 1-30)": {
+        "Weight Target": "72.5 kg (-2.0 kg)",
+        "Focus": "Building habit, learning form, initial fat loss",
+        "Expectations": "Initial water weight loss, feeling energetic"
+    },
+    "Month 2 (Days 31-60)": {
+        "Weight Target": "71.0 kg (-1.5 kg)",
+        "Focus": "Muscle definition starts showing, strength increases",
+        "Expectations": "Clothes fit better, visible chest and arm development"
+    },
+    "Month 3 (Days 61-90)": {
+        "Weight Target": "70.0 kg (-1.0 kg)",
+        "Focus": "Peak performance, final push, maintenance planning",
+        "Expectations": "Clear muscle definition, significant transformation"
+    }
+}
@@ -0,0 +1,461 @@
+"""Weekly progress reports for every member, rendered in parallel.
+
+A report covers the week ending last Sunday, with the numbers of the
+Progress page as of that day: weight lost and left to lose, the weight
+chart, workout completion and whether the trend is on track for the
+target. It also checks the Monthly Milestones, scaled to the member's own
+goal, against the member's actual weight. The chart is an inline SVG, so a report is one self-contained
+file that opens and prints offline.
+
+    python reports.py --out reports/
+    python reports.py --out reports/ --format pdf      # needs weasyprint
+
+Members are streamed from the store in chunks to a process pool, with
+only a few chunks in flight at once. MANIFEST_FILE in the output
+directory keeps a key per member covering the log version, the profile,
+the report week and REPORT_LAYOUT. Members whose key hasn't changed since
+the last run are skipped before any of their logs are read.
+"""
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from archive import archive_path, open_archive, weight_series
+from charts import lttb
+from plan_compiler import content_hash
+from plans import CURRENT_WEIGHT, GOAL_PERIOD, MILESTONES, TARGET_WEIGHT
+from storage import DATA_DIR, STORE_BACKEND, open_store
+from trend import TREND_DAYS, TrendFilter
+
+REPORT_FORMATS = ("html", "pdf")
+MANIFEST_FILE = "manifest.json"
+# Bump when the report's content or look changes, to re-render everyone
+REPORT_LAYOUT = 2
+# Members per task sent to a worker, and tasks in flight per worker
+CHUNK_SIZE = 64
+CHUNKS_IN_FLIGHT = 2
+# Reports written between manifest saves, so an interrupted run keeps most of its work
+MANIFEST_EVERY = 1000
+# Each Monthly Milestone is due this many days after the previous one over
+# the plan's GOAL_PERIOD; other goal periods stretch or shrink them
+MILESTONE_DAYS = 30
+# Completion rates (%) judged excellent and good, as on the Progress page
+EXCELLENT_COMPLETION = 80
+GOOD_COMPLETION = 60
+
+CHART_WIDTH, CHART_HEIGHT = 720, 300
+CHART_MARGIN = (20, 20, 40, 50)   # top, right, bottom, left
+CHART_POINTS = 360
+CHART_TICKS = 5
+
+_MILESTONE_KG = re.compile(r"(\d+(?:\.\d+)?)\s*kg")
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_worker = {}
+
+
+def report_week(today=None):
+    """(Monday, Sunday) of the last full week before today."""
+    today = today or date.today()
+    sunday = today - timedelta(days=today.isoweekday())
+    return sunday - timedelta(days=6), sunday
+
+
+def with_defaults(profile, first_weight_date=None):
+    # Members created through the API or an import may have no profile yet
+    return {**profile,
+            "start_date": profile.get("start_date") or first_weight_date,
+            "start_weight": profile.get("start_weight") or CURRENT_WEIGHT,
+            "target_weight": profile.get("target_weight") or TARGET_WEIGHT,
+            "goal_period": profile.get("goal_period") or GOAL_PERIOD}
+
+
+def report_key(version, profile, week_end):
+    return content_hash(version, profile, week_end.isoformat(), MILESTONES, REPORT_LAYOUT)
+
+
+def milestone_targets(profile, milestones=MILESTONES):
+    """[(name, due day, kg)] of the milestones whose Weight Target names a weight.
+
+    The plan's milestones are written for CURRENT_WEIGHT -> TARGET_WEIGHT
+    over GOAL_PERIOD days; each is moved to the same share of the member's
+    goal loss and goal period.
+    """
+    plan_loss = CURRENT_WEIGHT - TARGET_WEIGHT
+    goal_loss = profile["start_weight"] - profile["target_weight"]
+    plan_period = profile["goal_period"] == GOAL_PERIOD
+    targets = []
+    for name, details in milestones.items():
+        match = _MILESTONE_KG.search(details.get("Weight Target", ""))
+        if not match:
+            continue
+        share = (CURRENT_WEIGHT - float(match.group(1))) / plan_loss
+        number = len(targets) + 1
+        day = round(MILESTONE_DAYS * number * profile["goal_period"] / GOAL_PERIOD)
+        targets.append((name if plan_period else f"Milestone {number} (Day {day})", day,
+                        round(profile["start_weight"] - share * goal_loss, 1)))
+    return targets
+
+
+def member_report(user_id, profile, logs, archive=None, week_end=None):
+    """The report's numbers for one member as of week_end (a Sunday)."""
+    week_end = week_end or report_week()[1]
+    week_start = week_end - timedelta(days=6)
+    days, kg = weight_series(logs, archive, end=week_end.isoformat())
+    profile = with_defaults(profile, str(days[0]) if len(days) else week_end.isoformat())
+    start = date.fromisoformat(profile["start_date"])
+    goal_date = start + timedelta(days=profile["goal_period"])
+    ordinals = days.astype(np.int64) + _EPOCH_ORDINAL
+
+    # Same filter and window as the trend the app keeps on every write
+    trend, levels = TrendFilter(), np.empty(len(kg))
+    window_start = week_end.toordinal() - TREND_DAYS
+    for i, (day, weight) in enumerate(zip(ordinals, kg)):
+        if day > window_start:
+            trend.update(int(day), weight)
+            levels[i] = trend.level
+        else:
+            levels[i] = np.nan
+
+    current = float(kg[-1]) if len(kg) else profile["start_weight"]
+    before_week = kg[ordinals < week_start.toordinal()]
+    weight_lost = profile["start_weight"] - current
+    goal_loss = profile["start_weight"] - profile["target_weight"]
+    target = profile["target_weight"]
+    if trend.ready:
+        expected, earliest, latest = trend.target_dates(target)
+        if trend.level <= target:
+            status = ("success", "🎯 Your trend has reached the target weight!")
+        elif expected is not None and expected <= goal_date:
+            status = ("success", f"🎉 You're on track or ahead! Trend reaches {target:g} kg "
+                                 f"around {expected:%d %b %Y}")
+        elif expected is not None:
+            status = ("warning", f"⚠️ Need to push harder on diet and cardio: at this rate you reach "
+                                 f"{target:g} kg around {expected:%d %b %Y}, after your "
+                                 f"{goal_date:%d %b %Y} goal date")
+        else:
+            status = ("warning", "⚠️ Need to push harder on diet and cardio: your trend isn't heading "
+                                 "to the target yet")
+    else:
+        weekly_loss = goal_loss / (profile["goal_period"] / 7)
+        if weight_lost >= weekly_loss * ((week_end - start).days / 7):
+            status = ("success", "🎉 You're on track or ahead!")
+        else:
+            status = ("warning", "⚠️ Need to push harder on diet and cardio")
+
+    end_iso, week_start_iso = week_end.isoformat(), week_start.isoformat()
+    completed = [day for day in logs.workout_completed if day <= end_iso]
+    elapsed = (week_end - start).days
+    completion_rate = len(completed) / elapsed * 100 if elapsed > 0 else 0
+    if completion_rate >= EXCELLENT_COMPLETION:
+        consistency = ("success", "🔥 Excellent consistency!")
+    elif completion_rate >= GOOD_COMPLETION:
+        consistency = ("info", "👍 Good job, but room for improvement")
+    else:
+        consistency = ("warning", "⚠️ Need more consistency for best results")
+
+    milestones = []
+    # Goals to gain weight are reached from below
+    direction = 1 if goal_loss >= 0 else -1
+    for name, day, target_kg in milestone_targets(profile):
+        due = start + timedelta(days=day)
+        reached = kg[ordinals <= min(due, week_end).toordinal()]
+        actual = float(reached[-1]) if len(reached) else None
+        if actual is None:
+            result = "no weigh-in yet"
+        elif (actual - target_kg) * direction <= 0:
+            result = "✅ reached"
+        elif due <= week_end:
+            result = "❌ missed"
+        else:
+            result = f"⏳ {abs(actual - target_kg):.1f} kg to go"
+        milestones.append({"name": name, "due": due.isoformat(), "target": target_kg,
+                           "actual": actual, "result": result})
+
+    return {
+        "user_id": user_id,
+        "week_start": week_start_iso,
+        "week_end": end_iso,
+        "profile": profile,
+        "goal_date": goal_date.isoformat(),
+        "current_weight": current,
+        "weight_lost": weight_lost,
+        "remaining": current - target,
+        "goal_progress": weight_lost / goal_loss * 100 if goal_loss else 0,
+        "week_change": current - float(before_week[-1]) if len(before_week) and len(kg) > len(before_week)
+        else None,
+        "trend_level": trend.level if trend.ready else None,
+        "trend_weekly_change": trend.weekly_change if trend.ready else None,
+        "status": status,
+        "workouts_completed": len(completed),
+        "workouts_this_week": sum(day >= week_start_iso for day in completed),
+        "completion_rate": completion_rate,
+        "consistency": consistency,
+        "milestones": milestones,
+        "series": (ordinals, kg, levels),
+    }
+
+
+# ---- rendering -------------------------------------------------------------
+
+def weight_chart_svg(report, width=CHART_WIDTH, height=CHART_HEIGHT, points=CHART_POINTS):
+    """Actual weight, trend and target line as a static SVG, colored as in the app."""
+    ordinals, kg, levels = report["series"]
+    profile = report["profile"]
+    start = date.fromisoformat(profile["start_date"]).toordinal()
+    goal = date.fromisoformat(report["goal_date"]).toordinal()
+    if len(kg) > points:
+        keep = lttb(ordinals, kg, points)
+        ordinals, kg, levels = ordinals[keep], kg[keep], levels[keep]
+
+    x0 = min(start, int(ordinals[0])) if len(ordinals) else start
+    x1 = max(goal, date.fromisoformat(report["week_end"]).toordinal())
+    values = [profile["start_weight"], profile["target_weight"], *kg.tolist()]
+    y0, y1 = min(values) - 1, max(values) + 1
+    top, right, bottom, left = CHART_MARGIN
+    plot_w, plot_h = width - left - right, height - top - bottom
+
+    def sx(day):
+        return left + (day - x0) / max(x1 - x0, 1) * plot_w
+
+    def sy(value):
+        return top + (y1 - value) / (y1 - y0) * plot_h
+
+    def path(xs, ys):
+        return " ".join(f"{sx(x):.1f},{sy(y):.1f}" for x, y in zip(xs, ys) if not np.isnan(y))
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="11">']
+    for i in range(CHART_TICKS):
+        value = y0 + (y1 - y0) * i / (CHART_TICKS - 1)
+        day = x0 + (x1 - x0) * i // (CHART_TICKS - 1)
+        parts.append(f'<line x1="{left}" x2="{width - right}" y1="{sy(value):.1f}" y2="{sy(value):.1f}" '
+                     f'stroke="#e6e6e6"/>')
+        parts.append(f'<text x="{left - 6}" y="{sy(value) + 4:.1f}" text-anchor="end">{value:.1f}</text>')
+        parts.append(f'<text x="{sx(day):.1f}" y="{height - bottom + 16}" text-anchor="middle">'
+                     f'{date.fromordinal(day):%d %b %y}</text>')
+    parts.append(f'<polyline points="{path((start, goal), (profile["start_weight"], profile["target_weight"]))}" '
+                 f'fill="none" stroke="#1F77B4" stroke-width="2" stroke-dasharray="6 4"/>')
+    if len(kg):
+        parts.append(f'<polyline points="{path(ordinals, kg)}" fill="none" stroke="#FF4B4B" stroke-width="2"/>')
+        parts.append(f'<polyline points="{path(ordinals, levels)}" fill="none" stroke="#2CA02C" '
+                     f'stroke-width="2"/>')
+    legend = (("Actual Weight", "#FF4B4B"), ("Trend", "#2CA02C"), ("Target", "#1F77B4"))
+    for i, (label, color) in enumerate(legend):
+        x = left + 10 + i * 120
+        parts.append(f'<rect x="{x}" y="{height - 14}" width="12" height="4" fill="{color}"/>'
+                     f'<text x="{x + 16}" y="{height - 9}">{label}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+REPORT_STYLE = """
+body { font-family: sans-serif; color: #262730; max-width: 760px; margin: 24px auto; }
+h1 { color: #FF4B4B; font-size: 1.6rem; }
+.metrics { display: flex; gap: 12px; flex-wrap: wrap; }
+.metric { border: 1px solid #e6e6e6; border-radius: 8px; padding: 8px 12px; min-width: 150px; }
+.metric b { display: block; font-size: 1.3rem; }
+.success { background: #e8f5e9; } .warning { background: #fff8e1; } .info { background: #e3f2fd; }
+.note { padding: 8px 12px; border-radius: 8px; margin: 8px 0; }
+table { border-collapse: collapse; width: 100%; }
+td, th { border-bottom: 1px solid #e6e6e6; padding: 4px 8px; text-align: left; }
+"""
+
+
+def _metric(label, value, delta=None):
+    delta = f"<small>{html.escape(delta)}</small>" if delta else ""
+    return f'<div class="metric">{html.escape(label)}<b>{html.escape(value)}</b>{delta}</div>'
+
+
+def _note(kind_text):
+    kind, text = kind_text
+    return f'<div class="note {kind}">{html.escape(text)}</div>'
+
+
+def render_html(report):
+    week = f"{date.fromisoformat(report['week_start']):%d %b} – {date.fromisoformat(report['week_end']):%d %b %Y}"
+    metrics = [
+        _metric("Current Weight", f"{report['current_weight']:.1f} kg",
+                f"{report['week_change']:+.1f} kg this week" if report["week_change"] is not None else None),
+        _metric("Total Weight Lost", f"{report['weight_lost']:.1f} kg",
+                f"{report['goal_progress']:.1f}% of goal"),
+        _metric("Remaining to Lose", f"{report['remaining']:.1f} kg"),
+    ]
+    if report["trend_level"] is not None:
+        metrics.append(_metric("Trend Weight", f"{report['trend_level']:.1f} kg",
+                               f"{report['trend_weekly_change']:+.2f} kg/wk"))
+    workouts = [
+        _metric("Workouts Completed", f"{report['workouts_completed']} days",
+                f"{report['completion_rate']:.1f}% completion rate"),
+        _metric("This Week", f"{report['workouts_this_week']} workouts"),
+    ]
+    rows = "".join(
+        f"<tr><td>{html.escape(m['name'])}</td><td>{m['due']}</td><td>{m['target']:.1f} kg</td>"
+        f"<td>{'-' if m['actual'] is None else format(m['actual'], '.1f') + ' kg'}</td>"
+        f"<td>{html.escape(m['result'])}</td></tr>" for m in report["milestones"])
+    return (f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+            f"<title>Weekly report {html.escape(report['user_id'])} {report['week_end']}</title>"
+            f"<style>{REPORT_STYLE}</style></head><body>"
+            f"<h1>💪 Weekly Progress Report</h1><p>{html.escape(report['user_id'])} · {week}</p>"
+            f"<h2>📈 Current Stats</h2><div class=\"metrics\">{''.join(metrics)}</div>"
+            f"{_note(report['status'])}"
+            f"<h2>⚖️ Weight Loss Journey</h2>{weight_chart_svg(report)}"
+            f"<h2>💪 Workout Completion</h2><div class=\"metrics\">{''.join(workouts)}</div>"
+            f"{_note(report['consistency'])}"
+            f"<h2>📅 Monthly Milestones</h2><table><tr><th>Milestone</th><th>Due</th><th>Target</th>"
+            f"<th>Actual</th><th></th></tr>{rows}</table></body></html>")
+
+
+# ---- batch -----------------------------------------------------------------
+
+def _init_worker(backend, data_dir, out_dir, fmt, week_end):
+    # Each member is rendered once per run, so workers keep no logs cached
+    _worker.update(store=open_store(backend, data_dir, cache_size=0), data_dir=data_dir, out_dir=Path(out_dir),
+                   fmt=fmt, week_end=week_end)
+
+
+def _write_report(user_id, profile):
+    logs = _worker["store"].logs(user_id)
+    archive = open_archive(archive_path(_worker["data_dir"], user_id))
+    document = render_html(member_report(user_id, profile, logs, archive, _worker["week_end"]))
+    path = _worker["out_dir"] / f"{user_id}.{_worker['fmt']}"
+    partial = path.with_name(path.name + ".tmp")
+    if _worker["fmt"] == "pdf":
+        from weasyprint import HTML
+
+        HTML(string=document).write_pdf(partial)
+    else:
+        partial.write_text(document, encoding="utf-8")
+    os.replace(partial, path)
+
+
+def _render_chunk(chunk):
+    # [(user_id, key, error or None)] for a chunk of (user_id, profile, key)
+    results = []
+    for user_id, profile, key in chunk:
+        try:
+            _write_report(user_id, profile)
+            results.append((user_id, key, None))
+        except Exception as error:
+            results.append((user_id, key, f"{type(error).__name__}: {error}"))
+    return results
+
+
+def _load_manifest(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    partial = path.with_name(path.name + ".tmp")
+    partial.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+    os.replace(partial, path)
+
+
+def generate_reports(out_dir, backend=STORE_BACKEND, data_dir=DATA_DIR, fmt="html", workers=None,
+                     today=None, force=False):
+    """Render every changed member's report; returns the run's counts."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    week_end = report_week(today)[1]
+    manifest_path = out_dir / MANIFEST_FILE
+    manifest = {} if force else _load_manifest(manifest_path)
+    counts = {"members": 0, "skipped": 0, "rendered": 0, "failed": 0}
+    errors = []
+    store = open_store(backend, data_dir)
+
+    def due():
+        for user_id, version, profile in store.member_versions():
+            counts["members"] += 1
+            key = report_key(version, profile, week_end)
+            if manifest.get(user_id) == key and (out_dir / f"{user_id}.{fmt}").exists():
+                counts["skipped"] += 1
+                continue
+            yield user_id, profile, key
+
+    def chunks():
+        chunk = []
+        for member in due():
+            chunk.append(member)
+            if len(chunk) == CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    unsaved = 0
+
+    def collect(done):
+        nonlocal unsaved
+        for future in done:
+            for user_id, key, error in future.result():
+                if error:
+                    counts["failed"] += 1
+                    errors.append(f"{user_id}: {error}")
+                    manifest.pop(user_id, None)
+                else:
+                    counts["rendered"] += 1
+                    manifest[user_id] = key
+                    unsaved += 1
+        if unsaved >= MANIFEST_EVERY:
+            _save_manifest(manifest_path, manifest)
+            unsaved = 0
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(backend, data_dir, out_dir, fmt, week_end)) as pool:
+            pending = set()
+            for chunk in chunks():
+                if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(_render_chunk, chunk))
+            collect(wait(pending)[0])
+    finally:
+        store.close()
+        _save_manifest(manifest_path, manifest)
+    return {**counts, "week_end": week_end.isoformat(), "seconds": round(time.perf_counter() - started, 1),
+            "errors": errors[:20]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every member's weekly progress report")
+    parser.add_argument("--out", type=Path, required=True, help="output directory")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="html")
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--workers", type=int, help="processes (default: one per CPU)")
+    parser.add_argument("--date", type=date.fromisoformat, help="report the week before this date")
+    parser.add_argument("--force", action="store_true", help="re-render unchanged members too")
+    args = parser.parse_args()
+
+    if args.format == "pdf":
+        try:
+            import weasyprint  # noqa: F401
+        except ImportError:
+            sys.exit("PDF reports need weasyprint: pip install weasyprint")
+    result = generate_reports(args.out, args.backend, args.data_dir, args.format, args.workers,
+                              args.date, args.force)
+    for error in result["errors"]:
+        print(f"failed: {error}", file=sys.stderr)
+    print(f"{result['rendered']} rendered, {result['skipped']} unchanged, {result['failed']} failed "
+          f"of {result['members']} members in {result['seconds']:.1f}s", file=sys.stderr)
+    if result["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
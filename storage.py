@@ -0,0 +1,799 @@
+import copy
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import weakref
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from adherence import DayBitset, epoch_day, epoch_days
+from aggregates import ProgressAggregates
+from strength import SetLog
+
+# Where logs are kept between sessions (override with FITNESS_DATA_DIR)
+DATA_DIR = Path(os.environ.get("FITNESS_DATA_DIR", Path(__file__).resolve().parent / "data"))
+
+# Storage backend: "sqlite" (default, shared by many processes) or "journal"
+STORE_BACKEND = os.environ.get("FITNESS_STORE", "sqlite")
+
+# Number of journal records after which the journal is folded into a snapshot
+SNAPSHOT_EVERY = 1000
+
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_FILE = "journal.jsonl"
+# Copy of a journal member's profile, so listing members doesn't replay logs
+META_FILE = "meta.json"
+SQLITE_FILE = "fitness.db"
+
+POOL_SIZE = 8
+# Members whose loaded logs each store keeps, least recently read evicted first
+LOGS_CACHE_SIZE = 1024
+
+# Member profile columns; new ones are added to existing databases on open
+PROFILE_COLUMNS = {
+    "start_date": "TEXT",
+    "start_weight": "REAL",
+    "target_weight": "REAL",
+    "goal_period": "INTEGER",
+    "timezone": "TEXT",
+    "diet": "TEXT",
+    "sex": "TEXT",
+    "age": "INTEGER",
+    "height_cm": "REAL",
+    "activity": "TEXT",
+}
+PROFILE_FIELDS = tuple(PROFILE_COLUMNS)
+
+_USER_ID = re.compile(r"^[A-Za-z0-9_.@-]{1,64}$")
+
+
+def check_user_id(user_id):
+    if not _USER_ID.match(user_id or "") or user_id.startswith("."):
+        raise ValueError(f"Invalid member id: {user_id!r}")
+    return user_id
+
+
+class UserLogs:
+    """In-memory indexes over one member's weight, workout, set, meal, photo and
+    body-measurement logs."""
+
+    def __init__(self):
+        self.version = 0
+        self.meta = {}
+        self.weight_log = {}          # 'YYYY-MM-DD' -> kg
+        self.workout_completed = {}   # 'YYYY-MM-DD' -> weekday name
+        self.weight_dates = []        # sorted keys of weight_log
+        self.meal_bits = DayBitset()     # day x meal slot
+        self.workout_bits = DayBitset()  # day x WORKOUT_PLAN day completed
+        self.sets = SetLog()             # lifted sets, columnar
+        self.photos = []                 # sorted (date, digest) of progress photos
+        self.measurements = {}           # 'YYYY-MM-DD' -> {body part: cm}
+        self.aggregates = ProgressAggregates()
+
+    def load_meals(self, dates, slots):
+        self.meal_bits = DayBitset()
+        self.meal_bits.set_many(epoch_days(dates), slots)
+
+    def reindex(self):
+        # Call after replacing the logs wholesale (snapshot or bulk load)
+        self.weight_dates = sorted(self.weight_log)
+        self.workout_bits = DayBitset()
+        self.workout_bits.set_many(epoch_days(list(self.workout_completed)),
+                                   list(self.workout_completed.values()))
+        self.aggregates.rebuild(self)
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "weight":
+            if record["date"] not in self.weight_log:
+                insort(self.weight_dates, record["date"])
+            self.weight_log[record["date"]] = record["value"]
+            self.aggregates.on_weight(record["date"], record["value"], self)
+        elif op == "workout":
+            day = epoch_day(record["date"])
+            previous = self.workout_completed.get(record["date"])
+            if previous is not None:
+                self.workout_bits.set(day, previous, False)
+            self.workout_completed[record["date"]] = record["value"]
+            self.workout_bits.set(day, record["value"])
+            self.aggregates.on_workout(record["date"], previous is None, self)
+        elif op == "set":
+            self.sets.put(record["date"], record["exercise"], record["set"], record["reps"], record["kg"])
+        elif op == "meal":
+            day = epoch_day(record["date"])
+            was_done = self.meal_bits.get(day, record["slot"])
+            self.meal_bits.set(day, record["slot"], record["value"])
+            if was_done != bool(record["value"]):
+                self.aggregates.on_meal(record["slot"], 1 if record["value"] else -1)
+        elif op == "photo":
+            photo = (record["date"], record["digest"])
+            i = bisect_left(self.photos, photo)
+            present = i < len(self.photos) and self.photos[i] == photo
+            if record["value"] and not present:
+                self.photos.insert(i, photo)
+            elif not record["value"] and present:
+                del self.photos[i]
+        elif op == "measurement":
+            self.measurements.setdefault(record["date"], {})[record["part"]] = record["value"]
+        elif op == "meta":
+            self.meta[record["key"]] = record["value"]
+        self.version += 1
+
+    def latest_weight(self, default=None):
+        if not self.weight_dates:
+            return default
+        return self.weight_log[self.weight_dates[-1]]
+
+    def weights_between(self, start, end):
+        # Inclusive 'YYYY-MM-DD' range served from the sorted date index
+        lo = bisect_left(self.weight_dates, start)
+        hi = bisect_right(self.weight_dates, end)
+        dates = self.weight_dates[lo:hi]
+        return dates, [self.weight_log[d] for d in dates]
+
+    def meal_done(self, date, slot):
+        return self.meal_bits.get(epoch_day(date), slot)
+
+    def has_photo(self, date, digest):
+        i = bisect_left(self.photos, (date, digest))
+        return i < len(self.photos) and self.photos[i] == (date, digest)
+
+
+class LogStore(UserLogs):
+    """Append-only journal of log writes with periodic compacted snapshots.
+
+    The whole history is replayed once when the store is opened; after that
+    every write is a single appended line and every read is served from the
+    in-memory indexes. The journal is opened for appending on the first write.
+    """
+
+    def __init__(self, directory=DATA_DIR, snapshot_every=SNAPSHOT_EVERY, sync=False):
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.snapshot_path = self.directory / SNAPSHOT_FILE
+        self.journal_path = self.directory / JOURNAL_FILE
+        self.meta_path = self.directory / META_FILE
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+
+        self._lock = threading.Lock()
+        self._journal_records = 0
+        self._journal = None
+        self._load()
+        if self.meta and read_meta_file(self.directory) != self.meta:
+            # Written by an older version, or lost to a crash after a profile write
+            self._save_meta()
+
+    def _load(self):
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.meta = snapshot.get("meta", {})
+            self.weight_log = snapshot.get("weight_log", {})
+            self.workout_completed = snapshot.get("workout_completed", {})
+            # Stored as 'YYYY-MM-DD_<slot>' keys for readability
+            meal_keys = snapshot.get("meals_completed", {})
+            self.load_meals([key[:10] for key in meal_keys], [key[11:] for key in meal_keys])
+            sets = snapshot.get("sets")
+            if sets:
+                self.sets.put_many(sets["date"], sets["exercise"], sets["set"], sets["reps"], sets["kg"])
+            self.photos = sorted(map(tuple, snapshot.get("photos", ())))
+            self.measurements = snapshot.get("measurements", {})
+        self.reindex()
+
+        if self.journal_path.exists():
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from an interrupted write
+                        continue
+                    self._apply(record)
+                    self._journal_records += 1
+
+    def _save_meta(self):
+        partial = self.meta_path.with_name(f"{META_FILE}.{threading.get_ident()}.tmp")
+        partial.write_text(json.dumps(self.meta, separators=(",", ":")), encoding="utf-8")
+        os.replace(partial, self.meta_path)
+
+    def _append(self, record):
+        with self._lock:
+            self._apply(record)
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._journal.flush()
+            if self.sync:
+                os.fsync(self._journal.fileno())
+            self._journal_records += 1
+            if record["op"] == "meta":
+                self._save_meta()
+            if self._journal_records >= self.snapshot_every:
+                self._compact()
+
+    def _compact(self):
+        # Write the snapshot next to the old one and swap it in atomically;
+        # replaying the journal over a newer snapshot is harmless, so a crash
+        # before the truncate below loses nothing.
+        snapshot = {
+            "meta": self.meta,
+            "weight_log": self.weight_log,
+            "workout_completed": self.workout_completed,
+            "meals_completed": {f"{day}_{slot}": True for day, slot in self.meal_bits.items()},
+            "sets": self.sets.columns(),
+            "photos": self.photos,
+            "measurements": self.measurements,
+        }
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+        self._journal_records = 0
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def log_weight(self, date, weight):
+        self._append({"op": "weight", "date": date, "value": weight})
+
+    def mark_workout(self, date, day):
+        self._append({"op": "workout", "date": date, "value": day})
+
+    def log_set(self, date, exercise, set_no, reps, kg):
+        self._append({"op": "set", "date": date, "exercise": exercise, "set": set_no,
+                      "reps": reps, "kg": kg})
+
+    def set_meal(self, date, slot, done):
+        # Skip no-op writes so reruns don't grow the journal
+        if self.meal_done(date, slot) == bool(done):
+            return
+        self._append({"op": "meal", "date": date, "slot": slot, "value": bool(done)})
+
+    def set_photo(self, date, digest, present):
+        if self.has_photo(date, digest) == bool(present):
+            return
+        self._append({"op": "photo", "date": date, "digest": digest, "value": bool(present)})
+
+    def log_measurement(self, date, part, cm):
+        self._append({"op": "measurement", "date": date, "part": part, "value": cm})
+
+    def set_meta(self, key, value):
+        if self.meta.get(key) == value:
+            return
+        self._append({"op": "meta", "key": key, "value": value})
+
+    def bulk_merge(self, weights, workouts):
+        # Fold a large batch straight into a fresh snapshot rather than
+        # appending one journal line per record
+        with self._lock:
+            self.weight_log.update(weights)
+            self.workout_completed.update(workouts)
+            self.reindex()
+            self.version += 1
+            self._compact()
+
+    def drop_weights_before(self, date):
+        # Used once the weights are archived; compacting drops them from disk too
+        with self._lock:
+            self.weight_log = {day: kg for day, kg in self.weight_log.items() if day >= date}
+            self.reindex()
+            self.version += 1
+            self._compact()
+
+    def close(self):
+        # Writes after this reopen the journal
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+def read_meta_file(directory):
+    try:
+        with open(Path(directory) / META_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def scan_member(directory):
+    """(meta, newest weight date, kg) of a LogStore directory, read without
+    building its indexes; the journal is streamed and nothing is kept."""
+    directory = Path(directory)
+    meta, weights = {}, {}
+    try:
+        with open(directory / SNAPSHOT_FILE, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        meta, weights = snapshot.get("meta", {}), snapshot.get("weight_log", {})
+    except FileNotFoundError:
+        pass
+    newest = max(weights, default=None)
+    kg = weights.get(newest)
+    try:
+        with open(directory / JOURNAL_FILE, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record["op"] == "meta":
+                    meta[record["key"]] = record["value"]
+                elif record["op"] == "weight" and (newest is None or record["date"] >= newest):
+                    newest, kg = record["date"], record["value"]
+    except FileNotFoundError:
+        pass
+    return meta, newest, kg
+
+
+class JournalStore:
+    """Multi-member front end over one LogStore directory per member.
+
+    Suited to a single server process; use SQLiteStore when several
+    processes share the data. The cache_size most recently read members stay
+    loaded; listing members reads their META_FILE instead of loading them.
+    """
+
+    def __init__(self, directory=DATA_DIR, snapshot_every=SNAPSHOT_EVERY, cache_size=LOGS_CACHE_SIZE):
+        self.directory = Path(directory) / "members"
+        self.snapshot_every = snapshot_every
+        self.cache_size = cache_size
+        self._members = OrderedDict()   # user_id -> LogStore, most recently read last
+        # Every LogStore still referenced, evicted or not, so a member never
+        # has two of them appending to one journal
+        self._loaded = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def logs(self, user_id):
+        with self._lock:
+            log_store = self._members.get(user_id)
+            if log_store is not None:
+                self._members.move_to_end(user_id)
+                return log_store
+            log_store = self._loaded.get(user_id)
+            if log_store is None:
+                path = self.directory / check_user_id(user_id)
+                log_store = self._loaded[user_id] = LogStore(path, self.snapshot_every)
+            self._members[user_id] = log_store
+            while len(self._members) > self.cache_size:
+                self._members.popitem(last=False)[1].close()
+        return log_store
+
+    def profile(self, user_id, defaults=None):
+        meta = self.logs(user_id).meta
+        if defaults and any(field not in meta for field in PROFILE_FIELDS):
+            self.save_profile(user_id, {**defaults, **meta})
+        return {field: meta.get(field) for field in PROFILE_FIELDS}
+
+    def save_profile(self, user_id, profile):
+        log_store = self.logs(user_id)
+        for field in PROFILE_FIELDS:
+            if field in profile:
+                log_store.set_meta(field, profile[field])
+
+    def log_weight(self, user_id, date, weight):
+        self.logs(user_id).log_weight(date, weight)
+
+    def bulk_merge(self, user_id, weights, workouts):
+        self.logs(user_id).bulk_merge(weights, workouts)
+
+    def drop_weights_before(self, user_id, date):
+        self.logs(user_id).drop_weights_before(date)
+
+    def _member_ids(self):
+        if self.directory.exists():
+            for path in sorted(self.directory.iterdir()):
+                yield path.name
+
+    def _meta(self, user_id):
+        # A loaded member's meta, else its META_FILE, else a scan of its files
+        log_store = self._loaded.get(user_id)
+        if log_store is not None:
+            return log_store.meta
+        meta = read_meta_file(self.directory / user_id)
+        return scan_member(self.directory / user_id)[0] if meta is None else meta
+
+    def members(self):
+        # (user_id, profile) for every member, without loading their logs
+        for user_id in self._member_ids():
+            meta = self._meta(user_id)
+            yield user_id, {field: meta.get(field) for field in PROFILE_FIELDS}
+
+    def member_versions(self):
+        # (user_id, version, profile) for every member. Versions restart with
+        # each process here, so the member's files stand in for them
+        for user_id, profile in self.members():
+            stamps = []
+            for name in (SNAPSHOT_FILE, JOURNAL_FILE):
+                try:
+                    stat = (self.directory / user_id / name).stat()
+                    stamps.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+                except FileNotFoundError:
+                    stamps.append("-")
+            yield user_id, "/".join(stamps), profile
+
+    def latest_weights(self):
+        for user_id in self._member_ids():
+            log_store = self._loaded.get(user_id)
+            if log_store is not None:
+                weight = log_store.latest_weight()
+            else:
+                weight = scan_member(self.directory / user_id)[2]
+            if weight is not None:
+                yield user_id, weight
+
+    def weight_rows(self, start, end):
+        for user_id in self._member_ids():
+            for date, kg in zip(*self.logs(user_id).weights_between(start, end)):
+                yield user_id, date, kg
+
+    def meal_rows(self, start, end):
+        first, last = epoch_day(start), epoch_day(end)
+        for user_id in self._member_ids():
+            for day, slot in self.logs(user_id).meal_bits.items():
+                if first <= epoch_day(day) <= last:
+                    yield user_id, day, slot
+
+    def mark_workout(self, user_id, date, day):
+        self.logs(user_id).mark_workout(date, day)
+
+    def log_set(self, user_id, date, exercise, set_no, reps, kg):
+        self.logs(user_id).log_set(date, exercise, set_no, reps, kg)
+
+    def set_meal(self, user_id, date, slot, done):
+        self.logs(user_id).set_meal(date, slot, done)
+
+    def set_photo(self, user_id, date, digest, present):
+        self.logs(user_id).set_photo(date, digest, present)
+
+    def log_measurement(self, user_id, date, part, cm):
+        self.logs(user_id).log_measurement(date, part, cm)
+
+    def close(self):
+        for log_store in list(self._loaded.values()):
+            log_store.close()
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared across threads."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = str(path)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        # WAL lets readers proceed while another process writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                # Back to the pool however the body ended, unless it can't be rolled back
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    self._idle.put(conn)
+                except sqlite3.Error:
+                    conn.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            # Take the write lock up front so concurrent writers queue on
+            # busy_timeout instead of failing on lock upgrade
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS weights (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    kg REAL NOT NULL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workouts (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sets (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    exercise TEXT NOT NULL,
+    set_no INTEGER NOT NULL,
+    reps INTEGER NOT NULL,
+    kg REAL NOT NULL,
+    PRIMARY KEY (user_id, date, exercise, set_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meals (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    PRIMARY KEY (user_id, date, slot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS photos (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (user_id, date, digest)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS measurements (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    part TEXT NOT NULL,
+    cm REAL NOT NULL,
+    PRIMARY KEY (user_id, date, part)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStore:
+    """Per-member profiles and logs in one SQLite database.
+
+    Each member row carries a version that every write bumps. Loaded logs
+    of the cache_size most recently read members are cached per process
+    and only re-read when another session or process has changed that
+    member's version. Cached logs are never changed in place: a write
+    swaps in an updated copy, so sessions reading the old one are undisturbed.
+    """
+
+    def __init__(self, directory=DATA_DIR, pool_size=POOL_SIZE, cache_size=LOGS_CACHE_SIZE):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / SQLITE_FILE
+        self.pool = ConnectionPool(self.path, pool_size)
+        self._cache = OrderedDict()   # user_id -> UserLogs
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(members)")}
+            for column, column_type in PROFILE_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE members ADD COLUMN {column} {column_type}")
+
+    def _version(self, conn, user_id):
+        row = conn.execute("SELECT version FROM members WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _load(self, conn, user_id):
+        logs = UserLogs()
+        conn.execute("BEGIN")
+        try:
+            logs.version = self._version(conn, user_id)
+            logs.weight_log = dict(conn.execute(
+                "SELECT date, kg FROM weights WHERE user_id = ? ORDER BY date", (user_id,)))
+            logs.workout_completed = dict(conn.execute(
+                "SELECT date, day FROM workouts WHERE user_id = ?", (user_id,)))
+            meals = conn.execute("SELECT date, slot FROM meals WHERE user_id = ?",
+                                 (user_id,)).fetchall()
+            logs.load_meals([date for date, _ in meals], [slot for _, slot in meals])
+            sets = conn.execute("SELECT date, exercise, set_no, reps, kg FROM sets WHERE user_id = ? "
+                                "ORDER BY date", (user_id,)).fetchall()
+            if sets:
+                logs.sets.put_many(*zip(*sets))
+            logs.photos = conn.execute("SELECT date, digest FROM photos WHERE user_id = ? "
+                                       "ORDER BY date, digest", (user_id,)).fetchall()
+            for date, part, cm in conn.execute("SELECT date, part, cm FROM measurements WHERE user_id = ?",
+                                               (user_id,)):
+                logs.measurements.setdefault(date, {})[part] = cm
+        finally:
+            conn.execute("COMMIT")
+        logs.reindex()
+        return logs
+
+    def logs(self, user_id):
+        check_user_id(user_id)
+        with self.pool.connection() as conn:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached.version == self._version(conn, user_id):
+                with self._lock:
+                    if user_id in self._cache:
+                        self._cache.move_to_end(user_id)
+                return cached
+            logs = self._load(conn, user_id)
+        with self._lock:
+            self._cache[user_id] = logs
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return logs
+
+    def profile(self, user_id, defaults=None):
+        check_user_id(user_id)
+        with self.pool.connection() as conn:
+            row = conn.execute(f"SELECT {', '.join(PROFILE_FIELDS)} FROM members WHERE user_id = ?",
+                               (user_id,)).fetchone()
+        if row is None:
+            if not defaults:
+                return dict.fromkeys(PROFILE_FIELDS)
+            self.save_profile(user_id, defaults)
+            return {field: defaults.get(field) for field in PROFILE_FIELDS}
+        return dict(zip(PROFILE_FIELDS, row))
+
+    def save_profile(self, user_id, profile):
+        check_user_id(user_id)
+        fields = [field for field in PROFILE_FIELDS if field in profile]
+        values = [profile[field] for field in fields]
+        with self.pool.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO members (user_id) VALUES (?)", (user_id,))
+            if fields:
+                assignments = ", ".join(f"{field} = ?" for field in fields)
+                conn.execute(f"UPDATE members SET {assignments} WHERE user_id = ?",
+                             (*values, user_id))
+
+    def _write(self, user_id, record, statement, params):
+        check_user_id(user_id)
+        with self.pool.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO members (user_id) VALUES (?)", (user_id,))
+            conn.execute(statement, params)
+            conn.execute("UPDATE members SET version = version + 1 WHERE user_id = ?", (user_id,))
+            version = self._version(conn, user_id)
+        # Keep this process's cached copy current instead of reloading it,
+        # unless another writer slipped in since it was loaded
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None:
+                if cached.version + 1 == version:
+                    updated = copy.deepcopy(cached)
+                    updated._apply(record)
+                    self._cache[user_id] = updated
+                else:
+                    del self._cache[user_id]
+
+    def bulk_merge(self, user_id, weights, workouts):
+        """Upsert many weights ({date: kg}) and workouts ({date: day}) in one transaction."""
+        check_user_id(user_id)
+        with self.pool.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO members (user_id) VALUES (?)", (user_id,))
+            conn.executemany("INSERT OR REPLACE INTO weights (user_id, date, kg) VALUES (?, ?, ?)",
+                             ((user_id, date, kg) for date, kg in weights.items()))
+            conn.executemany("INSERT OR REPLACE INTO workouts (user_id, date, day) VALUES (?, ?, ?)",
+                             ((user_id, date, day) for date, day in workouts.items()))
+            conn.execute("UPDATE members SET version = version + 1 WHERE user_id = ?", (user_id,))
+        # Reloaded on next read
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def drop_weights_before(self, user_id, date):
+        """Delete the member's weights dated before date, e.g. once they are archived."""
+        check_user_id(user_id)
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM weights WHERE user_id = ? AND date < ?", (user_id, date))
+            conn.execute("UPDATE members SET version = version + 1 WHERE user_id = ?", (user_id,))
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def log_weight(self, user_id, date, weight):
+        self._write(user_id, {"op": "weight", "date": date, "value": weight},
+                    "INSERT OR REPLACE INTO weights (user_id, date, kg) VALUES (?, ?, ?)",
+                    (user_id, date, weight))
+
+    def mark_workout(self, user_id, date, day):
+        self._write(user_id, {"op": "workout", "date": date, "value": day},
+                    "INSERT OR REPLACE INTO workouts (user_id, date, day) VALUES (?, ?, ?)",
+                    (user_id, date, day))
+
+    def log_set(self, user_id, date, exercise, set_no, reps, kg):
+        self._write(user_id, {"op": "set", "date": date, "exercise": exercise, "set": set_no,
+                              "reps": reps, "kg": kg},
+                    "INSERT OR REPLACE INTO sets (user_id, date, exercise, set_no, reps, kg) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, date, exercise, set_no, reps, kg))
+
+    def set_meal(self, user_id, date, slot, done):
+        cached = self._cache.get(user_id)
+        if cached is not None and cached.meal_done(date, slot) == bool(done):
+            return
+        if done:
+            statement = "INSERT OR IGNORE INTO meals (user_id, date, slot) VALUES (?, ?, ?)"
+        else:
+            statement = "DELETE FROM meals WHERE user_id = ? AND date = ? AND slot = ?"
+        self._write(user_id, {"op": "meal", "date": date, "slot": slot, "value": bool(done)},
+                    statement, (user_id, date, slot))
+
+    def set_photo(self, user_id, date, digest, present):
+        if present:
+            statement = "INSERT OR IGNORE INTO photos (user_id, date, digest) VALUES (?, ?, ?)"
+        else:
+            statement = "DELETE FROM photos WHERE user_id = ? AND date = ? AND digest = ?"
+        self._write(user_id, {"op": "photo", "date": date, "digest": digest, "value": bool(present)},
+                    statement, (user_id, date, digest))
+
+    def log_measurement(self, user_id, date, part, cm):
+        self._write(user_id, {"op": "measurement", "date": date, "part": part, "value": cm},
+                    "INSERT OR REPLACE INTO measurements (user_id, date, part, cm) VALUES (?, ?, ?, ?)",
+                    (user_id, date, part, cm))
+
+    # Member lists are fetched whole, so a caller that stops early or works
+    # slowly between rows doesn't hold a pooled connection
+
+    def members(self):
+        # [(user_id, profile)] for every member
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"SELECT user_id, {', '.join(PROFILE_FIELDS)} FROM members "
+                                "ORDER BY user_id").fetchall()
+        return [(row[0], dict(zip(PROFILE_FIELDS, row[1:]))) for row in rows]
+
+    def member_versions(self):
+        # [(user_id, version, profile)] for every member; the version changes
+        # with every log write
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"SELECT user_id, version, {', '.join(PROFILE_FIELDS)} FROM members "
+                                "ORDER BY user_id").fetchall()
+        return [(row[0], row[1], dict(zip(PROFILE_FIELDS, row[2:]))) for row in rows]
+
+    def latest_weights(self):
+        # [(user_id, kg)] of every member's most recent weight
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT user_id, kg FROM weights "
+                "JOIN (SELECT user_id, MAX(date) AS date FROM weights GROUP BY user_id) USING (user_id, date)"
+            ).fetchall()
+
+    def weight_rows(self, start, end):
+        # (user_id, date, kg) for every weight in a date range, streamed
+        with self.pool.connection() as conn:
+            yield from conn.execute(
+                "SELECT user_id, date, kg FROM weights WHERE date BETWEEN ? AND ?", (start, end))
+
+    def meal_rows(self, start, end):
+        # (user_id, date, slot) for every completed meal in a date range,
+        # streamed for cohort queries
+        with self.pool.connection() as conn:
+            yield from conn.execute(
+                "SELECT user_id, date, slot FROM meals WHERE date BETWEEN ? AND ?", (start, end))
+
+    def close(self):
+        self.pool.close()
+
+
+def open_store(backend=STORE_BACKEND, directory=DATA_DIR, cache_size=LOGS_CACHE_SIZE):
+    if backend == "sqlite":
+        return SQLiteStore(directory, cache_size=cache_size)
+    if backend == "journal":
+        return JournalStore(directory, cache_size=cache_size)
+    raise ValueError(f"Unknown storage backend: {backend!r}")
@@ -0,0 +1,276 @@
+"""Per-set strength log and its vectorized analytics.
+
+Every lifted set is one row of (date, exercise, set, reps, kg) held in
+typed NumPy columns, so weekly volume, estimated one-rep maxes and
+personal records over hundreds of thousands of sets are a few array
+passes. Reports are cached per member log version. pandas is only loaded
+by the reports and frames, not by logging or the schedule.
+"""
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from adherence import epoch_day, epoch_days, iso_date
+from metrics import timed
+
+# Estimated 1RM (Epley) is only trusted up to this many reps
+MAX_1RM_REPS = 12
+# Exercises that appear in no plan day are grouped here
+OTHER_FOCUS = "Other"
+REPORT_CACHE_SIZE = 256
+# SetLog.replaced is cleared past this many rows; readers then resync in full
+REPLACED_LIMIT = 4096
+
+StrengthReport = namedtuple("StrengthReport", "weekly_volume best_1rm records")
+
+_reports = OrderedDict()
+_lock = threading.Lock()
+_generations = itertools.count()
+
+
+def estimated_1rm(kg, reps):
+    """Epley estimate; NaN for sets without load or with too many reps."""
+    kg = np.asarray(kg, dtype=np.float64)
+    reps = np.asarray(reps, dtype=np.float64)
+    estimate = np.where(reps <= 1, kg, kg * (1 + reps / 30))
+    return np.where((kg > 0) & (reps >= 1) & (reps <= MAX_1RM_REPS), estimate, np.nan)
+
+
+def exercise_focus(plan):
+    # Exercise name -> focus of the first plan day that lists it
+    focus = {}
+    for workout in plan.values():
+        for exercise in workout["exercises"]:
+            focus.setdefault(exercise["name"], workout["focus"])
+    return focus
+
+
+class SetLog:
+    """Columnar log of lifted sets, one typed array per field.
+
+    Exercise names are dictionary-encoded in the order first seen. Rows
+    stay in write order; logging the same (date, exercise, set) again
+    replaces that row, found through the rows index. revision counts writes
+    and replaced lists the rows rewritten in place, so readers can pick up
+    only what changed. generation changes when replaced is cleared and is
+    new for every log built from scratch (copies keep it), so readers know
+    when they cannot catch up from what they last saw.
+    """
+
+    def __init__(self):
+        self.names = []              # code -> exercise name
+        self.codes = {}              # exercise name -> code
+        self.length = 0
+        self.revision = 0
+        self.replaced = []
+        self.generation = next(_generations)
+        self.rows = {}               # (epoch day, exercise code, set) -> row
+        self.day = np.zeros(0, dtype=np.int32)        # epoch day
+        self.exercise = np.zeros(0, dtype=np.int32)
+        self.set_no = np.zeros(0, dtype=np.int16)
+        self.reps = np.zeros(0, dtype=np.int16)
+        self.kg = np.zeros(0, dtype=np.float32)
+
+    # ---- writing -------------------------------------------------------
+
+    def _code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def _reserve(self, extra):
+        needed = self.length + extra
+        if needed > len(self.day):
+            size = max(needed, 2 * len(self.day), 256)
+            for field in ("day", "exercise", "set_no", "reps", "kg"):
+                column = getattr(self, field)
+                grown = np.zeros(size, dtype=column.dtype)
+                grown[:self.length] = column[:self.length]
+                setattr(self, field, grown)
+
+    def put(self, date, exercise, set_no, reps, kg):
+        key = (epoch_day(date), self._code(exercise), int(set_no))
+        i = self.rows.get(key)
+        if i is not None:
+            self.replaced.append(i)
+            if len(self.replaced) > REPLACED_LIMIT:
+                self.replaced = []
+                self.generation = next(_generations)
+        else:
+            self._reserve(1)
+            i = self.rows[key] = self.length
+            self.length += 1
+            self.day[i], self.exercise[i], self.set_no[i] = key
+        self.reps[i], self.kg[i] = reps, kg
+        self.revision += 1
+
+    def put_many(self, dates, exercises, set_nos, reps, kg):
+        # Bulk load of rows without duplicate (date, exercise, set) keys
+        if not len(dates):
+            return
+        n, count = self.length, len(dates)
+        self._reserve(count)
+        self.day[n:n + count] = epoch_days(dates)
+        self.exercise[n:n + count] = [self._code(name) for name in exercises]
+        self.set_no[n:n + count] = set_nos
+        self.reps[n:n + count] = reps
+        self.kg[n:n + count] = kg
+        keys = zip(self.day[n:n + count].tolist(), self.exercise[n:n + count].tolist(),
+                   self.set_no[n:n + count].tolist())
+        self.rows.update(zip(keys, range(n, n + count)))
+        self.length += count
+        self.revision += 1
+
+    # ---- reading -------------------------------------------------------
+
+    def frame(self):
+        """The log as a DataFrame with a categorical exercise column."""
+        import pandas as pd
+
+        n = self.length
+        return pd.DataFrame({
+            "day": self.day[:n],
+            "exercise": pd.Categorical.from_codes(self.exercise[:n], categories=self.names),
+            "set": self.set_no[:n],
+            "reps": self.reps[:n],
+            "kg": self.kg[:n].astype(np.float64).round(2),
+        })
+
+    @timed("data")
+    def on(self, date):
+        """Sets logged on one 'YYYY-MM-DD' date, in exercise and set order."""
+        n = self.length
+        rows = np.flatnonzero(self.day[:n] == epoch_day(date))
+        frame = self.frame().iloc[rows].drop(columns="day")
+        return frame.sort_values(["exercise", "set"]).reset_index(drop=True)
+
+    def count(self, date, exercise=None):
+        # Sets logged on one date, of one exercise or all of them
+        n = self.length
+        logged = self.day[:n] == epoch_day(date)
+        if exercise is not None:
+            logged &= self.exercise[:n] == self.codes.get(exercise, -1)
+        return int(np.count_nonzero(logged))
+
+    def last(self, exercise):
+        """(reps, kg) of the top set of the exercise's latest day, or None."""
+        code = self.codes.get(exercise)
+        if code is None:
+            return None
+        n = self.length
+        rows = np.flatnonzero(self.exercise[:n] == code)
+        latest = rows[self.day[rows] == self.day[rows].max()]
+        top = latest[np.argmax(self.kg[latest])]
+        return int(self.reps[top]), float(self.kg[top])
+
+    def latest_best(self, exercises):
+        """{exercise: (epoch day, best estimated 1RM)} of each exercise's
+        latest day with a loaded set; exercises without one are left out."""
+        codes = [self.codes[name] for name in exercises if name in self.codes]
+        n = self.length
+        rows = np.flatnonzero(np.isin(self.exercise[:n], codes))
+        e1rm = estimated_1rm(self.kg[rows], self.reps[rows])
+        rows, e1rm = rows[~np.isnan(e1rm)], e1rm[~np.isnan(e1rm)]
+        if not len(rows):
+            return {}
+        # Sorted by exercise, then day, then e1rm: each exercise's last row
+        # is the best set of its latest day
+        exercise, day = self.exercise[rows], self.day[rows]
+        order = np.lexsort((e1rm, day, exercise))
+        last = order[np.append(exercise[order][1:] != exercise[order][:-1], True)]
+        return {self.names[code]: (int(d), float(value))
+                for code, d, value in zip(exercise[last], day[last], e1rm[last])}
+
+    def columns(self):
+        # Plain lists per field, for snapshots and exports
+        n = self.length
+        return {
+            "date": [iso_date(day) for day in self.day[:n]],
+            "exercise": [self.names[code] for code in self.exercise[:n]],
+            "set": self.set_no[:n].tolist(),
+            "reps": self.reps[:n].tolist(),
+            "kg": self.kg[:n].astype(np.float64).round(2).tolist(),
+        }
+
+    def __len__(self):
+        return self.length
+
+
+# ---- vectorized queries --------------------------------------------------
+
+def weekly_volume(sets, focus):
+    """Volume load (reps x kg) per Monday-based week and plan focus.
+
+    Returns a DataFrame indexed by week start with one column per focus.
+    """
+    import pandas as pd
+
+    n = sets.length
+    if not n:
+        return pd.DataFrame()
+    groups = list(dict.fromkeys(focus.get(name, OTHER_FOCUS) for name in sets.names))
+    group_of = np.array([groups.index(focus.get(name, OTHER_FOCUS)) for name in sets.names],
+                        dtype=np.intp)
+    day = sets.day[:n].astype(np.int64)
+    week = day - (day + 3) % 7  # epoch day 0 was a Thursday
+    first = int(week.min())
+    volume = np.zeros(((int(week.max()) - first) // 7 + 1, len(groups)))
+    np.add.at(volume, ((week - first) // 7, group_of[sets.exercise[:n]]),
+              sets.reps[:n].astype(np.float64) * sets.kg[:n])
+    index = pd.Index((first + 7 * np.arange(len(volume))).astype("datetime64[D]"), name="week")
+    return pd.DataFrame(volume, index=index, columns=groups)
+
+
+def best_1rm(sets):
+    """Best estimated 1RM per training day, days x exercises (NaN where none)."""
+    import pandas as pd
+
+    frame = sets.frame()
+    frame["e1rm"] = estimated_1rm(frame["kg"], frame["reps"])
+    frame = frame.dropna(subset=["e1rm"])
+    if frame.empty:
+        return pd.DataFrame()
+    best = frame.groupby(["day", "exercise"], observed=True)["e1rm"].max().unstack("exercise")
+    best.index = best.index.to_numpy().astype("datetime64[D]")
+    return best.round(1)
+
+
+def personal_records(sets):
+    """Every set that beat the exercise's previous best estimated 1RM.
+
+    The first loaded set of an exercise sets the baseline and is not a
+    record. Returns date, exercise, set, reps, kg, e1rm and previous.
+    """
+    frame = sets.frame()
+    frame["e1rm"] = estimated_1rm(frame["kg"], frame["reps"])
+    frame = frame.dropna(subset=["e1rm"]).sort_values(["day", "set"], kind="stable")
+    previous = frame.groupby("exercise", observed=True)["e1rm"].cummax()
+    frame["previous"] = previous.groupby(frame["exercise"], observed=True).shift()
+    records = frame[frame["e1rm"] > frame["previous"]].copy()
+    records.insert(0, "date", records.pop("day").to_numpy().astype("datetime64[D]"))
+    return records.round({"e1rm": 1, "previous": 1}).reset_index(drop=True)
+
+
+@timed("data")
+def strength_report(user_id, logs, plan):
+    """Weekly volume, daily best 1RM and records for a member, cached by
+    log version, so reruns without a new set cost a dictionary lookup."""
+    focus = exercise_focus(plan)
+    key = (user_id, logs.version, tuple(focus.items()))
+    with _lock:
+        report = _reports.get(key)
+        if report is not None:
+            _reports.move_to_end(key)
+            return report
+
+    report = StrengthReport(weekly_volume(logs.sets, focus), best_1rm(logs.sets),
+                            personal_records(logs.sets))
+    with _lock:
+        _reports[key] = report
+        while len(_reports) > REPORT_CACHE_SIZE:
+            _reports.popitem(last=False)
+    return report
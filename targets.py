@@ -0,0 +1,146 @@
+"""Daily energy and macro targets computed from each member's profile.
+
+BMR is Mifflin-St Jeor and TDEE applies an activity factor. The calorie
+target subtracts the deficit needed to reach the target weight by the
+end of the goal period. That deficit is capped at MAX_DEFICIT of TDEE
+and MAX_WEEKLY_LOSS of body weight, and the result never drops below
+CALORIE_FLOOR. Protein and fats scale with body weight (the lower of the
+latest logged and the target weight) and carbs fill the remaining
+calories.
+
+Every function takes NumPy arrays, so a whole cohort is one pass:
+
+    python targets.py --out targets.csv
+"""
+import argparse
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from storage import DATA_DIR, STORE_BACKEND, open_store
+
+KCAL_PER_KG = 7700
+ACTIVITY_FACTORS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9,
+}
+SEXES = ("male", "female")
+# Stand-ins for profile fields a member has not filled in; these are the
+# assumptions the plan constants in plans.py were worked out from
+BODY_DEFAULTS = {"sex": "male", "age": 30, "height_cm": 175.0, "activity": "moderate"}
+
+PROTEIN_G_PER_KG = 2.0
+FATS_G_PER_KG = 0.8
+MAX_DEFICIT = 0.25        # share of TDEE
+MAX_WEEKLY_LOSS = 0.01    # share of body weight
+CALORIE_FLOOR = {"male": 1500, "female": 1200}
+
+TARGET_COLUMNS = ("bmr", "tdee", "calories", "protein", "carbs", "fats", "weekly_loss")
+
+
+def bmr(sex, age, height_cm, weight_kg):
+    male = np.asarray(sex) == "male"
+    return 10 * np.asarray(weight_kg) + 6.25 * np.asarray(height_cm) - 5 * np.asarray(age) \
+        + np.where(male, 5, -161)
+
+
+def activity_factor(activity):
+    activity = np.asarray(activity)
+    return np.select([activity == level for level in ACTIVITY_FACTORS], list(ACTIVITY_FACTORS.values()),
+                     ACTIVITY_FACTORS[BODY_DEFAULTS["activity"]])
+
+
+def compute_targets(sex, age, height_cm, weight_kg, activity, target_weight, days_left):
+    """Targets for one member or a whole cohort (scalars or equal-length arrays).
+
+    Returns {TARGET_COLUMNS entry: array}. Calories are rounded to 10 kcal,
+    grams to whole grams and weekly_loss (kg/week still needed) to 10 g.
+    """
+    sex = np.asarray(sex)
+    weight = np.asarray(weight_kg, dtype=np.float64)
+    basal = bmr(sex, age, height_cm, weight)
+    tdee = basal * activity_factor(activity)
+
+    weeks_left = np.maximum(np.asarray(days_left, dtype=np.float64), 7) / 7
+    weekly_loss = np.clip((weight - np.asarray(target_weight)) / weeks_left, 0, MAX_WEEKLY_LOSS * weight)
+    deficit = np.minimum(weekly_loss * KCAL_PER_KG / 7, MAX_DEFICIT * tdee)
+    floor = np.where(sex == "female", CALORIE_FLOOR["female"], CALORIE_FLOOR["male"])
+    calories = np.maximum(tdee - deficit, floor)
+
+    # Protein and fats follow the goal weight, so they don't balloon for heavier members
+    reference = np.minimum(weight, target_weight)
+    protein = PROTEIN_G_PER_KG * reference
+    fats = FATS_G_PER_KG * reference
+    carbs = np.maximum((calories - 4 * protein - 9 * fats) / 4, 0)
+    return {
+        "bmr": np.round(basal),
+        "tdee": np.round(tdee),
+        "calories": np.round(calories, -1),
+        "protein": np.round(protein),
+        "carbs": np.round(carbs),
+        "fats": np.round(fats),
+        "weekly_loss": np.round(weekly_loss, 2),
+    }
+
+
+def _days_left(start_date, goal_period, today):
+    return (date.fromisoformat(start_date) - today).days + goal_period
+
+
+def member_targets(profile, weight, today=None):
+    """compute_targets for one profile dict and current weight, as plain numbers."""
+    body = {field: profile.get(field) or default for field, default in BODY_DEFAULTS.items()}
+    targets = compute_targets(body["sex"], body["age"], body["height_cm"], weight, body["activity"],
+                              profile["target_weight"],
+                              _days_left(profile["start_date"], profile["goal_period"], today or date.today()))
+    return {column: float(value) for column, value in targets.items()}
+
+
+def cohort_targets(store, today=None):
+    """DataFrame of targets for every member with a profile, indexed by user_id."""
+    import pandas as pd
+
+    members = pd.DataFrame.from_records(
+        [{"user_id": user_id, **profile} for user_id, profile in store.members()
+         if profile.get("start_date")])
+    if members.empty:
+        return pd.DataFrame(columns=list(TARGET_COLUMNS))
+    members = members.set_index("user_id")
+    latest = pd.Series(dict(store.latest_weights()), dtype=np.float64)
+    weight = latest.reindex(members.index).fillna(members["start_weight"])
+
+    for field, default in BODY_DEFAULTS.items():
+        members[field] = members[field].fillna(default)
+    start = pd.to_datetime(members["start_date"]).to_numpy("datetime64[D]")
+    days_left = (start - np.datetime64(today or date.today(), "D")).astype(np.int64) + members["goal_period"]
+
+    targets = compute_targets(members["sex"].to_numpy(), members["age"].to_numpy(np.float64),
+                              members["height_cm"].to_numpy(np.float64), weight.to_numpy(),
+                              members["activity"].to_numpy(), members["target_weight"].to_numpy(np.float64),
+                              days_left.to_numpy(np.float64))
+    return pd.DataFrame(targets, index=members.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute daily targets for every member")
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--out", type=Path, required=True, help="CSV file")
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.data_dir)
+    started = time.perf_counter()
+    targets = cohort_targets(store)
+    store.close()
+    targets.to_csv(args.out)
+    print(f"{len(targets)} members in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
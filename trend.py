@@ -0,0 +1,228 @@
+"""Smoothed weight trend and target-date forecast.
+
+Readings go through a local linear trend Kalman filter: the state is the
+underlying weight (level) and its daily change (slope), and each reading
+is that level plus MEASUREMENT_SD of day-to-day noise (water, meals,
+scale). Gaps between readings simply widen the uncertainty, so irregular
+logging needs no resampling.
+
+The same step functions serve one member incrementally (TrendFilter,
+kept current by ProgressAggregates on every write) and a whole cohort as
+one array pass per reading index (fit_cohort):
+
+    python trend.py --out trends.csv
+"""
+import argparse
+import math
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+MEASUREMENT_SD = 0.7       # kg, scatter of single readings around the trend
+LEVEL_SD = 0.05            # kg per sqrt(day), drift of the level itself
+SLOPE_SD = 0.002           # kg/day per sqrt(day), how fast the rate can change
+SLOPE_PRIOR_SD = 0.1       # kg/day, before the second reading
+# Readings older than this don't move today's estimate; rebuilds and the
+# cohort job start here
+TREND_DAYS = 180
+MIN_READINGS = 3
+# ~80% band
+BAND_Z = 1.2816
+# Projections further out than this are reported as None
+MAX_HORIZON_DAYS = 730
+
+TREND_COLUMNS = ("last_date", "readings", "level", "level_sd", "weekly_change", "weekly_change_sd")
+
+
+def _start(weight):
+    # (level, slope, p00, p01, p11) after a first reading
+    zero = weight * 0.0
+    return weight + zero, zero, zero + MEASUREMENT_SD ** 2, zero, zero + SLOPE_PRIOR_SD ** 2
+
+
+def _step(state, dt, weight):
+    """Predict dt days ahead and correct with one reading.
+
+    Works on floats or on equal-length arrays (one entry per member).
+    """
+    level, slope, p00, p01, p11 = state
+    q_level, q_slope = LEVEL_SD ** 2 * dt, SLOPE_SD ** 2 * dt
+    level = level + slope * dt
+    p00 = p00 + 2 * dt * p01 + dt * dt * p11 + q_level + q_slope * dt * dt / 3
+    p01 = p01 + dt * p11 + q_slope * dt / 2
+    p11 = p11 + q_slope
+
+    innovation = weight - level
+    s = p00 + MEASUREMENT_SD ** 2
+    k0, k1 = p00 / s, p01 / s
+    return (level + k0 * innovation, slope + k1 * innovation,
+            (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01)
+
+
+def forecast(state, horizon):
+    """(mean, sd) of the level horizon days after the last reading."""
+    level, slope, p00, p01, p11 = state
+    horizon = np.asarray(horizon, dtype=np.float64)
+    variance = (p00 + 2 * horizon * p01 + horizon ** 2 * p11
+                + LEVEL_SD ** 2 * horizon + SLOPE_SD ** 2 * horizon ** 3 / 3)
+    return level + slope * horizon, np.sqrt(variance)
+
+
+def days_to_target(level, slope, slope_sd, target):
+    """Days after the last reading until the trend reaches target.
+
+    Returns (expected, earliest, latest) using the slope's BAND_Z band;
+    0 once the level is at or below target, NaN when the trend doesn't get
+    there within MAX_HORIZON_DAYS. Scalars or arrays.
+    """
+    level, slope, slope_sd, target = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64)
+                                                          for v in (level, slope, slope_sd, target)))
+    to_lose = level - target
+
+    def days(rate):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = np.where(rate < 0, to_lose / -rate, np.nan)
+        result = np.where(to_lose <= 0, 0.0, result)
+        return np.where(result <= MAX_HORIZON_DAYS, result, np.nan)
+
+    return days(slope), days(slope - BAND_Z * slope_sd), days(slope + BAND_Z * slope_sd)
+
+
+class TrendFilter:
+    """One member's trend, updated in O(1) per reading in date order."""
+
+    __slots__ = ("day", "readings", "state", "_previous")
+
+    def __init__(self):
+        self.day = None          # ordinal of the last reading
+        self.readings = 0
+        self.state = None
+        self._previous = None    # (day, state) before the last reading
+
+    def update(self, day, weight):
+        self._previous = (self.day, self.state)
+        if self.state is None:
+            self.state = _start(float(weight))
+        else:
+            self.state = _step(self.state, day - self.day, float(weight))
+        self.day = day
+        self.readings += 1
+
+    def replace_last(self, weight):
+        # A corrected reading for the same day
+        day = self.day
+        self.day, self.state = self._previous
+        self.readings -= 1
+        self.update(day, weight)
+
+    @property
+    def ready(self):
+        return self.readings >= MIN_READINGS
+
+    @property
+    def level(self):
+        return self.state[0]
+
+    @property
+    def weekly_change(self):
+        return self.state[1] * 7
+
+    def forecast(self, horizon):
+        return forecast(self.state, horizon)
+
+    def target_dates(self, target):
+        """(expected, earliest, latest) date the trend reaches target; None
+        where it doesn't within MAX_HORIZON_DAYS."""
+        days = days_to_target(self.state[0], self.state[1], math.sqrt(self.state[4]), target)
+        return tuple(None if np.isnan(d) else date.fromordinal(self.day + math.ceil(d)) for d in days)
+
+
+def smooth(days, weights):
+    """Filtered level at every reading (days as ascending day numbers)."""
+    trend = TrendFilter()
+    levels = np.empty(len(days))
+    for i, (day, weight) in enumerate(zip(days, weights)):
+        trend.update(int(day), weight)
+        levels[i] = trend.level
+    return levels
+
+
+def fit_cohort(rows):
+    """Trend of every member from (user_id, 'YYYY-MM-DD', kg) rows, e.g.
+    store.weight_rows(); DataFrame of TREND_COLUMNS indexed by user_id.
+
+    Rows are ordered by reading index, so step i updates, as arrays,
+    every member that has an i-th reading.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(rows, columns=["user_id", "date", "kg"])
+    if frame.empty:
+        return pd.DataFrame(columns=list(TREND_COLUMNS))
+    frame["day"] = pd.to_datetime(frame["date"]).to_numpy("datetime64[D]").astype(np.int64)
+    frame = frame.sort_values(["user_id", "day"], kind="stable")
+    codes, members = pd.factorize(frame["user_id"])
+    step = frame.groupby(codes).cumcount().to_numpy()
+    order = np.argsort(step, kind="stable")
+    codes, step = codes[order], step[order]
+    day = frame["day"].to_numpy()[order]
+    kg = frame["kg"].to_numpy(np.float64)[order]
+    bounds = np.searchsorted(step, np.arange(step[-1] + 2))
+
+    first = slice(bounds[0], bounds[1])
+    state = [np.array(v, dtype=np.float64) for v in _start(kg[first])]
+    last_day = day[first].copy()
+    for i in range(1, len(bounds) - 1):
+        rows_i = slice(bounds[i], bounds[i + 1])
+        who = codes[rows_i]
+        updated = _step([v[who] for v in state], day[rows_i] - last_day[who], kg[rows_i])
+        for values, new in zip(state, updated):
+            values[who] = new
+        last_day[who] = day[rows_i]
+
+    level, slope, p00, _, p11 = state
+    return pd.DataFrame({
+        "last_date": last_day.astype("datetime64[D]"),
+        "readings": np.bincount(codes, minlength=len(members)),
+        "level": level.round(2),
+        "level_sd": np.sqrt(p00).round(2),
+        "weekly_change": (slope * 7).round(3),
+        "weekly_change_sd": (np.sqrt(p11) * 7).round(3),
+    }, index=pd.Index(members, name="user_id"))
+
+
+def main():
+    import pandas as pd
+
+    # storage imports this module (via aggregates), so it is loaded here
+    from storage import DATA_DIR, STORE_BACKEND, open_store
+
+    parser = argparse.ArgumentParser(description="Fit weight trends and target dates for every member")
+    parser.add_argument("--backend", default=STORE_BACKEND)
+    parser.add_argument("--data-dir", default=DATA_DIR, type=Path)
+    parser.add_argument("--out", type=Path, required=True, help="CSV file")
+    args = parser.parse_args()
+
+    store = open_store(args.backend, args.data_dir)
+    started = time.perf_counter()
+    today = date.today()
+    trends = fit_cohort(store.weight_rows((today - timedelta(days=TREND_DAYS)).isoformat(),
+                                          today.isoformat()))
+    targets = pd.Series({user_id: profile["target_weight"] for user_id, profile in store.members()},
+                        dtype=np.float64)
+    store.close()
+
+    days = days_to_target(trends["level"].to_numpy(), trends["weekly_change"].to_numpy() / 7,
+                          trends["weekly_change_sd"].to_numpy() / 7,
+                          targets.reindex(trends.index).to_numpy())
+    for column, value in zip(("target_date", "earliest", "latest"), days):
+        trends[column] = pd.to_datetime(trends["last_date"]) + pd.to_timedelta(np.ceil(value), unit="D")
+    trends.to_csv(args.out, date_format="%Y-%m-%d")
+    print(f"{len(trends)} members in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()